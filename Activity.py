@@ -7,7 +7,7 @@ import itertools
 from HealthDES.Check import Check, CheckList
 from HealthDES.DataCollection import DataCollection
 
-from DiseaseProgression import DiseaseProgression
+from DiseaseProgression import DiseaseState
 from Microenvironment import Microenvironment
 from Person import Person
 
@@ -25,9 +25,13 @@ class Visitor_activity():
         self.env = simulation_params.get('simpy_env', None)
         self.dc = simulation_params.get('data_collector', None)
         self.time_interval = simulation_params.get('time_interval', None)
+        self.exposure_mode = simulation_params.get('exposure_mode', 'tick')
 
         self.unpack_parameters(**kwargs)
 
+        # Only build the activity log when the report is collected
+        self.log_activity = self.dc.is_report_enabled('Visitor activity')
+
 
     """
     The following pair of methods define the parametes passed to the activity. The pack method is used to 
@@ -65,43 +69,70 @@ class Visitor_activity():
 
 
     # Entry point to the activity
-    def start(self, finished_activity):
+    def start(self, finished_activity, request_entry=None, visit=None):
         """Introduce a person to the microenvironment
 
             Arguments:
             finished_activity    Event notification that activity has completed
-            duration             Length of time that infected person remains in the microenvironment
+
+            Keyword arguments:
+            request_entry        Request for entry already made, when the activity is restored from a checkpoint
+            visit                Event ending the visit of a person already in the microenvironment, when
+                                 the activity is restored from a checkpoint
         """
         # Request entry into the microenvironment
-        with self.microenvironment.request_entry() as request_entry:
-            self.log_visitor_activity("Visitor {PID} requests entry.".format(PID=self.person.PID))         
-            yield request_entry
+        if request_entry is None:
+            request_entry = self.microenvironment.request_entry()
+            if self.log_activity:
+                self.log_visitor_activity("Visitor {PID} requests entry.".format(PID=self.person.PID))
 
-            # Wait in the shop
-            self.log_visitor_activity("Visitor {PID} entered.".format(PID=self.person.PID))
-            self.dc.counter_increment('Total visitors')
+        with request_entry:
+            if visit is None:
+                yield request_entry
 
-            person_request_to_leave = self.env.event()
+                # Wait in the shop
+                if self.log_activity:
+                    self.log_visitor_activity("Visitor {PID} entered.".format(PID=self.person.PID))
+                self.dc.counter_increment('Total visitors')
 
-            if self.person.infection_status.is_state('infected'):
-                self.env.process(self.infected_visitor(self.microenvironment.add_quanta_to_microenvironment,
-                                                         person_request_to_leave,
-                                                         self.duration))
-                yield person_request_to_leave
+                visit = self.visit()
 
-            elif self.person.infection_status.is_state('susceptible'):
-                
-                self.env.process(self.susceptible_visitor(self.microenvironment.get_quanta_concentration,
-                                                            person_request_to_leave,
-                                                            self.duration))
-                yield person_request_to_leave
+            if visit is not None:
+                yield visit
 
-            self.log_visitor_activity("Visitor {PID} left.".format(PID=self.person.PID))
+            if self.log_activity:
+                self.log_visitor_activity("Visitor {PID} left.".format(PID=self.person.PID))
 
             finished_activity.succeed()
 
 
-    def infected_visitor(self, callback_add_quanta, request_to_leave, periods):
+    def visit(self):
+        """Start the processes of the person's visit to the microenvironment
+
+        Returns:
+            simpy event -- Event triggered when the person leaves, None if they leave straight away
+        """
+        if self.exposure_mode == 'event':
+            return self.env.process(self.visitor_event_exposure())
+
+        person_request_to_leave = self.env.event()
+
+        if self.person.infection_status.is_state(DiseaseState.INFECTED):
+            self.env.process(self.infected_visitor(self.microenvironment.add_quanta_to_microenvironment,
+                                                     person_request_to_leave,
+                                                     self.duration))
+            return person_request_to_leave
+
+        if self.person.infection_status.is_state(DiseaseState.SUSCEPTIBLE):
+            self.env.process(self.susceptible_visitor(self.microenvironment.get_quanta_concentration,
+                                                        person_request_to_leave,
+                                                        self.duration))
+            return person_request_to_leave
+
+        return None
+
+
+    def infected_visitor(self, callback_add_quanta, request_to_leave, periods, end_trigger=None):
         """Callback from microenvironment for an infected person to generate quanta
 
             Arguments:
@@ -109,9 +140,11 @@ class Visitor_activity():
             request_to_leave                Event notification to let microenvironment know we wish to leave
                                             to allow clean up before existing the microenvironment.
             periods                         Number of periods person in the microenvironment
+            end_trigger                     Timeout ending the visit, already scheduled when the visit is
+                                            restored from a checkpoint
          """
-
-        end_trigger =  self.env.timeout(periods, value='end')
+        if end_trigger is None:
+            end_trigger =  self.env.timeout(periods, value='end')
 
         while True:
             period_trigger = self.env.timeout(1, value='periodic')
@@ -127,7 +160,7 @@ class Visitor_activity():
         request_to_leave.succeed()
 
 
-    def susceptible_visitor(self, callback_quanta_concentration, request_to_leave, periods):
+    def susceptible_visitor(self, callback_quanta_concentration, request_to_leave, periods, end_trigger=None):
         """Callback from microenvironment for a susceptible person to calculate exposure
 
             Arguments:
@@ -135,8 +168,11 @@ class Visitor_activity():
             request_to_leave                Event notification to let microenvironment know we wish to leave
                                             to allow clean up before existing the microenvironment.
             periods                         Number of period that person in the microenvironment
+            end_trigger                     Timeout ending the visit, already scheduled when the visit is
+                                            restored from a checkpoint
         """
-        end_trigger =  self.env.timeout(periods, value='end')
+        if end_trigger is None:
+            end_trigger =  self.env.timeout(periods, value='end')
 
         while True:
             period_trigger = self.env.timeout(1, value='periodic')
@@ -152,6 +188,28 @@ class Visitor_activity():
         request_to_leave.succeed()
 
 
+    def visitor_event_exposure(self):
+        """Visit the microenvironment with event driven exposure
+
+        An infected person emits quanta from arrival to departure, and the infection risk of a
+        susceptible person is sampled once, on departure, from the exact integral of the quanta
+        concentration over their visit. The visit takes one timeout whatever its duration.
+        """
+        if self.person.infection_status.is_state(DiseaseState.INFECTED):
+            quanta_emission_rate = self.person.get_quanta_emission_rate()
+            self.microenvironment.add_emitter(quanta_emission_rate)
+            yield self.env.timeout(self.duration)
+            self.microenvironment.remove_emitter(quanta_emission_rate)
+
+        elif self.person.infection_status.is_state(DiseaseState.SUSCEPTIBLE):
+            self.microenvironment.open_exposure(self.person)
+            yield self.env.timeout(self.duration)
+            self.person.expose_person_to_dose(self.microenvironment.close_exposure(self.person))
+
+        else:
+            yield self.env.timeout(self.duration)
+
+
     def log_visitor_activity(self, activity):
         """Log visitor activity within the process visitor process 
         
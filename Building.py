@@ -0,0 +1,193 @@
+""" Python library to model the spread of infectious diseases within a microenvironment """
+
+import numpy as np
+
+from HealthDES.Check import Check, CheckList
+
+from Microenvironment import Microenvironment
+
+
+def matrix_exponential(a):
+    """Matrix exponential by scaling and squaring of a Taylor series
+
+    Arguments:
+        a {numpy array} -- Square matrix
+
+    Returns:
+        numpy array -- exp(a)
+    """
+    norm = np.linalg.norm(a, ord=np.inf)
+    squarings = int(np.ceil(np.log2(norm))) + 1 if norm > 0.5 else 0
+    a = a / 2 ** squarings
+
+    result = np.eye(len(a))
+    term = np.eye(len(a))
+    for k in range(1, 19):
+        term = term @ a / k
+        result = result + term
+
+    for _ in range(squarings):
+        result = result @ result
+
+    return result
+
+
+class BuildingZone(Microenvironment):
+    """ Microenvironment that is a zone within a building
+
+    The quanta in the zone are held by the building, which advances the quanta in all zones
+    together. The zone does not run its own process to reduce the quanta over time.
+    """
+
+    def __init__(self, simulation_params, building, zone, environment_name, volume, air_exchange_rate, capacity=None):
+        """Initialise the zone
+
+        Arguments:
+            simulation_params {dictionary} -- Parameters for that drive the simulation
+            building {Building} -- Building that the zone is within
+            zone {int} -- Index of the zone within the building
+            environment_name {string} -- Unique name to identify this microenvironment
+            volume {number} -- Volume of the zone
+            air_exchange_rate {number} -- Rate at which air is exchanged with outside the building
+
+        Keyword Arguments:
+            capacity {number} -- Maximum number of people in the zone at any one time (default: {None})
+        """
+        self.building = building
+        self.zone = zone
+
+        Microenvironment.__init__(self, simulation_params, environment_name, volume, air_exchange_rate, capacity=capacity)
+
+    @property
+    def quanta_in_microenvironment(self):
+        """Quanta in the zone, held by the building"""
+        return float(self.building.quanta[self.zone])
+
+    @quanta_in_microenvironment.setter
+    def quanta_in_microenvironment(self, quanta):
+        self.building.quanta[self.zone] = quanta
+
+    def run(self):
+        """Process of the zone, which ends at once as the building advances the quanta in all zones, see Building.run"""
+        yield from ()
+
+
+class Building:
+    """ Building made up of well-mixed zones with air flowing between them
+
+    Each zone exchanges air with outside the building at its air exchange rate, and with other
+    zones through an airflow matrix, where flow[i, j] is the volume of air flowing from zone i
+    to zone j per hour. The quanta in zone i then change as
+
+        dq_i/dt = - (aer_i + sum_j flow[i, j] / V_i) q_i + sum_j flow[j, i] q_j / V_j + emissions_i
+
+    Between emissions this is a linear system, so the quanta in all zones are advanced by one
+    period with a single matrix multiplication by exp(A * time_interval), computed once. With
+    no airflow between zones this is the same reduction of quanta as a microenvironment.
+    """
+
+    def __init__(self, simulation_params, zones, airflow=None):
+        """Create the zones of the building
+
+        Arguments:
+            simulation_params {dictionary} -- Parameters for that drive the simulation
+            zones {dictionary} -- Zone name to microenvironment parameters (volume, air-exchange-rate, visitor-capacity)
+
+        Keyword Arguments:
+            airflow {dictionary or numpy array} -- Airflow between zones in m^3 per hour, either a dictionary
+                                                   of (from zone, to zone) to flow or a square array in the
+                                                   order of the zones (default: {None})
+        """
+        self.env = simulation_params.get('simpy_env', None)
+        self.time_interval = simulation_params.get('time_interval', None)
+
+        CheckList.fail_if_dict_empty(zones)
+        self.zone_names = list(zones)
+        self.zone_index = {name: index for index, name in enumerate(self.zone_names)}
+
+        self.quanta = np.zeros(len(self.zone_names))
+        self.volumes = np.array([zones[name].get('volume') for name in self.zone_names], dtype=float)
+        self.air_exchange_rates = np.array([zones[name].get('air-exchange-rate') for name in self.zone_names], dtype=float)
+        self.airflow = self.airflow_matrix(airflow)
+
+        self.transition = matrix_exponential(self.rate_matrix() * self.time_interval)
+
+        self.zones = {}
+        for name in self.zone_names:
+            capacity = zones[name].get('visitor-capacity')
+            capacity = None if capacity == 0 else capacity
+            self.zones[name] = BuildingZone(simulation_params, self, self.zone_index[name], name,
+                                            zones[name].get('volume'), zones[name].get('air-exchange-rate'),
+                                            capacity=capacity)
+
+
+    def airflow_matrix(self, airflow):
+        """Convert the airflow between zones to a matrix in zone order
+
+        Arguments:
+            airflow {dictionary, numpy array or None} -- Airflow between zones in m^3 per hour
+
+        Returns:
+            numpy array -- flow[i, j] is the airflow from zone i to zone j
+        """
+        zones = len(self.zone_names)
+        if airflow is None:
+            return np.zeros((zones, zones))
+
+        if isinstance(airflow, dict):
+            matrix = np.zeros((zones, zones))
+            for (from_zone, to_zone), flow in airflow.items():
+                CheckList.fail_if_not_in_list(from_zone, self.zone_names)
+                CheckList.fail_if_not_in_list(to_zone, self.zone_names)
+                Check.is_greater_than_or_equal_to_zero(flow)
+                matrix[self.zone_index[from_zone], self.zone_index[to_zone]] += flow
+        else:
+            matrix = np.array(airflow, dtype=float)
+            if matrix.shape != (zones, zones):
+                raise ValueError('airflow matrix must have one row and column for each zone')
+            if (matrix < 0).any():
+                raise ValueError('airflow must be greater than, or equal to, zero')
+
+        np.fill_diagonal(matrix, 0.0)
+        return matrix
+
+
+    def rate_matrix(self):
+        """Matrix A of the linear system dq/dt = A q, with time in hours"""
+        outflow = self.air_exchange_rates + self.airflow.sum(axis=1) / self.volumes
+        return (self.airflow / self.volumes[:, np.newaxis]).T - np.diag(outflow)
+
+
+    def run(self):
+        """ Advance the quanta in all zones of the building """
+        while True:
+            self.quanta = self.transition @ self.quanta
+
+            yield self.env.timeout(1)
+
+
+    def steady_state_quanta(self, emission_rates):
+        """Quanta in each zone once the emitters have been present long enough for them to stop changing
+
+        Each period q = T q + e dt, where T is the transition matrix, so q = (I - T)^-1 e dt.
+
+        Arguments:
+            emission_rates {numpy array} -- Quanta emitted per hour in each zone, in zone order
+
+        Returns:
+            numpy array -- Quanta in each zone, in zone order
+        """
+        emission_rates = np.asarray(emission_rates, dtype=float)
+        if emission_rates.shape != self.quanta.shape:
+            raise ValueError('emission rates must have one value for each zone')
+
+        return np.linalg.solve(np.eye(len(self.zone_names)) - self.transition, emission_rates * self.time_interval)
+
+
+    def get_quanta_concentrations(self):
+        """Quanta concentration in each zone
+
+        Returns:
+            numpy array -- Quanta per m^3 in each zone, in zone order
+        """
+        return self.quanta / self.volumes
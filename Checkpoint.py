@@ -0,0 +1,637 @@
+""" Python library to model the spread of infectious diseases within a microenvironment """
+
+import os
+import copy
+import heapq
+import pickle
+import random
+import itertools
+
+from simpy.events import PENDING, Condition, Process, Timeout
+
+# Import local libraries
+from HealthDES.DataCollection import DataCollection
+from HealthDES.PersonBase import Person_base
+from HealthDES.ReportStorage import AggregateReport, ColumnarReport
+
+from Activity import Visitor_activity
+from Building import Building, BuildingZone
+from DiseaseProgression import DiseaseProgression, DiseaseState
+from Microenvironment import Microenvironment
+from Person import Person
+from Population import Population
+
+# Version of the checkpoint file format
+CHECKPOINT_VERSION = 2
+
+
+class Checkpoint:
+    """ Snapshot of a running simulation, from which the simulation is resumed
+
+    The snapshot holds the simulation time, the quanta and exposure state of the microenvironments,
+    the population, who is in and who is queueing for each microenvironment, the pending timeouts
+    and the processes waiting for them, the person ID counter, the state of the random number
+    generators and random streams, and the report rows, counters and report settings of the data
+    collection.
+
+    Simpy processes are generators, which cannot be saved. Each process of the model is described
+    instead by the events it is waiting for and the local variables of its generator, and is
+    restored as a generator that waits for the same events and then carries on as the original
+    would have. The pending timeouts are rescheduled at their exact times and in their original
+    order, so that events at the same time happen in the same order, and a resumed simulation
+    gives the same results as one run without a break.
+
+    A checkpoint is taken between runs of the simulation, e.g. after Simulation.run(until=...),
+    when every pending event is a timeout. Only the processes of the model are restored: the
+    microenvironments, building, periodic reports, arrivals, people, visitor activities and
+    disease progression. Disease transitions given as callables must be picklable to save a
+    checkpoint, and the instrumentation, if any, is not checkpointed.
+
+    A checkpoint file is a sequence of pickled sections, the simulation, the population, each
+    report and the processes, written one at a time. The arrays are trimmed to the rows in use
+    and stored in binary.
+    """
+
+    def __init__(self, sections):
+        """Create a checkpoint from its sections, see capture and load
+
+        Arguments:
+            sections {dictionary} -- Section name to the state it holds
+        """
+        self.sections = sections
+
+
+    @property
+    def time(self):
+        """Simulation time of the checkpoint"""
+        return self.sections['simulation']['time']
+
+
+    @property
+    def simulation_arguments(self):
+        """Keyword arguments to create a simulation with the settings of the checkpointed simulation"""
+        return self.sections['simulation']['arguments']
+
+
+    def warm_start_state(self):
+        """Quanta and occupancy of each microenvironment, to warm start a new simulation, see Simulation
+
+        Returns:
+            dictionary -- Microenvironment name to {'quanta': quanta, 'occupancy': people in the microenvironment}
+        """
+        return {name: {'quanta': state['quanta'], 'occupancy': len(state['users'])}
+                for name, state in self.sections['simulation']['microenvironments'].items()}
+
+
+    @classmethod
+    def capture(cls, simulation):
+        """Snapshot the state of a simulation at the current simulation time
+
+        Arguments:
+            simulation {Simulation} -- Simulation between runs
+
+        Returns:
+            Checkpoint -- Snapshot of the simulation
+        """
+        if simulation.run_parameters is None:
+            raise ValueError('the simulation has not been started')
+
+        dc = simulation.dc
+        if dc.spilled_reports:
+            raise ValueError('reports spilled to disk cannot be checkpointed')
+
+        processes = _ProcessCapture(simulation)
+
+        # The counter is restarted at the next ID, as the next ID can only be read by taking it
+        next_PID = next(Person_base.get_new_id)
+        Person_base.get_new_id = itertools.count(next_PID)
+
+        sections = {}
+        sections['simulation'] = {
+            'time': simulation.env.now,
+            'arguments': {'simulation_name': simulation.simulation_name,
+                          'simulation_run': dc.simulation_run,
+                          'microenvironment': simulation.microenvironment_name,
+                          'periods': simulation.periods,
+                          'report_settings': simulation.report_settings,
+                          'zones': simulation.zones,
+                          'airflow': simulation.airflow,
+                          'exposure_mode': simulation.exposure_mode,
+                          'disease_transitions': simulation.simulation_params.get('disease_transitions'),
+                          'arrival_process': simulation.arrival_process,
+                          'common_random_numbers': simulation.common_random_numbers,
+                          'memory_budget': simulation.memory_budget,
+                          'spill_path': simulation.spill_path},
+            'run parameters': dict(simulation.run_parameters),
+            'next PID': next_PID,
+            'random state': simulation.rng.getstate(),
+            'random streams': copy.deepcopy(simulation.streams),
+            'microenvironments': {name: cls.capture_microenvironment(microenvironment, processes)
+                                  for name, microenvironment in simulation.microenvironments.items()},
+            'building quanta': simulation.building.quanta.copy() if simulation.building else None,
+            'counters': dict(dc.counters),
+            'report settings': copy.deepcopy(dc.report_settings),
+            'default report settings': dict(dc.default_report_settings),
+            'sampling state': dc.sampling_rng.getstate()}
+
+        population = simulation.population
+        sections['population'] = {'size': population.size,
+                                  'type_names': list(population.type_names),
+                                  'arrays': {name: getattr(population, name)[:population.size].copy() for name in Population.columns}}
+
+        sections['reports'] = {name: cls.capture_report(report) for name, report in dc.reports.items()}
+
+        sections['processes'] = processes.finish()
+
+        return cls(sections)
+
+
+    @staticmethod
+    def capture_microenvironment(microenvironment, processes):
+        """State of a microenvironment, and the people in it and queueing for it"""
+        resource = microenvironment.microenvironment
+        return {'volume': microenvironment.volume,
+                'air_exchange_rate': microenvironment.air_exchange_rate,
+                'quanta': microenvironment.quanta_in_microenvironment,
+                'emission_rate': microenvironment.emission_rate,
+                'last_update': microenvironment.last_update,
+                'cumulative_exposure': microenvironment.cumulative_exposure,
+                'open_exposures': [(processes.person(person), start) for person, start in microenvironment.open_exposures.items()],
+                'users': [processes.activity_of_request(request) for request in resource.users],
+                'queue': [processes.activity_of_request(request) for request in resource.queue]}
+
+
+    @staticmethod
+    def capture_report(report):
+        """Rows of a report, trimmed copies of its column arrays, or a copy of an aggregate report"""
+        if isinstance(report, AggregateReport):
+            return {'columns': list(report.columns), 'aggregate': copy.deepcopy(report)}
+        if not isinstance(report, ColumnarReport):
+            raise ValueError('only columnar report storage can be checkpointed')
+
+        return {'columns': list(report.columns),
+                'rows': report.rows,
+                'arrays': {name: None if array is None else array[:report.rows].copy() for name, array in report.arrays.items()}}
+
+
+    def save(self, path):
+        """Write the checkpoint to a file, one section at a time
+
+        The checkpoint is written to a temporary file which then replaces the file, so the file
+        always holds a complete checkpoint.
+
+        Arguments:
+            path {string} -- File to write to
+        """
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'wb') as file:
+            pickle.dump(CHECKPOINT_VERSION, file, protocol=pickle.HIGHEST_PROTOCOL)
+            for name, section in self.sections.items():
+                if name == 'reports':
+                    for report_name, report in section.items():
+                        pickle.dump(('report', report_name, report), file, protocol=pickle.HIGHEST_PROTOCOL)
+                else:
+                    pickle.dump((name, None, section), file, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(temporary_path, path)
+
+
+    @classmethod
+    def load(cls, path):
+        """Read a checkpoint from a file
+
+        Arguments:
+            path {string} -- File written by save
+
+        Returns:
+            Checkpoint -- The checkpoint
+        """
+        sections = {'reports': {}}
+        with open(path, 'rb') as file:
+            version = pickle.load(file)
+            if version != CHECKPOINT_VERSION:
+                raise ValueError(f'checkpoint version {version} is not supported, expected version {CHECKPOINT_VERSION}')
+
+            while True:
+                try:
+                    name, report_name, section = pickle.load(file)
+                except EOFError:
+                    break
+
+                if name == 'report':
+                    sections['reports'][report_name] = section
+                else:
+                    sections[name] = section
+
+        return cls(sections)
+
+
+    def restore(self, simulation):
+        """Restore the checkpointed state into a newly created simulation
+
+        The model is rebuilt from the configuration, and the processes started as it is rebuilt
+        are replaced by those of the checkpoint. Each restore works on a copy of the checkpoint,
+        so simulations restored from the same checkpoint share no state.
+
+        Arguments:
+            simulation {Simulation} -- Simulation created with the simulation arguments of the checkpoint
+        """
+        sections = copy.deepcopy(self.sections)
+        state = sections['simulation']
+        env = simulation.env
+
+        simulation.create_microenvironments(names=list(state['microenvironments']))
+        simulation.start(**state['run parameters'])
+
+        # pylint: disable=protected-access
+        env._queue.clear()
+        env._now = state['time']
+
+        Person_base.get_new_id = itertools.count(state['next PID'])
+        simulation.rng.setstate(state['random state'])
+        simulation.streams = state['random streams']
+        simulation.simulation_params['random_streams'] = simulation.streams
+
+        self.restore_data_collection(simulation.dc, state, sections['reports'])
+        self.restore_population(simulation.population, sections['population'])
+
+        for name, microenvironment_state in state['microenvironments'].items():
+            microenvironment = simulation.microenvironments[name]
+            microenvironment.volume = microenvironment_state['volume']
+            microenvironment.air_exchange_rate = microenvironment_state['air_exchange_rate']
+            if not isinstance(microenvironment, BuildingZone):
+                microenvironment.quanta_in_microenvironment = microenvironment_state['quanta']
+            microenvironment.emission_rate = microenvironment_state['emission_rate']
+            microenvironment.last_update = microenvironment_state['last_update']
+            microenvironment.cumulative_exposure = microenvironment_state['cumulative_exposure']
+
+        if simulation.building:
+            simulation.building.quanta = state['building quanta']
+
+        _ProcessRestore(simulation, sections['processes'], state['microenvironments']).restore()
+
+
+    @staticmethod
+    def restore_data_collection(dc, state, reports):
+        """Restore the counters, report settings, report sampling generator and report rows"""
+        dc.counters = state['counters']
+        dc.report_settings = state['report settings']
+        dc.default_report_settings = state['default report settings']
+        dc.sampling_rng.setstate(state['sampling state'])
+
+        dc.reports = {}
+        for name, report_state in reports.items():
+            if 'aggregate' in report_state:
+                dc.reports[name] = report_state['aggregate']
+                continue
+            report = dc.create_report(name, dict.fromkeys(report_state['columns'][1:]))
+            report.arrays = report_state['arrays']
+            report.rows = report.capacity = report_state['rows']
+
+
+    @staticmethod
+    def restore_population(population, population_state):
+        """Restore the population arrays and person types"""
+        for name, array in population_state['arrays'].items():
+            setattr(population, name, array)
+        population.size = population.capacity = population_state['size']
+        population.type_names = population_state['type_names']
+        population.type_codes = {person_type: code for code, person_type in enumerate(population.type_names)}
+
+
+def _waiting_processes(event):
+    """Processes waiting for an event, directly or through a condition that has not yet triggered"""
+    for callback in event.callbacks or ():
+        owner = getattr(callback, '__self__', None)
+        if owner is event:
+            # A condition checks itself when it is processed
+            continue
+        if isinstance(owner, Process):
+            yield owner
+        elif isinstance(owner, Condition) and owner._value is PENDING:  # pylint: disable=protected-access
+            yield from _waiting_processes(owner)
+
+
+# Generators of the processes restored from a checkpoint, each waits for the event the original
+# process was waiting for and then carries on as it would have
+
+def _resume(wake, generator):
+    """Wait for an event, then run a generator"""
+    yield wake
+    yield from generator
+
+
+def _resume_tick_visit(activity, visitor, request_to_leave, periods, end_trigger, period_trigger):
+    """Wait for the end of the period of an infected or susceptible visitor, then carry on with their visit"""
+    fired_trigger = yield period_trigger | end_trigger
+    if fired_trigger == {end_trigger: 'end'}:
+        request_to_leave.succeed()
+        return
+
+    yield from visitor(None, request_to_leave, periods, end_trigger=end_trigger)
+
+
+def _resume_event_visit(activity, departure, quanta_emission_rate):
+    """Wait for an event driven visit to end, then stop emitting or sample infection"""
+    yield departure
+
+    microenvironment = activity.microenvironment
+    if quanta_emission_rate is not None:
+        microenvironment.remove_emitter(quanta_emission_rate)
+    elif activity.person in microenvironment.open_exposures:
+        activity.person.expose_person_to_dose(microenvironment.close_exposure(activity.person))
+
+
+def _resume_progression(progression, wake, state, next_state, generator):
+    """Wait for the next transition of a person's disease state, then carry on with their progression"""
+    yield wake
+
+    # The state may have been changed by a bulk transition in the meantime
+    if progression.is_state(state):
+        progression.set_state(next_state)
+
+    yield from generator
+
+
+class _ProcessCapture:
+    """ Descriptions of the processes of a simulation and the events they are waiting for """
+
+    def __init__(self, simulation):
+        """Find the processes waiting for the pending timeouts and for entry to a microenvironment"""
+        self.simulation = simulation
+        env = simulation.env
+
+        self.processes = []
+        self.process_ids = {}
+        self.events = {}
+        self.persons = {}
+
+        # Timeouts in the order they are processed, events no process waits for are dropped,
+        # e.g. the end of the last run
+        self.timeouts = []
+        self.timeout_ids = {}
+        for time, _, _, event in sorted(env._queue, key=lambda item: item[:3]):  # pylint: disable=protected-access
+            if not any(True for _ in _waiting_processes(event)):
+                continue
+            if not isinstance(event, Timeout):
+                raise ValueError('a simulation can only be checkpointed between runs, e.g. after run(until=...)')
+
+            self.timeout_ids[event] = len(self.timeouts)
+            self.timeouts.append((time, event._value))  # pylint: disable=protected-access
+
+        for event in self.timeout_ids:
+            for process in _waiting_processes(event):
+                self.process_id(process)
+
+
+    def process_id(self, process):
+        """Id of a process, the process is described when first seen"""
+        process_id = self.process_ids.get(process)
+        if process_id is None:
+            process_id = self.process_ids[process] = len(self.processes)
+            self.processes.append(None)
+            self.processes[process_id] = self.describe(process)
+        return process_id
+
+
+    def event_id(self, event):
+        """Id of an event that is not a timeout, e.g. an activity finishing, the processes waiting for it are described"""
+        event_id = self.events.get(event)
+        if event_id is None:
+            event_id = self.events[event] = len(self.events)
+            for process in _waiting_processes(event):
+                self.process_id(process)
+        return event_id
+
+
+    def timeout_id(self, event):
+        """Id of a pending timeout"""
+        return self.timeout_ids[event]
+
+
+    def person(self, person):
+        """Index of a person, whose routing and type are recorded"""
+        self.persons[person.index] = {'routing_node_id': person.routing_node_id, 'person_type': person.person_type}
+        return person.index
+
+
+    def activity_of_request(self, request):
+        """Index of the person making a request for entry to a microenvironment"""
+        self.process_id(request.proc)
+        return self.person(request.proc._generator.gi_frame.f_locals['self'].person)  # pylint: disable=protected-access
+
+
+    def finish(self):
+        """Processes section of the checkpoint"""
+        return {'timeouts': self.timeouts,
+                'events': len(self.events),
+                'persons': self.persons,
+                'processes': self.processes}
+
+
+    def describe(self, process):
+        """Description of a process, from its generator and the event it is waiting for"""
+        # pylint: disable=protected-access
+        generator = process._generator
+        while generator.gi_yieldfrom is not None:
+            generator = generator.gi_yieldfrom
+
+        code = generator.gi_code
+        local = generator.gi_frame.f_locals
+        target = process._target
+
+        if code is _resume.__code__:
+            # Resumed process still waiting to carry on, described by the generator it carries on with
+            generator = local['generator']
+            code = generator.gi_code
+            local = generator.gi_frame.f_locals
+
+        if code is Microenvironment.run.__code__:
+            return {'kind': 'microenvironment', 'name': local['self'].environment_name,
+                    'wake': self.timeout_id(target)}
+
+        if code is Building.run.__code__:
+            return {'kind': 'building', 'wake': self.timeout_id(target)}
+
+        if code is DataCollection.periodic_reporting.__code__:
+            callback = local['callback']
+            if not isinstance(getattr(callback, '__self__', None), Microenvironment):
+                raise ValueError(f'cannot checkpoint the periodic report {local["data_set_name"]}')
+            return {'kind': 'periodic report', 'data_set_name': local['data_set_name'],
+                    'microenvironment': callback.__self__.environment_name, 'callback': callback.__name__,
+                    'periods': local['periods'], 'wake': self.timeout_id(target)}
+
+        if code is self.simulation.create_people.__func__.__code__:
+            arguments = {name: local[name] for name in ('arrivals_per_hour', 'max_arrivals', 'quanta_emission_rate',
+                                                        'inhalation_rate', 'starting_node_id', 'index_case', 'generated_people')}
+            return {'kind': 'arrivals', 'arguments': arguments, 'wake': self.timeout_id(target)}
+
+        if code is Person_base.run.__code__:
+            return {'kind': 'person', 'person': self.person(local['self']), 'finished': self.event_id(target)}
+
+        if code is Visitor_activity.start.__code__:
+            activity = local['self']
+            if type(activity) is not Visitor_activity:
+                raise ValueError(f'cannot checkpoint the activity {type(activity).__name__}')
+
+            if target is local['request_entry']:
+                visit = None
+            elif isinstance(target, Process):
+                visit = ('process', self.process_id(target))
+            else:
+                visit = ('event', self.event_id(target))
+
+            description = {'kind': 'activity', 'person': self.person(activity.person),
+                           'microenvironment': activity.microenvironment.environment_name,
+                           'duration': activity.duration, 'visit': visit}
+            description['finished'] = self.event_id(local['finished_activity'])
+            return description
+
+        if code in (Visitor_activity.infected_visitor.__code__, Visitor_activity.susceptible_visitor.__code__, _resume_tick_visit.__code__):
+            activity = local['self'] if 'self' in local else local['activity']
+            visitor_code = code if code is not _resume_tick_visit.__code__ else local['visitor'].__func__.__code__
+            return {'kind': 'tick visit', 'person': self.person(activity.person),
+                    'infected': visitor_code is Visitor_activity.infected_visitor.__code__,
+                    'request_to_leave': self.event_id(local['request_to_leave']), 'periods': local['periods'],
+                    'end_trigger': self.timeout_id(local['end_trigger']),
+                    'period_trigger': self.timeout_id(local['period_trigger'])}
+
+        if code in (Visitor_activity.visitor_event_exposure.__code__, _resume_event_visit.__code__):
+            activity = local['self'] if 'self' in local else local['activity']
+            return {'kind': 'event visit', 'person': self.person(activity.person),
+                    'quanta_emission_rate': local.get('quanta_emission_rate'), 'departure': self.timeout_id(target)}
+
+        if code in (DiseaseProgression.progress.__code__, _resume_progression.__code__):
+            if code is _resume_progression.__code__:
+                progression = local['progression']
+                rng = local['generator'].gi_frame.f_locals['rng']
+            else:
+                progression = local['self']
+                rng = local['rng']
+            return {'kind': 'progression', 'person': progression.index,
+                    'state': int(local['state']), 'next_state': int(local['next_state']),
+                    'random state': None if rng is self.simulation.rng else rng.getstate(),
+                    'wake': self.timeout_id(target)}
+
+        raise ValueError(f'cannot checkpoint the process {generator.__qualname__}')
+
+
+class _ProcessRestore:
+    """ Restore the pending timeouts, and the processes waiting for them, of a checkpoint """
+
+    def __init__(self, simulation, section, microenvironments):
+        """Create the timeouts, the events processes wait for and the requests for entry to microenvironments"""
+        self.simulation = simulation
+        self.section = section
+        env = simulation.env
+
+        # Created in their original order, so that timeouts at the same time are processed in the same order
+        self.timeouts = [env.timeout(time - env.now, value=value) for time, value in section['timeouts']]
+
+        # Scheduled at their original times, time - now may round, and an integer time would become a float
+        times = dict(zip(self.timeouts, (time for time, _ in section['timeouts'])))
+        env._queue[:] = [(times[event], priority, event_id, event) for _, priority, event_id, event in env._queue]  # pylint: disable=protected-access
+        heapq.heapify(env._queue)  # pylint: disable=protected-access
+        self.events = [env.event() for _ in range(section['events'])]
+
+        self.persons = {}
+        self.activities = {}
+        self.processes = {}
+
+        # People in each microenvironment are granted entry again, ahead of those queueing
+        self.requests = {}
+        for name, microenvironment_state in microenvironments.items():
+            microenvironment = simulation.microenvironments[name]
+            for index in microenvironment_state['users'] + microenvironment_state['queue']:
+                self.requests[index] = microenvironment.request_entry()
+
+            for index, start in microenvironment_state['open_exposures']:
+                microenvironment.open_exposures[self.person(index)] = start
+
+
+    def person(self, index):
+        """Person viewing a row of the population"""
+        person = self.persons.get(index)
+        if person is None:
+            details = self.section['persons'][index]
+            person = self.persons[index] = Person(self.simulation.simulation_params, details['routing_node_id'],
+                                                  person_type=details['person_type'], index=index)
+        return person
+
+
+    def restore(self):
+        """Start the restored processes, the activities after the visits they wait for"""
+        descriptions = self.section['processes']
+
+        for description in descriptions:
+            if description['kind'] == 'activity':
+                self.activities[description['person']] = Visitor_activity(self.simulation.simulation_params,
+                                                                          person=self.person(description['person']),
+                                                                          microenvironment=self.simulation.microenvironments[description['microenvironment']],
+                                                                          duration=description['duration'])
+
+        for process_id, description in enumerate(descriptions):
+            if description['kind'] != 'activity':
+                self.processes[process_id] = self.simulation.env.process(self.generator(description))
+
+        for process_id, description in enumerate(descriptions):
+            if description['kind'] == 'activity':
+                self.processes[process_id] = self.simulation.env.process(self.generator(description))
+
+                # The request is owned by the activity, as if the activity had made it
+                self.requests[description['person']].proc = self.processes[process_id]
+
+
+    def generator(self, description):
+        """Generator of a restored process"""
+        simulation = self.simulation
+        kind = description['kind']
+
+        if kind == 'microenvironment':
+            return _resume(self.timeouts[description['wake']], simulation.microenvironments[description['name']].run())
+
+        if kind == 'building':
+            return _resume(self.timeouts[description['wake']], simulation.building.run())
+
+        if kind == 'periodic report':
+            callback = getattr(simulation.microenvironments[description['microenvironment']], description['callback'])
+            return _resume(self.timeouts[description['wake']],
+                           simulation.dc.periodic_reporting(description['data_set_name'], callback, description['periods']))
+
+        if kind == 'arrivals':
+            return _resume(self.timeouts[description['wake']], simulation.create_people(**description['arguments']))
+
+        if kind == 'person':
+            return _resume(self.events[description['finished']], self.person(description['person']).run())
+
+        if kind == 'activity':
+            visit = description['visit']
+            if visit is not None:
+                visit = self.processes[visit[1]] if visit[0] == 'process' else self.events[visit[1]]
+            return self.activities[description['person']].start(self.events[description['finished']],
+                                                                 request_entry=self.requests[description['person']],
+                                                                 visit=visit)
+
+        if kind == 'tick visit':
+            activity = self.activities[description['person']]
+            visitor = activity.infected_visitor if description['infected'] else activity.susceptible_visitor
+            return _resume_tick_visit(activity, visitor, self.events[description['request_to_leave']], description['periods'],
+                                      self.timeouts[description['end_trigger']], self.timeouts[description['period_trigger']])
+
+        if kind == 'event visit':
+            return _resume_event_visit(self.activities[description['person']], self.timeouts[description['departure']],
+                                       description['quanta_emission_rate'])
+
+        if kind == 'progression':
+            progression = DiseaseProgression(population=simulation.population, index=description['person'])
+            rng = simulation.rng
+            if description['random state'] is not None:
+                rng = random.Random()
+                rng.setstate(description['random state'])
+
+            transitions = simulation.simulation_params.get('disease_transitions')
+            return _resume_progression(progression, self.timeouts[description['wake']],
+                                       DiseaseState(description['state']), DiseaseState(description['next_state']),
+                                       progression.progress(simulation.env, transitions, rng, simulation.time_interval))
+
+        raise ValueError(f'unknown process {kind} in the checkpoint')
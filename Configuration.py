@@ -1,21 +1,184 @@
 """ Python library to model the spread of infectious diseases within a microenvironment """
 
-import pandas as pd
+import os
+import hashlib
+import pickle
+import tempfile
+from types import MappingProxyType
+
+
+# Default location of the environment database, relative to the working directory
+DATABASE_PATH = os.path.join('.', 'Configuration', 'Environment database.xlsx')
+
+# Binary sidecar written next to the workbook holding the parsed database
+SIDECAR_SUFFIX = '.cache'
+SIDECAR_FORMAT = 1
 
 
 class Config:
+    """ Configuration of the microenvironments used within the simulation
+
+    Parsing the Excel workbook is slow relative to a single simulation run. The parsed database
+    is therefore held in a process-wide cache, and written to a binary sidecar next to the workbook
+    keyed by the workbook's modification time, size and SHA-256 hash. The workbook is only parsed
+    again when its content changes.
+
+    The imported microenvironments are read-only mappings shared between every Config in the
+    process, so a loaded Config may be passed to many simulations (or parallel workers) safely.
+    """
+
+    # Process-wide cache: absolute workbook path -> ((mtime_ns, size), microenvironments)
+    _cache = {}
 
-    def __init__(self):
+    def __init__(self, database_path=None):
+        """Create an empty configuration
 
+        Keyword Arguments:
+            database_path {string} -- Path to the environment database workbook (default: {DATABASE_PATH})
+        """
+        self.database_path = database_path if database_path else DATABASE_PATH
         self.microenvironments = {}
 
-    def import_microenvironments(self):
-        file_db = pd.read_excel('./Configuration/Environment database.xlsx', header=4, engine='openpyxl')
 
-        for _, row in file_db.iterrows():
-            config_name = row['environment']
-            params = row.to_dict()
-            self.microenvironments[config_name] = params
+    @classmethod
+    def load(cls, database_path=None, use_sidecar=True):
+        """Create a configuration with the microenvironments already imported
+
+        Keyword Arguments:
+            database_path {string} -- Path to the environment database workbook (default: {DATABASE_PATH})
+            use_sidecar {bool} -- Read and write the binary sidecar cache (default: {True})
+
+        Returns:
+            Config -- Configuration holding the shared, read-only microenvironment database
+        """
+        config = cls(database_path)
+        config.import_microenvironments(use_sidecar=use_sidecar)
+        return config
+
+
+    def import_microenvironments(self, use_sidecar=True):
+        """Import the microenvironments from the environment database
+
+        Keyword Arguments:
+            use_sidecar {bool} -- Read and write the binary sidecar cache (default: {True})
+        """
+        path = os.path.abspath(self.database_path)
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        cached = Config._cache.get(path)
+        if cached is None or cached[0] != signature:
+            microenvironments = self._read_sidecar(path, signature) if use_sidecar else None
+            if microenvironments is None:
+                microenvironments = self._parse_workbook(path)
+                if use_sidecar:
+                    self._write_sidecar(path, signature, self._hash_file(path), microenvironments)
+
+            cached = (signature, self._freeze(microenvironments))
+            Config._cache[path] = cached
+
+        self.microenvironments = cached[1]
+
+
+    @classmethod
+    def clear_cache(cls):
+        """Clear the process-wide cache, the next import will read the sidecar or workbook"""
+        cls._cache.clear()
+
+
+    # Workbook parsing and sidecar handling
+
+    @staticmethod
+    def _parse_workbook(path):
+        """Parse the workbook into a dictionary of microenvironment parameters keyed by name"""
+        import pandas as pd
+
+        file_db = pd.read_excel(path, header=4, engine='openpyxl')
+
+        microenvironments = {}
+        for params in file_db.to_dict('records'):
+            microenvironments[params['environment']] = params
+
+        return microenvironments
+
+
+    @staticmethod
+    def _hash_file(path):
+        """Return the SHA-256 hex digest of a file"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+
+    @staticmethod
+    def _read_sidecar(path, signature):
+        """Return the microenvironments stored in the sidecar, or None if missing or stale
+
+        The sidecar is accepted when the workbook modification time and size are unchanged. If
+        only the modification time differs (e.g. the file was copied) the content hash decides.
+        """
+        sidecar_path = path + SIDECAR_SUFFIX
+        try:
+            with open(sidecar_path, 'rb') as file:
+                sidecar = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            return None
+
+        if not isinstance(sidecar, dict) or sidecar.get('format') != SIDECAR_FORMAT:
+            return None
+
+        if sidecar.get('signature') == signature:
+            return sidecar['microenvironments']
+
+        sha256 = Config._hash_file(path)
+        if sidecar.get('sha256') == sha256:
+            Config._write_sidecar(path, signature, sha256, sidecar['microenvironments'])
+            return sidecar['microenvironments']
+
+        return None
+
+
+    @staticmethod
+    def _write_sidecar(path, signature, sha256, microenvironments):
+        """Atomically write the sidecar so concurrent processes never read a partial file"""
+        sidecar = { 'format':SIDECAR_FORMAT,
+                    'signature':signature,
+                    'sha256':sha256,
+                    'microenvironments':microenvironments }
+
+        # A read-only location just means no sidecar, the process cache still applies
+        try:
+            handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        except OSError:
+            return
+
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                pickle.dump(sidecar, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path + SIDECAR_SUFFIX)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+    @staticmethod
+    def _freeze(microenvironments):
+        """Return a read-only view of the microenvironment database"""
+        return MappingProxyType({name: MappingProxyType(dict(params)) for name, params in microenvironments.items()})
+
+
+    # Read-only mappings cannot be pickled, convert to dictionaries when sent to worker processes
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['microenvironments'] = {name: dict(params) for name, params in self.microenvironments.items()}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.microenvironments = self._freeze(self.microenvironments)
 
 
 
@@ -26,4 +189,4 @@ if __name__ == "__main__":
     config = Config()
     config.import_microenvironments()
 
-    print('Done.')    
+    print('Done.')
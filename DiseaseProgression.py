@@ -1,37 +1,188 @@
 """ Python library to model the spread of infectious diseases within a microenvironment """
 
-from HealthDES.Check import CheckList
+import random
+from enum import IntEnum
+
+from HealthDES.Check import Check, CheckList
+
+
+class DiseaseState(IntEnum):
+    """ Integer codes for the SEIR disease states """
+
+    SUSCEPTIBLE = 0
+    EXPOSED = 1
+    INFECTED = 2
+    RECOVERED = 3
+
+    @property
+    def label(self):
+        """ Text label of the state """
+        return self.name.lower()
+
+    @classmethod
+    def from_label(cls, infection_status_label):
+        """ State for a text label, raising ValueError if the label is not a disease state """
+        CheckList.fail_if_not_in_list(infection_status_label, DiseaseProgression.disease_states)
+        return cls[infection_status_label.upper()]
+
+    @classmethod
+    def coerce(cls, state):
+        """ State for a DiseaseState or a text label """
+        return state if type(state) is cls else cls.from_label(state)
+
+
+class DiseaseTransitions:
+    """ Timing of the transitions between disease states
+
+    Each period is a number of hours, a callable drawing a number of hours from a random number
+    generator, or a tuple naming a distribution of random.Random and its parameters, e.g.
+    ('gammavariate', 2.0, 24.0) or ('expovariate', 1 / 72). A period of None means the
+    transition does not happen.
+    """
+
+    def __init__(self, latent_period=None, infectious_period=None):
+        """Set the transition timing
+
+        Keyword Arguments:
+            latent_period {number, callable or tuple} -- Hours from exposed to infected (default: {None})
+            infectious_period {number, callable or tuple} -- Hours from infected to recovered (default: {None})
+        """
+        self.latent_period = self.check_period(latent_period)
+        self.infectious_period = self.check_period(infectious_period)
+
+
+    @staticmethod
+    def check_period(period):
+        """Check a period is a non-negative number, callable or distribution of random.Random"""
+        if period is None or callable(period):
+            return period
+        if isinstance(period, tuple):
+            if not period or not isinstance(period[0], str) or not hasattr(random.Random, period[0]):
+                raise ValueError(f'{period} is not a distribution of random.Random')
+            return period
+        Check.is_greater_than_or_equal_to_zero(period)
+        return period
+
+
+    @staticmethod
+    def draw(period, rng):
+        """Draw a period in hours
+
+        Arguments:
+            period {number, callable or tuple} -- Period or distribution of the period
+            rng {random.Random} -- Random number generator
+
+        Returns:
+            number -- Period in hours, None if there is no transition
+        """
+        if period is None:
+            return None
+        if callable(period):
+            return max(0.0, period(rng))
+        if isinstance(period, tuple):
+            return max(0.0, getattr(rng, period[0])(*period[1:]))
+        return period
+
 
 class DiseaseProgression:
-    """ Disease status of person within the model """
-    
+    """ Disease status of person within the model
+
+    The status is an integer coded DiseaseState held by the object, or in the row of a population
+    store when created with a population and index, see Population. Text labels are validated
+    when converted to a state, so tests against a DiseaseState do no validation.
+    """
+
+    __slots__ = ('population', 'index', 'code')
+
     disease_states = ['susceptible','exposed', 'infected','recovered']
 
-    def __init__(self, infection_status_label=None):
-        """ All people have an initial status of susceptible """
+    def __init__(self, infection_status_label=None, population=None, index=None):
+        """ All people have an initial status of susceptible
+
+        Keyword Arguments:
+            infection_status_label {string or DiseaseState} -- Initial disease state, unchanged in the population when None (default: {None})
+            population {Population} -- Population store holding the disease state (default: {None})
+            index {int} -- Index of the person within the population (default: {None})
+        """
+        self.population = population
+        self.index = index
+        self.code = None
+
+        if population is None or infection_status_label is not None:
+            self.set_state(DiseaseState.SUSCEPTIBLE if infection_status_label == None else infection_status_label)
 
-        self.status = DiseaseProgression.valid_state('susceptible') if infection_status_label == None else DiseaseProgression.valid_state(infection_status_label)
-        
 
     @staticmethod
     def valid_state(infection_status_label):
         """ Checks text and returns text if it is a valid disease state """
 
         CheckList.fail_if_not_in_list(infection_status_label, DiseaseProgression.disease_states)
-        return infection_status_label        
-    
+        return infection_status_label
 
-    def set_state(self, infection_status_label):
-        """ Sets the disease state """
 
-        CheckList.fail_if_not_in_list(infection_status_label, DiseaseProgression.disease_states)
-        self.status = infection_status_label
+    @staticmethod
+    def state_code(infection_status_label):
+        """ Integer code for a valid disease state, given as a label or DiseaseState """
+        return int(DiseaseState.coerce(infection_status_label))
+
+
+    @property
+    def state(self):
+        """ The disease state as a DiseaseState """
+        return DiseaseState(self.code if self.population is None else self.population.disease_state.item(self.index))
+
+
+    @property
+    def status(self):
+        """ The disease state as a text label """
+        return self.state.label
+
+
+    def set_state(self, state):
+        """ Sets the disease state, given as a DiseaseState or label """
+
+        state = DiseaseState.coerce(state)
+        if self.population is None:
+            self.code = state
+        else:
+            self.population.disease_state[self.index] = state
+
+
+    def is_state(self, state):
+        """ Tests disease state, given as a DiseaseState or label, and return True if matches """
+
+        if type(state) is not DiseaseState:
+            state = DiseaseState.from_label(state)
+        if self.population is None:
+            return self.code == state
+        # item() returns a Python int, comparing a NumPy integer with an IntEnum is slow
+        return self.population.disease_state.item(self.index) == state
+
+
+    def progress(self, env, transitions, rng, time_interval):
+        """Simpy process moving the person through the disease states
 
+        An exposed person becomes infected after the latent period, and an infected person
+        recovers after the infectious period. The process ends when a transition has no period.
 
-    def is_state(self, infection_status_label):
-        """ Tests disease state and return True if matches """
+        Arguments:
+            env {simpy environment} -- Simulation environment
+            transitions {DiseaseTransitions} -- Timing of the transitions
+            rng {random.Random} -- Random number generator for the periods
+            time_interval {number} -- Length of a simulation period in hours
+        """
+        steps = {DiseaseState.EXPOSED: (transitions.latent_period, DiseaseState.INFECTED),
+                 DiseaseState.INFECTED: (transitions.infectious_period, DiseaseState.RECOVERED)}
 
-        CheckList.fail_if_not_in_list(infection_status_label, DiseaseProgression.disease_states)    
-        return self.status == infection_status_label
+        while self.state in steps:
+            state = self.state
+            period, next_state = steps[state]
+            hours = DiseaseTransitions.draw(period, rng)
+            if hours is None:
+                return
 
+            yield env.timeout(hours / time_interval)
 
+            # The state may have been changed by a bulk transition in the meantime
+            if self.is_state(state):
+                self.set_state(next_state)
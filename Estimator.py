@@ -0,0 +1,230 @@
+""" Python library to model the spread of infectious diseases within a microenvironment """
+
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+# Import local libraries
+from HealthDES.Check import Check
+
+from Configuration import Config
+
+
+def environment_table(config=None, environments=None):
+    """Rows of the environment database as a pandas dataFrame, one row per environment
+
+    Keyword Arguments:
+        config {Config} -- Already loaded configuration (default: {Config.load()})
+        environments {list of strings} -- Environments to include, all when None (default: {None})
+
+    Returns:
+        pandas dataFrame -- Environment database indexed by environment name
+    """
+    config = config if config else Config.load()
+    names = list(config.microenvironments) if environments is None else list(environments)
+    for name in names:
+        if name not in config.microenvironments:
+            raise ValueError(f'{name} is not an environment in the environment database')
+
+    return pd.DataFrame([dict(config.microenvironments[name]) for name in names], index=pd.Index(names, name='environment'))
+
+
+def cumulative_concentration(t, emission_rate, volume, air_exchange_rate, infector_stay):
+    """Integral of the quanta concentration from the infector's arrival to time t
+
+    The infector arrives at time zero in an empty, well-mixed microenvironment and emits quanta
+    for the length of their stay. The concentration rises as E / (kV) (1 - exp(-kt)) while they are
+    present and decays exponentially once they leave, both integrate in closed form.
+
+    Arguments:
+        t {numpy array} -- Hours since the infector arrived
+        emission_rate {numpy array} -- Quanta emitted by the infector per hour (E)
+        volume {numpy array} -- Volume of the microenvironment in m^3 (V)
+        air_exchange_rate {numpy array} -- Air changes per hour (k)
+        infector_stay {numpy array} -- Hours the infector stays (D)
+
+    Returns:
+        numpy array -- Quanta hours per m^3 up to time t
+    """
+    steady_state = emission_rate / (air_exchange_rate * volume)
+    present = np.minimum(t, infector_stay)
+    absent = np.maximum(t - infector_stay, 0.0)
+
+    while_present = steady_state * (present + np.expm1(-air_exchange_rate * present) / air_exchange_rate)
+    concentration_on_leaving = -steady_state * np.expm1(-air_exchange_rate * present)
+    after_leaving = concentration_on_leaving * -np.expm1(-air_exchange_rate * absent) / air_exchange_rate
+
+    return while_present + after_leaving
+
+
+def cumulative_period_concentration(n, emission_rate, volume, air_exchange_rate, infector_periods, time_interval):
+    """Sum of the quanta concentrations of the first n periods, with the timing of the simulation
+
+    The simulation updates the quanta once per period, q[t] = r q[t-1] + e, where r = exp(-k dt) and
+    e = E dt while the infector is present, and a person reads the concentration after the update
+    of each period they are active in. The sum of the truncated geometric series is closed form.
+
+    Arguments:
+        n {numpy array} -- Number of periods since the infector arrived
+        emission_rate {numpy array} -- Quanta emitted by the infector per hour (E)
+        volume {numpy array} -- Volume of the microenvironment in m^3 (V)
+        air_exchange_rate {numpy array} -- Air changes per hour (k)
+        infector_periods {numpy array} -- Periods in which the infector is active (A)
+        time_interval {number} -- Length of a period in hours (dt)
+
+    Returns:
+        numpy array -- Sum of the concentrations of periods 0 to n - 1, in quanta per m^3
+    """
+    r = np.exp(-air_exchange_rate * time_interval)
+    steady_state = emission_rate * time_interval / (1 - r) / volume
+    present = np.minimum(n, infector_periods)
+    absent = np.maximum(n - infector_periods, 0)
+
+    while_present = steady_state * (present - r * (1 - r ** present) / (1 - r))
+    concentration_on_leaving = steady_state * (1 - r ** infector_periods)
+    after_leaving = concentration_on_leaving * r * (1 - r ** absent) / (1 - r)
+
+    return while_present + after_leaving
+
+
+def estimate_attack_rates(config=None, environments=None, quanta_emission_rate=None, inhalation_rate=None, periods=None, time_interval=1/60, discrete=True):
+    """Expected attack rate, and its variance, for environments of the environment database
+
+    The estimate is for the model of the simulation: the first visitor to arrive is infected and
+    enters an empty microenvironment, visitors arrive at a constant rate, stay for the average
+    length of stay and queue first come first served when the microenvironment is at capacity.
+    Each susceptible visitor is infected with the Wells-Riley probability 1 - exp(-I dose), where
+    the dose is the integral of the concentration over their visit. Arrivals are
+    deterministic, so infections are a sum of independent Bernoulli draws, with mean sum(p) and
+    variance sum(p (1 - p)). The attack rate is infections per visitor, the infected person included,
+    as the attack rate of Replicates.ReplicateResults.
+
+    All environments are calculated together, visitors are laid out on an (environment, visitor)
+    grid padded to the largest number of arrivals. By default the dose follows the timing of the
+    simulation, which updates the concentration once per period and counts a person as present
+    in floor(D) + 1 periods of a stay of D periods. With discrete=False the dose is the continuous
+    time integral, the physical model without the discretisation of the simulation.
+
+    The quantities the risk factors of 'Environment risk analysis.ipynb' approximate are also
+    returned: the steady state concentration per quanta emitted (ventilation), the mean number of
+    visitors present (distance), and the length of stay (time). A risk factor is the ratio of the
+    quantity to that of the base case environment.
+
+    Keyword Arguments:
+        config {Config} -- Already loaded configuration (default: {Config.load()})
+        environments {list of strings} -- Environments to estimate, all when None (default: {None})
+        quanta_emission_rate {number} -- Quanta emitted by the infected person per hour (default: {147})
+        inhalation_rate {number} -- Inhalation rate of susceptible people in m^3 per hour (default: {0.54})
+        periods {number} -- Number of periods the simulation runs (default: {180})
+        time_interval {number} -- Length of a period in hours (default: {1/60})
+        discrete {bool} -- Follow the once per period timing of the simulation (default: {True})
+
+    Returns:
+        pandas dataFrame -- Estimates indexed by environment name
+    """
+    if quanta_emission_rate: Check.is_greater_than_or_equal_to_zero(quanta_emission_rate)
+    if inhalation_rate: Check.is_greater_than_or_equal_to_zero(inhalation_rate)
+    if periods: Check.is_greater_than_zero(periods)
+    Check.is_greater_than_zero(time_interval)
+
+    quanta_emission_rate = quanta_emission_rate if quanta_emission_rate else 147
+    inhalation_rate = inhalation_rate if inhalation_rate else 0.54  # m^3 h^-1
+    periods = periods if periods else 180
+
+    table = environment_table(config, environments)
+    volume = table['volume'].to_numpy(dtype=float)
+    air_exchange_rate = table['air-exchange-rate'].to_numpy(dtype=float)
+    stay = table['average-length-of-stay'].to_numpy(dtype=float)
+    arrival_rate = table['visitor-arrival-rate'].to_numpy(dtype=float)
+    max_arrivals = table['max-arrivals'].fillna(0).to_numpy(dtype=float)
+    capacity = table['visitor-capacity'].fillna(0).to_numpy(dtype=float)
+
+    for name in ('volume', 'air-exchange-rate'):
+        if not (table[name] > 0).all():
+            raise ValueError(f'{name} must be greater than zero in every environment')
+
+    # Visitor grid in periods, arrival j at j / rate and entry with a first come first served capacity limit
+    with np.errstate(divide='ignore'):
+        spacing = np.where(arrival_rate > 0, 1 / (arrival_rate * time_interval), np.inf)
+    duration = stay / time_interval
+
+    # Number of arrivals in the simulation, the first of whom is infected
+    arrivals = np.where(arrival_rate > 0, np.ceil(periods / spacing), 1)
+    arrivals = np.where(max_arrivals > 0, np.minimum(arrivals, max_arrivals), arrivals).astype(np.int64)
+
+    j = np.arange(arrivals.max())[np.newaxis, :]
+    places = np.where(capacity > 0, capacity, arrivals).astype(np.int64)[:, np.newaxis]
+    with np.errstate(invalid='ignore'):
+        arrival_time = np.where(j > 0, j * spacing[:, np.newaxis], 0.0)
+        entry = np.maximum(arrival_time, np.where(j % places > 0, (j % places) * spacing[:, np.newaxis], 0.0) + (j // places) * duration[:, np.newaxis])
+    visitor = (j < arrivals[:, np.newaxis]) & (entry < periods)
+    susceptible = visitor & (j > 0)
+    entry = np.where(susceptible, entry, 0.0)
+
+    # Dose of every susceptible visitor, in quanta hours per m^3
+    if discrete:
+        # Everyone is active in floor(D) + 1 periods, the periods of the simulation
+        active_periods = np.floor(duration) + 1
+        first_period = np.floor(entry)
+        last_period = np.minimum(first_period + active_periods[:, np.newaxis], math.ceil(periods))
+        args = (quanta_emission_rate, volume[:, np.newaxis], air_exchange_rate[:, np.newaxis], active_periods[:, np.newaxis], time_interval)
+        dose = time_interval * (cumulative_period_concentration(last_period, *args) - cumulative_period_concentration(first_period, *args))
+    else:
+        horizon = periods * time_interval
+        start = np.minimum(entry * time_interval, horizon)
+        end = np.minimum(start + stay[:, np.newaxis], horizon)
+        args = (quanta_emission_rate, volume[:, np.newaxis], air_exchange_rate[:, np.newaxis], stay[:, np.newaxis])
+        dose = cumulative_concentration(end, *args) - cumulative_concentration(start, *args)
+
+    dose = np.where(susceptible, dose, 0.0)
+    probability = -np.expm1(-inhalation_rate * dose)
+
+    visitors = visitor.sum(axis=1)
+    susceptible_visitors = susceptible.sum(axis=1)
+    expected_infections = probability.sum(axis=1)
+    infections_variance = (probability * (1 - probability)).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        attack_rate = np.where(visitors > 0, expected_infections / visitors, 0.0)
+        attack_rate_variance = np.where(visitors > 0, infections_variance / visitors ** 2, 0.0)
+        mean_dose = np.where(susceptible_visitors > 0, dose.sum(axis=1) / susceptible_visitors, 0.0)
+
+    occupancy = arrival_rate * stay
+    occupancy = np.where(capacity > 0, np.minimum(occupancy, capacity), occupancy)
+
+    return pd.DataFrame({'visitors': visitors,
+                         'susceptible visitors': susceptible_visitors,
+                         'expected infections': expected_infections,
+                         'infections variance': infections_variance,
+                         'attack rate': attack_rate,
+                         'attack rate variance': attack_rate_variance,
+                         'mean dose': mean_dose,
+                         'steady state concentration': quanta_emission_rate / (air_exchange_rate * volume),
+                         'peak concentration': -quanta_emission_rate / (air_exchange_rate * volume) * np.expm1(-air_exchange_rate * np.minimum(stay, periods * time_interval)),
+                         'ventilation': 1 / (volume * air_exchange_rate),
+                         'mean occupancy': occupancy,
+                         'exposure time': stay},
+                        index=table.index)
+
+
+
+# Run as script to check the estimates against replicates of the vectorised engine
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    from VectorisedSimulation import VectorisedSimulation
+
+    replicates = 1000
+    config = Config.load()
+
+    t_start = time.time()
+    estimates = estimate_attack_rates(config)
+    print(f"Estimated {len(estimates)} environments in {(time.time() - t_start) * 1000:.1f} ms")
+
+    for name, row in estimates.iterrows():
+        results = VectorisedSimulation(name, microenvironment=name, config=config).run_replicates(replicates, seed=2020)
+        infections = results.counters['Infections']
+        standard_error = np.sqrt(row['infections variance'] / replicates)
+        print(f"{name:<45} estimate {row['expected infections']:8.3f} +/- {standard_error:6.3f}  replicates {infections.mean():8.3f}  "
+              f"attack rate estimate {row['attack rate']:.4f}  replicates {results.counters['Attack rate'].mean():.4f}")
@@ -1,5 +1,19 @@
 """ HealthDES class to raise an exception when variables don't meet required conditions """
 
+import numbers
+from contextlib import contextmanager
+
+# Types accepted as numbers without a further check, other real numbers (e.g. numpy.float64) are also accepted
+_NUMBER_TYPES = (int, float)
+
+
+def _is_number(x):
+    """True if x is a real number, including NumPy scalars, but not a bool"""
+    if type(x) in _NUMBER_TYPES:
+        return True
+    return isinstance(x, numbers.Real) and not isinstance(x, bool)
+
+
 class Check:
     """ Class containing functions to check whether values meet certain conditions
 
@@ -12,13 +26,13 @@ class Check:
         """Check that variable is equal to zero.
 
         Args:
-            x (int or float): The variable to be tested.
+            x (int, float or NumPy scalar): The variable to be tested.
 
         Raises:
             ValueError: The variable is not an int or float.
             ValueError: The variable is not equal to zero.
         """
-        if not(type(x) is int or type(x) is float):
+        if not _is_number(x):
             raise ValueError('value must be a number')
         if not (x == 0):
             raise ValueError('value must be equal to zero')
@@ -28,13 +42,13 @@ class Check:
         """Check that variable is not equal to zero.
 
         Args:
-            x (int or float): The variable to be tested.
+            x (int, float or NumPy scalar): The variable to be tested.
 
         Raises:
             ValueError: The variable is not an int or float.
             ValueError: The variable is equal to zero.
         """
-        if not(type(x) is int or type(x) is float):
+        if not _is_number(x):
             raise ValueError('value must be a number')
         if not (x != 0):
             raise ValueError('value must not equal zero')
@@ -44,13 +58,13 @@ class Check:
         """Check that variable is greater than zero.
 
         Args:
-            x (int or float): The variable to be tested.
+            x (int, float or NumPy scalar): The variable to be tested.
 
         Raises:
             ValueError: The variable is not an int or float.
             ValueError: The variable is not greater than zero.
         """
-        if not(type(x) is int or type(x) is float):
+        if not _is_number(x):
             raise ValueError('value must be a number')
         if not (x > 0):
             raise ValueError('value must be greater than zero')
@@ -60,13 +74,13 @@ class Check:
         """Check that variable is greater than or equal to zero.
 
         Args:
-            x (int or float): The variable to be tested.
+            x (int, float or NumPy scalar): The variable to be tested.
 
         Raises:
             ValueError: The variable is not an int or float.
             ValueError: The variable is not greater than or equal to zero.
         """
-        if not(type(x) is int or type(x) is float):
+        if not _is_number(x):
             raise ValueError('value must be a number')
         if not (x >= 0):
             raise ValueError('value must be greater than, or equal to, zero')
@@ -76,13 +90,13 @@ class Check:
         """Check that variable is less than zero.
 
         Args:
-            x (int or float): The variable to be tested.
+            x (int, float or NumPy scalar): The variable to be tested.
 
         Raises:
             ValueError: The variable is not an int or float.
             ValueError: The variable is not less than zero.
         """
-        if not(type(x) is int or type(x) is float):
+        if not _is_number(x):
             raise ValueError('value must be a number')
         if not (x < 0):
             raise ValueError('value must be less than zero')
@@ -92,13 +106,13 @@ class Check:
         """Check that variable is less than or equal to zero.
 
         Args:
-            x (int or float): The variable to be tested.
+            x (int, float or NumPy scalar): The variable to be tested.
 
         Raises:
             ValueError: The variable is not an int or float.
             ValueError: The variable is not less than or equal to zero.
         """
-        if not(type(x) is int or type(x) is float):
+        if not _is_number(x):
             raise ValueError('value must be a number')
         if not (x <= 0):
             raise ValueError('value must be less than, or equal to, zero')
@@ -192,4 +206,68 @@ class CheckList:
         if test_key in di:
             raise ValueError('Cannot have duplicate keys in dictionary')
 
-    
\ No newline at end of file
+
+# Validation levels
+#   full        Every check is made (default)
+#   boundary    Checks are only made within validation_boundary(), e.g. when a simulation is set up
+#   off         No checks are made
+VALIDATION_LEVELS = ['full', 'boundary', 'off']
+
+_validation_level = 'full'
+_boundary_depth = 0
+
+# The checks as defined, restored when checks are enabled
+_checks = {cls: {name: function for name, function in vars(cls).items() if isinstance(function, staticmethod)}
+           for cls in (Check, CheckList)}
+
+
+def _no_check(*args, **kwargs):
+    """Check that is not made"""
+
+
+def _enable_checks(enabled):
+    """Bind the checks, or a function that does nothing, to the check classes"""
+    for cls, checks in _checks.items():
+        for name, function in checks.items():
+            setattr(cls, name, function if enabled else staticmethod(_no_check))
+
+
+def set_validation_level(level):
+    """Set the validation level for all checks
+
+    Checks that are not made are replaced by a function that does nothing, so they cost a
+    function call and call sites do not change.
+
+    Arguments:
+        level {string} -- 'full', 'boundary' or 'off'
+    """
+    global _validation_level
+    if level not in VALIDATION_LEVELS:
+        raise ValueError(f'validation level must be one of {VALIDATION_LEVELS}')
+
+    _validation_level = level
+    _enable_checks(level == 'full' or (level == 'boundary' and _boundary_depth > 0))
+
+
+def get_validation_level():
+    """Get the validation level, see set_validation_level"""
+    return _validation_level
+
+
+@contextmanager
+def validation_boundary():
+    """Context in which checks are made when the validation level is boundary
+
+    Used where data enters the simulation, e.g. when the simulation is set up, so that the
+    checks made every period while the simulation runs can be skipped.
+    """
+    global _boundary_depth
+    _boundary_depth += 1
+    if _boundary_depth == 1 and _validation_level == 'boundary':
+        _enable_checks(True)
+    try:
+        yield
+    finally:
+        _boundary_depth -= 1
+        if _boundary_depth == 0 and _validation_level == 'boundary':
+            _enable_checks(False)
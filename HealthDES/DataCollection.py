@@ -1,13 +1,53 @@
 """ Python library to model the spread of infectious diseases within a microenvironment """
 
-import pandas as pd # modin
+import os
+import random
+import weakref
+import tempfile
+
 import simpy
-from io import BytesIO, StringIO
-from csv import DictWriter, reader
 
 # Import local libraries
 # pylint: disable=relative-beyond-top-level
 from .Check import Check, CheckList
+from .ReportStorage import REPORT_STORAGE, AggregateReport, SpillFile
+
+class ReportSettings:
+    """ Enablement, decimation and sampling settings for a report
+
+    Decimation keeps every Nth row of a logged report, or collects a periodic report every N
+    times its number of periods. Sampling keeps each row with the given probability. An aggregate
+    report keeps online statistics of its columns instead of the rows, see AggregateReport.
+    """
+    __slots__ = ('enabled', 'every', 'sample_rate', 'aggregate', 'rows_offered')
+
+    def __init__(self, enabled=True, every=1, sample_rate=1.0, aggregate=False):
+        """ Create the settings for a report
+
+        Keyword parameters:
+        enabled             When False the report is not collected
+        every               Keep every Nth row, or collect every N periods (default: 1)
+        sample_rate         Probability that a row is kept (default: 1.0)
+        aggregate           When True the report keeps statistics of its columns, not rows (default: False)
+        """
+        Check.is_greater_than_zero(every)
+        Check.is_greater_than_zero(sample_rate)
+        if sample_rate > 1:
+            raise ValueError('sample rate must be less than, or equal to, one')
+
+        self.enabled = bool(enabled)
+        self.every = int(every)
+        self.sample_rate = sample_rate
+        self.aggregate = bool(aggregate)
+        self.rows_offered = 0
+
+    def keep_row(self, rng):
+        """ Return True if the next row of a logged report is kept """
+        self.rows_offered += 1
+        if self.every > 1 and (self.rows_offered - 1) % self.every:
+            return False
+        return self.sample_rate >= 1 or rng.random() < self.sample_rate
+
 
 class DataCollection:
     """ Class to collect data from across the simulation
@@ -15,31 +55,98 @@ class DataCollection:
     Data collection can be period (driven by periodic simpy event process)
     or logged by other parts of the simulation.
 
-    Data collection writes to an in-memory csv file, which may be exported or converted to pandas DataFrame
+    Data collection writes to in-memory report storage, which may be exported as csv or converted to
+    pandas DataFrame. The default storage holds each column in a typed NumPy array, the original
+    in-memory csv file storage remains available (storage='csv').
+
+    With a memory budget, report rows are spilled to a SQLite spill file whenever the columnar
+    storage grows beyond the budget. Reports are read back from the spill file and memory when
+    results are requested, or streamed in chunks with iter_results.
+
+    Reports may be disabled, decimated or sampled with report settings. The settings are a
+    dictionary of report name to keyword arguments of ReportSettings, the name '*' sets the
+    default for all other reports. Code logging to a report should check is_report_enabled
+    before building the data, so that a disabled report costs close to nothing.
+
+    Aggregate reports (create_aggregate_reporting, or the aggregate setting of any report) keep
+    the mean, variance, minimum, maximum, quantiles and time-weighted mean of each column in
+    constant memory, so batch runs can summarise concentration, occupancy and queue length
+    without storing the rows. The aggregate reports of replicates may be merged.
 
     """
-    # TODO: Implement some form of memory management to flush in-memory csv to disk/database if memory tight
     # TODO: Apache Arrow: Consider using, however, doesn't always support windows.
 
     # TODO: Update parameters at init to use param dictionary.
-    def __init__(self, env, simulation_name=None, simulation_run=None):
+    def __init__(self, env, simulation_name=None, simulation_run=None, storage='columnar', memory_budget=None, spill_path=None,
+                 report_settings=None, sampling_seed=None):
         """ Create a class to collect data within a simulation run
         
         Keyworkd parameters:
         env                 simpy environment
         simulation_name     The name for this simulation
         simulation_run      The sequence number for this run of the simulation
+        storage             Report storage, 'columnar' (default) or 'csv'
+        memory_budget       Bytes of report storage held in memory before rows are spilled to disk
+        spill_path          SQLite file to spill to, may be shared between simulations (default: temporary file)
+        report_settings     Dictionary of report name to settings, see ReportSettings ('*' for the default)
+        sampling_seed       Seed for the random number generator used to sample report rows
 
         """
         self.env = env
         self.simulation_name = simulation_name
         self.simulation_run = simulation_run
 
-        # All the memory tables referenced from dictionary
-        self.memory_file = {}
-        self.memory_writer = {}
+        CheckList.fail_if_not_in_list(storage, list(REPORT_STORAGE))
+        self.report_storage = REPORT_STORAGE[storage]
+
+        # All the reports referenced from dictionary
+        self.reports = {}
         self.counters = {}
 
+        # Spill to disk when the reports exceed the memory budget
+        self.memory_budget = memory_budget
+        self.spill_file = None
+        self.spilled_reports = set()
+        if memory_budget is not None:
+            Check.is_greater_than_zero(memory_budget)
+            if storage != 'columnar':
+                raise ValueError('a memory budget requires columnar storage')
+            self.spill_file = self._open_spill_file(spill_path)
+
+        # Report enablement, decimation and sampling
+        report_settings = dict(report_settings) if report_settings else {}
+        self.default_report_settings = report_settings.pop('*', {})
+        ReportSettings(**self.default_report_settings)
+        self.report_settings = {name: ReportSettings(**settings) for name, settings in report_settings.items()}
+        self.sampling_rng = random.Random(sampling_seed)
+
+
+    def get_report_settings(self, data_set_name):
+        """ Return the settings for a report
+
+        Keyword parameters:
+        data_set_name           The name of the report
+        """
+        settings = self.report_settings.get(data_set_name)
+        if settings is None:
+            settings = ReportSettings(**self.default_report_settings)
+            self.report_settings[data_set_name] = settings
+
+        return settings
+
+
+    def is_report_enabled(self, data_set_name):
+        """ Return True if the report is collected
+
+        Keyword parameters:
+        data_set_name           The name of the report
+        """
+        settings = self.report_settings.get(data_set_name)
+        if settings is None:
+            settings = self.get_report_settings(data_set_name)
+
+        return settings.enabled
+
 
     """ Template for periodic reporting
 
@@ -72,28 +179,32 @@ class DataCollection:
         callback                Function to call periodically to collect data
         periods                 The number of periods between data collections 
 
-        Note data collection is triggered when the model first starts
+        Note data collection is triggered when the model first starts, a disabled report is not registered
         """
-        CheckList.fail_if_this_key_in_the_dictionary(data_set_name, self.memory_file)
+        CheckList.fail_if_this_key_in_the_dictionary(data_set_name, self.reports)
+
+        settings = self.get_report_settings(data_set_name)
+        if not settings.enabled:
+            return
 
         column_dictionary = callback()
         CheckList.is_a_dictionary(column_dictionary)
 
-        header_list = []
-        for key, _ in column_dictionary.items():
-            header_list.append(key)
+        self.create_report(data_set_name, column_dictionary)
 
-        header_list.insert(0, 'time')
-        header_list.insert(0, 'simulation_run')
-        header_list.insert(0, 'simulation_name')
+        self.env.process(self.periodic_reporting(data_set_name, callback, periods * settings.every))
 
-        # Create a new memory file into which data will be stored as CSV file
-        self.memory_file[data_set_name] = StringIO()
-        self.memory_writer[data_set_name] = DictWriter(self.memory_file[data_set_name], header_list, restval='Null', extrasaction='raise')
 
-        self.memory_writer[data_set_name].writeheader()
+    def create_aggregate_reporting(self, data_set_name, callback, periods):
+        """ Register a periodic report that keeps online statistics of its columns, not the rows
 
-        self.env.process(self.periodic_reporting(data_set_name, callback, periods))
+        Keyword parameters:
+        data_set_name           The name for the data set to be recorded
+        callback                Function to call periodically to collect data
+        periods                 The number of periods between data collections
+        """
+        self.get_report_settings(data_set_name).aggregate = True
+        self.create_period_reporting(data_set_name, callback, periods)
 
 
     def periodic_reporting(self, data_set_name, callback, periods):
@@ -104,12 +215,11 @@ class DataCollection:
         callback                The method to call to fetch the data
         periods                 The number of periods between fetches of data
         """
+        report = self.reports[data_set_name]
+        sample_rate = self.get_report_settings(data_set_name).sample_rate
         while True:
-            data = callback()
-            data['time'] = self.env.now
-            data['simulation_run'] = self.simulation_run
-            data['simulation_name'] = self.simulation_name
-            self.memory_writer[data_set_name].writerow(data)
+            if sample_rate >= 1 or self.sampling_rng.random() < sample_rate:
+                report.append(self.env.now, callback())
 
             yield self.env.timeout(periods)
 
@@ -121,30 +231,41 @@ class DataCollection:
         data_set_name           The name of the dataset into which data stored
         column_dictionary       The method to call to fetch the data
          """
+        settings = self.report_settings.get(data_set_name)
+        if settings is None:
+            settings = self.get_report_settings(data_set_name)
+        if not settings.enabled:
+            return
+        if (settings.every > 1 or settings.sample_rate < 1) and not settings.keep_row(self.sampling_rng):
+            return
 
         CheckList.is_a_dictionary(column_dictionary)
 
         # If the report doesn't already exist, create a new report
-        if not (data_set_name in self.memory_file):
-            header_list = []
-            for key, _ in column_dictionary.items():
-                header_list.append(key)
+        report = self.reports.get(data_set_name)
+        if report is None:
+            report = self.create_report(data_set_name, column_dictionary)
 
-            header_list.insert(0, 'time')
-            header_list.insert(0, 'simulation_run')
-            header_list.insert(0, 'simulation_name')
+        report.append(self.env.now, column_dictionary)
+
+
+    def create_report(self, data_set_name, column_dictionary):
+        """ Create the storage for a new report
+
+        Keyword parameters:
+        data_set_name           The name of the dataset into which data stored
+        column_dictionary       Example of the data, the keys are the column names
 
-            # Create a new memory file into which data will be stored as CSV file
-            self.memory_file[data_set_name] = StringIO()
-            self.memory_writer[data_set_name] = DictWriter(self.memory_file[data_set_name], header_list, restval='Null', extrasaction='raise')
+        Return: report storage
+        """
+        storage = AggregateReport if self.get_report_settings(data_set_name).aggregate else self.report_storage
+        report = storage(list(column_dictionary), self.simulation_name, self.simulation_run)
+        self.reports[data_set_name] = report
 
-            self.memory_writer[data_set_name].writeheader()
+        if self.spill_file is not None:
+            report.before_grow = self.check_memory_budget
 
-        # Write data to memory file
-        column_dictionary['time'] = self.env.now
-        column_dictionary['simulation_run'] = self.simulation_run
-        column_dictionary['simulation_name'] = self.simulation_name
-        self.memory_writer[data_set_name].writerow(column_dictionary)
+        return report
 
 
     def counter_increment(self, data_set_name, amount=None):
@@ -176,16 +297,132 @@ class DataCollection:
 
         self.counters[data_set_name] -= amount
 
+    @staticmethod
+    def _open_spill_file(spill_path):
+        """ Open the spill file, a temporary file is removed when the spill file is closed """
+        if spill_path is not None:
+            return SpillFile(spill_path)
+
+        handle, spill_path = tempfile.mkstemp(suffix='.sqlite', prefix='reports-')
+        os.close(handle)
+        spill_file = SpillFile(spill_path)
+        weakref.finalize(spill_file, DataCollection._remove_spill_file, spill_file.connection, spill_path)
+
+        return spill_file
+
+    @staticmethod
+    def _remove_spill_file(connection, spill_path):
+        """ Close and delete a temporary spill file """
+        connection.close()
+        if os.path.exists(spill_path):
+            os.remove(spill_path)
+
+    def check_memory_budget(self, growing_report=None):
+        """ Spill reports to disk, largest first, until within half the memory budget
+
+        Keyword parameters:
+        growing_report          Report about to grow, its growth is included in the memory used
+        """
+        usage = {name: report.memory_usage() for name, report in self.reports.items() if report.rows}
+        total = sum(usage.values())
+        if growing_report is not None:
+            total += growing_report.memory_usage()
+
+        if total <= self.memory_budget:
+            return
+
+        for name in sorted(usage, key=usage.get, reverse=True):
+            self.spill(name)
+            total -= usage[name]
+            if total <= self.memory_budget / 2:
+                break
+
+    def spill(self, data_set_name=None):
+        """ Move report rows from memory to the spill file
+
+        Keyword parameters:
+        data_set_name           The name of the dataset to spill (default: all reports)
+        """
+        if self.spill_file is None:
+            raise ValueError('spilling requires a memory budget')
+
+        names = [data_set_name] if data_set_name is not None else list(self.reports)
+        for name in names:
+            report = self.reports[name]
+            if report.rows:
+                self.spill_file.append(name, self.simulation_name, self.simulation_run, report.take_rows())
+                self.spilled_reports.add(name)
+
+    def get_aggregates(self):
+        """ Return the aggregate reports, with time-weighted statistics to the current time
+
+        Return: dictionary of report name to AggregateReport
+        """
+        aggregates = {name: report for name, report in self.reports.items() if isinstance(report, AggregateReport)}
+        for report in aggregates.values():
+            report.close(self.env.now)
+
+        return aggregates
+
     def get_results(self, data_set_name):
-        """ Return stored data as a pandas data frame """
-        file = self.memory_file.get(data_set_name, None)
+        """ Return stored data as a pandas data frame, the statistics of each column for an aggregate report """
+        import pandas as pd
+
+        report = self.reports.get(data_set_name, None)
         df = None
-        if file != None:
-            file.seek(0)
-            df = pd.read_csv(file)
+        if report != None:
+            if isinstance(report, AggregateReport):
+                report.close(self.env.now)
+            df = report.to_dataframe()
+
+            if data_set_name in self.spilled_reports:
+                spilled = self.spill_file.read(data_set_name, self.simulation_name, self.simulation_run)
+                df = pd.concat([spilled, df], ignore_index=True) if len(df) else spilled
 
         return df
 
+    def iter_results(self, data_set_name, chunksize=100000):
+        """ Return stored data as an iterator of pandas data frames
+
+        Rows spilled to disk are read in chunks, followed by the rows in memory.
+
+        Keyword parameters:
+        data_set_name           The name of the dataset to get
+        chunksize               Number of rows in each data frame read from the spill file
+        """
+        report = self.reports[data_set_name]
+
+        if data_set_name in self.spilled_reports:
+            yield from self.spill_file.read(data_set_name, self.simulation_name, self.simulation_run, chunksize=chunksize)
+
+        if report.rows or isinstance(report, AggregateReport):
+            yield report.to_dataframe()
+
+    def export_csv(self, data_set_name, file):
+        """ Export stored data as csv
+
+        Rows spilled to disk are written in chunks ahead of the rows in memory, under one header.
+
+        Keyword parameters:
+        data_set_name           The name of the dataset to export
+        file                    File name or text file object to write to
+        """
+        if isinstance(file, str):
+            with open(file, 'w', newline='') as csv_file:
+                self.export_csv(data_set_name, csv_file)
+            return
+
+        report = self.reports[data_set_name]
+        if isinstance(report, AggregateReport):
+            report.close(self.env.now)
+
+        if data_set_name not in self.spilled_reports:
+            report.write_csv(file)
+            return
+
+        for chunk_number, df in enumerate(self.iter_results(data_set_name)):
+            df.to_csv(file, header=chunk_number == 0, index=False)
+
     def get_counter(self, data_set_name):
         """return value of a counter"""
 
@@ -197,7 +434,7 @@ class DataCollection:
         Return: list of reports
         """
         report_list = []
-        for key, _ in self.memory_file.items():
+        for key, _ in self.reports.items():
             report_list.append(key)
 
         return report_list
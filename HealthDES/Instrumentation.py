@@ -0,0 +1,200 @@
+""" Python library to model the spread of infectious diseases within a microenvironment """
+
+import time
+
+import simpy
+from simpy.events import Process, Condition
+
+# Import local libraries
+# pylint: disable=relative-beyond-top-level
+from .Check import Check, CheckList
+from .DataCollection import DataCollection
+from .Routing import Routing
+
+
+# Readable names for the processes of the microenvironment model, by generator function
+PROCESS_CATEGORIES = {'Microenvironment.run': 'microenvironment tick',
+                      'Building.run': 'building tick',
+                      'Visitor_activity.infected_visitor': 'infected tick',
+                      'Visitor_activity.susceptible_visitor': 'susceptible tick',
+                      'Visitor_activity.visitor_event_exposure': 'event exposure',
+                      'Visitor_activity.start': 'visitor activity',
+                      'Person_base.run': 'person routing',
+                      'Simulation.create_people': 'people generation',
+                      'DataCollection.periodic_reporting': 'periodic report',
+                      'DiseaseProgression.progress': 'disease progression'}
+
+# Functions timed when function timing is on, category to (class, function name)
+FUNCTION_CATEGORIES = {'data collection': [(DataCollection, 'log_reporting'), (DataCollection, 'create_report')],
+                       'routing': [(Routing, 'get_next_activity')],
+                       'checks': [(cls, name) for cls in (Check, CheckList)
+                                  for name, function in vars(cls).items() if isinstance(function, staticmethod)]}
+
+
+class Instrumentation:
+    """ Opt-in instrumentation of the simpy event loop
+
+    The step method of the simpy environment is replaced, on the instance only, by one that
+    counts and times each event by the category of the process it resumes, e.g. the infected
+    visitor's tick or a periodic report. The depth of the event queue is sampled as simulation
+    time passes. Optionally the data collection, routing and check functions are timed, these
+    times are included in the times of the processes that call them.
+
+    A simulation that is not instrumented runs the unmodified simpy step method, so costs
+    nothing. Function timing wraps the functions on their classes, so applies to every
+    simulation in the process while attached.
+    """
+
+    def __init__(self, queue_sample_interval=1, time_functions=True):
+        """Create the instrumentation
+
+        Keyword Arguments:
+            queue_sample_interval {number} -- Periods between samples of the event queue depth (default: {1})
+            time_functions {bool} -- Time data collection, routing and check functions (default: {True})
+        """
+        self.queue_sample_interval = queue_sample_interval
+        self.time_functions = time_functions
+
+        self.env = None
+        self.events = {}
+        self.seconds = {}
+        self.calls = {}
+        self.function_seconds = {}
+        self.queue_depth = []
+        self.next_sample = 0
+        self.wrapped = []
+
+
+    def attach(self, env):
+        """Instrument a simpy environment, replacing any environment already attached
+
+        Arguments:
+            env {simpy environment} -- Environment to instrument
+        """
+        self.detach()
+        self.env = env
+        self.next_sample = env.now
+
+        original_step = simpy.Environment.step.__get__(env)
+        queue = env._queue
+        events = self.events
+        seconds = self.seconds
+        category_of = self.category_of
+        perf_counter = time.perf_counter
+
+        def step():
+            if queue and queue[0][0] >= self.next_sample:
+                self.queue_depth.append((queue[0][0], len(queue)))
+                self.next_sample = queue[0][0] + self.queue_sample_interval
+
+            category = category_of(queue[0][3]) if queue else 'empty'
+            t_start = perf_counter()
+            try:
+                original_step()
+            finally:
+                seconds[category] = seconds.get(category, 0.0) + perf_counter() - t_start
+                events[category] = events.get(category, 0) + 1
+
+        env.step = step
+
+        if self.time_functions:
+            self.wrap_functions()
+
+
+    def detach(self):
+        """Restore the environment's step method and the timed functions"""
+        if self.env is not None:
+            self.env.__dict__.pop('step', None)
+            self.env = None
+
+        for cls, name, original in reversed(self.wrapped):
+            setattr(cls, name, original)
+        self.wrapped = []
+
+
+    def wrap_functions(self):
+        """Wrap the functions of FUNCTION_CATEGORIES to count and time their calls"""
+        for category, functions in FUNCTION_CATEGORIES.items():
+            for cls, name in functions:
+                original = vars(cls)[name]
+                self.wrapped.append((cls, name, original))
+
+                is_static = isinstance(original, staticmethod)
+                function = original.__func__ if is_static else original
+                timed = self.timed(category, function)
+                setattr(cls, name, staticmethod(timed) if is_static else timed)
+
+
+    def timed(self, category, function):
+        """Wrap a function to count and time its calls"""
+        calls = self.calls
+        function_seconds = self.function_seconds
+        perf_counter = time.perf_counter
+
+        def timed_function(*args, **kwargs):
+            t_start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                function_seconds[category] = function_seconds.get(category, 0.0) + perf_counter() - t_start
+                calls[category] = calls.get(category, 0) + 1
+
+        timed_function.__name__ = function.__name__
+        timed_function.__doc__ = function.__doc__
+        return timed_function
+
+
+    @staticmethod
+    def category_of(event):
+        """Category of an event, the process it resumes, or the function called back"""
+        for callback in event.callbacks or ():
+            owner = getattr(callback, '__self__', None)
+            if owner is event:
+                # A condition's own callback building its value
+                continue
+            if isinstance(owner, Process):
+                name = getattr(owner._generator, '__qualname__', type(owner._generator).__name__)
+                return PROCESS_CATEGORIES.get(name, name)
+            if isinstance(owner, Condition):
+                return Instrumentation.category_of(owner)
+            return getattr(callback, '__qualname__', type(callback).__name__)
+        return type(event).__name__
+
+
+    def summary(self):
+        """Summary of the events and function calls
+
+        Returns:
+            pandas dataFrame -- Calls, seconds and microseconds per call, by kind (process or function) and category
+        """
+        import pandas as pd
+
+        rows = [('process', category, self.events[category], self.seconds[category]) for category in self.events]
+        rows += [('function', category, self.calls[category], self.function_seconds[category]) for category in self.calls]
+
+        df = pd.DataFrame(rows, columns=['kind', 'category', 'calls', 'seconds'])
+        df['microseconds per call'] = df['seconds'] / df['calls'] * 1e6
+        total = df.loc[df['kind'] == 'process', 'seconds'].sum()
+        df['share of event loop'] = df['seconds'] / total if total else 0.0
+        return df.sort_values(['kind', 'seconds'], ascending=[False, False]).set_index(['kind', 'category'])
+
+
+    def write_reports(self, dc):
+        """Store the instrumentation results as data collection reports
+
+        'Instrumentation' has a row per process and function category, 'Event queue depth' a row
+        per sample of the event queue.
+
+        Arguments:
+            dc {DataCollection} -- Data collection to store the reports in
+        """
+        for (kind, category), row in self.summary().iterrows():
+            dc.log_reporting('Instrumentation', {'kind': kind, 'category': category,
+                                                 'calls': int(row['calls']), 'seconds': float(row['seconds'])})
+
+        if dc.is_report_enabled('Event queue depth'):
+            report = dc.reports.get('Event queue depth')
+            if report is None:
+                report = dc.create_report('Event queue depth', {'depth': 0})
+            for sample_time, depth in self.queue_depth:
+                report.append(sample_time, {'depth': depth})
@@ -18,10 +18,12 @@ class Person_base:
         which are callled as each one completes.
     """
 
+    __slots__ = ('simulation_params', 'env', 'dc', 'routing', 'time_interval', 'rng', 'PID', 'routing_node_id', 'person_type')
+
     # create a unique ID counter
     get_new_id = itertools.count()
 
-    def __init__(self, simulation_params, starting_node_id, person_type=None):
+    def __init__(self, simulation_params, starting_node_id, person_type=None, PID=None):
         """Establish the persons characteristics, this will be specific to each model
 
         Arguments:
@@ -29,6 +31,7 @@ class Person_base:
 
         Keyword Arguments:
             person_type {string} -- Type of person within the model e.g visitor, staff (default: {None})
+            PID {int} -- Person ID of a person restored from a checkpoint (default: {next ID})
         """
         # import simulation parameters
         self.simulation_params = simulation_params
@@ -36,9 +39,11 @@ class Person_base:
         self.dc = simulation_params.get('data_collector', None)
         self.routing = simulation_params.get('routing', None)       
         self.time_interval = simulation_params.get('time_interval', None)
+        # Routing falls back to the random module when the simulation has no generator
+        self.rng = simulation_params.get('random_generator', None)
 
         # keep a record of person IDs
-        self.PID = next(Person_base.get_new_id)
+        self.PID = next(Person_base.get_new_id) if PID is None else PID
 
         # Routing is the list of environments that the person traverses
         self.routing_node_id = starting_node_id
@@ -55,7 +60,7 @@ class Person_base:
         return self.PID
 
 
-    def run(self):
+    def run(self, first_duration=None):
         """ Simulation process for the person
         
             Tests that the routing list still has destinations to visit
@@ -64,15 +69,23 @@ class Person_base:
             passes a reference to person instance (self)
             pops the arguments passed as keyword list and passes as new argument list to entry point parameters
             initiates a new simpy process for the persons activity within the microenvironment
+
+        Keyword Arguments:
+            first_duration {number} -- Duration of the first activity, e.g. the rest of a visit already under
+                                       way when the simulation starts (default: {None, the activity's duration})
         """
         # For each microenvironment that the person visits
         while self.routing_node_id != 'end':
             # Get the next node, and this activity class and arguments.
-            self.routing_node_id, activity_class, kwargs = self.routing.get_next_activity(self.routing_node_id)
+            self.routing_node_id, activity_class, kwargs = self.routing.get_next_activity(self.routing_node_id, self.person_type, self.rng)
 
             # Add this instance to the arguments list
             kwargs['person'] = self
 
+            if first_duration is not None:
+                kwargs = dict(kwargs, duration=first_duration)
+                first_duration = None
+
             # Create a parametrised instance of the activity
             this_activity_class = activity_class(self.simulation_params, **kwargs)
             
@@ -0,0 +1,140 @@
+""" Python library to model the spread of infectious diseases within a microenvironment """
+
+import math
+import random
+import zlib
+
+import numpy as np
+
+
+# Largest double below one, so that 1 - u is never zero
+_BELOW_ONE = 1.0 - 2.0 ** -53
+
+
+def stream_seed(seed, stream):
+    """Seed sequence of a named stream, derived from a seed
+
+    Arguments:
+        seed {int, numpy SeedSequence or None} -- Seed of the set of streams
+        stream {string} -- Name of the stream e.g. 'arrivals', 'infection'
+
+    Returns:
+        numpy SeedSequence -- Seed sequence of the stream, independent of those of the other streams
+    """
+    seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    return np.random.SeedSequence(seed.entropy, spawn_key=tuple(seed.spawn_key) + (zlib.crc32(stream.encode()),))
+
+
+class RandomStreams:
+    """ Deterministic random number streams, one per use of random numbers, indexed by entity
+
+    The n-th uniform of a stream belongs to the n-th entity, e.g. the n-th person created or the
+    n-th arrival, whatever order the events of the simulation happen in. Two simulations of different
+    scenarios created with the same seed therefore use the same random numbers for the same people
+    (common random numbers), so the difference between the scenarios is not swamped by the noise
+    of unrelated draws.
+
+    Variance reduction:
+        * antithetic -- every uniform u is replaced by 1 - u, a pair of replicates from the same seed,
+          one antithetic, are negatively correlated.
+        * stratified -- replicate r of R has stratum r. Each entity's uniform lies in one of R equal
+          strata, (stratum + offset) mod R, where the offset of each entity is drawn from a
+          stratification seed shared by the R replicates. Over the replicates each entity has one
+          uniform in every stratum (a Latin hypercube design across the replicates).
+
+    Uniforms are drawn from a numpy generator per stream in blocks, doubling in size, and held
+    as they are used.
+    """
+
+    def __init__(self, seed=None, antithetic=False, stratum=None, strata=None, stratification_seed=None, block_size=256):
+        """Create the streams
+
+        Keyword Arguments:
+            seed {int or numpy SeedSequence} -- Seed of the streams (default: {None})
+            antithetic {bool} -- Use 1 - u for every uniform u (default: {False})
+            stratum {int} -- Stratum of this replicate, from 0 to strata - 1 (default: {None})
+            strata {int} -- Number of strata, the number of stratified replicates (default: {None})
+            stratification_seed {int or numpy SeedSequence} -- Seed shared by the stratified replicates (default: {None})
+            block_size {int} -- Uniforms drawn from a stream at a time (default: {256})
+        """
+        if (stratum is None) != (strata is None):
+            raise ValueError('stratum and strata must be given together')
+        if strata is not None and not 0 <= stratum < strata:
+            raise ValueError(f'stratum {stratum} must be between 0 and {strata - 1}')
+
+        self.seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.antithetic = antithetic
+        self.stratum = stratum
+        self.strata = strata
+        self.stratification_seed = stratification_seed
+        self.block_size = block_size
+
+        self.generators = {}
+        self.drawn = {}
+        self.offset_generators = {}
+
+
+    def _extend(self, stream, index):
+        """Draw blocks of uniforms of a stream until it holds the index"""
+        uniforms = self.drawn.get(stream)
+        if uniforms is None:
+            self.generators[stream] = np.random.default_rng(stream_seed(self.seed, stream))
+            uniforms = np.empty(0)
+
+        draws = max(self.block_size, len(uniforms), index + 1 - len(uniforms))
+        block = self.generators[stream].random(draws)
+
+        if self.strata is not None:
+            if stream not in self.offset_generators:
+                self.offset_generators[stream] = np.random.default_rng(stream_seed(self.stratification_seed, stream))
+            offsets = self.offset_generators[stream].integers(self.strata, size=draws)
+            block = ((self.stratum + offsets) % self.strata + block) / self.strata
+
+        if self.antithetic:
+            block = 1.0 - block
+
+        uniforms = np.concatenate((uniforms, np.minimum(block, _BELOW_ONE)))
+        self.drawn[stream] = uniforms
+        return uniforms
+
+
+    def uniform(self, stream, index):
+        """Uniform on [0, 1) of an entity
+
+        Arguments:
+            stream {string} -- Name of the stream
+            index {int} -- Index of the entity e.g. index of the person in the population
+
+        Returns:
+            float -- Uniform random number
+        """
+        uniforms = self.drawn.get(stream)
+        if uniforms is None or index >= len(uniforms):
+            uniforms = self._extend(stream, index)
+        return uniforms.item(index)
+
+
+    def uniforms(self, stream, start, stop):
+        """Uniforms of the entities from start to stop - 1, as a numpy array"""
+        uniforms = self.drawn.get(stream)
+        if uniforms is None or stop > len(uniforms):
+            uniforms = self._extend(stream, stop - 1)
+        return uniforms[start:stop]
+
+
+    def exponential(self, stream, index):
+        """Standard exponential (mean one) of an entity, by inversion of its uniform"""
+        return -math.log1p(-self.uniform(stream, index))
+
+
+    def generator(self, stream, index):
+        """Standard library random generator of an entity, for draws of any distribution
+
+        Arguments:
+            stream {string} -- Name of the stream
+            index {int} -- Index of the entity
+
+        Returns:
+            random.Random -- Generator seeded from the entity's uniform
+        """
+        return random.Random(int(self.uniform(stream, index) * 2 ** 53))
@@ -0,0 +1,532 @@
+""" Python library to model the spread of infectious diseases within a microenvironment """
+
+import sys
+import math
+import numbers
+import sqlite3
+from io import StringIO
+from csv import DictWriter, writer
+
+import numpy as np
+
+# pylint: disable=relative-beyond-top-level
+from .Statistics import RunningStatistics, TDigest, TimeWeightedStatistics
+
+
+class ColumnarReport:
+    """ Report storage holding each column in a typed, growable NumPy array
+
+    The type of each column is taken from the first value written to it (bool, int, float or
+    object for anything else) and is promoted if a later value does not fit, e.g. int to float.
+    The arrays double in size when full, so appending a row is amortised constant time, and the
+    results are returned as a pandas dataFrame built from views of the arrays without a copy.
+
+    The simulation name and run are the same for every row and are stored once.
+    """
+
+    # Initial number of rows allocated for each column
+    initial_capacity = 256
+
+    def __init__(self, columns, simulation_name=None, simulation_run=None):
+        """Create an empty report
+
+        Arguments:
+            columns {list of strings} -- Names of the data columns, excluding time, simulation name and run
+
+        Keyword Arguments:
+            simulation_name {string} -- The name for this simulation (default: {None})
+            simulation_run {string} -- The sequence number for this run of the simulation (default: {None})
+        """
+        self.simulation_name = simulation_name
+        self.simulation_run = simulation_run
+
+        self.columns = ['time'] + list(columns)
+        self.data_columns = frozenset(columns)
+        self.rows = 0
+        self.capacity = 0
+        self.arrays = {name: None for name in self.columns}
+
+        # Called before the column arrays grow, e.g. to check a memory budget and spill rows to disk
+        self.before_grow = None
+
+
+    def append(self, time, row):
+        """Append a row to the report
+
+        Arguments:
+            time {number} -- Simulation time of the row
+            row {dictionary} -- Column name to value, missing columns are stored as None
+
+        Raises:
+            ValueError: The row contains a column that is not in the report
+        """
+        if not self.data_columns.issuperset(row):
+            raise ValueError(f'dict contains fields not in fieldnames: {sorted(set(row) - self.data_columns)}')
+
+        if self.rows == self.capacity:
+            self._grow()
+
+        index = self.rows
+        arrays = self.arrays
+        for name in self.columns:
+            value = time if name == 'time' else row.get(name)
+
+            # Fast path when the value fits the column type
+            array = arrays[name]
+            if array is not None:
+                kind = array.dtype.kind
+                value_type = type(value)
+                if (kind == 'f' and (value_type is float or value_type is int)) or \
+                   (kind == 'i' and value_type is int) or \
+                   (kind == 'b' and value_type is bool) or \
+                   kind == 'O':
+                    array[index] = value
+                    continue
+
+            self._set_and_promote(name, index, value)
+
+        self.rows += 1
+
+
+    def _set_and_promote(self, name, index, value):
+        """Store a value, creating or promoting the column array so that the value fits"""
+        required = self._kind_of(value)
+        array = self.arrays[name]
+
+        if array is None:
+            kind = required
+        else:
+            kind = self._promote(array.dtype.kind, required)
+
+        if array is None or kind != array.dtype.kind:
+            dtype = {'b': bool, 'i': np.int64, 'f': np.float64, 'O': object}[kind]
+            promoted = np.empty(self.capacity, dtype=dtype)
+            if array is None:
+                if kind == 'f':
+                    promoted[:index] = np.nan
+                elif kind == 'O':
+                    promoted[:index] = None
+            else:
+                promoted[:index] = array[:index]
+            self.arrays[name] = array = promoted
+
+        array[index] = value
+
+
+    @staticmethod
+    def _kind_of(value):
+        """NumPy kind of array required to store a value"""
+        if isinstance(value, (bool, np.bool_)):
+            return 'b'
+        if isinstance(value, numbers.Integral):
+            return 'i'
+        if isinstance(value, numbers.Real):
+            return 'f'
+        return 'O'
+
+
+    @staticmethod
+    def _promote(kind, required):
+        """Kind of array able to store values of both kinds"""
+        if kind == required or kind == 'O':
+            return kind
+        if required == 'O' or 'b' in (kind, required):
+            return 'O'
+        return 'f'
+
+
+    def _grow(self):
+        """Double the capacity of every column"""
+        if self.before_grow is not None and self.rows:
+            self.before_grow(self)
+
+        capacity = max(self.initial_capacity, 2 * self.capacity)
+        for name, array in self.arrays.items():
+            if array is not None:
+                grown = np.empty(capacity, dtype=array.dtype)
+                grown[:self.rows] = array[:self.rows]
+                self.arrays[name] = grown
+        self.capacity = capacity
+
+
+    def memory_usage(self):
+        """Approximate memory used by the report in bytes
+
+        Object columns are estimated from the size of their first value.
+        """
+        usage = 0
+        for array in self.arrays.values():
+            if array is not None:
+                usage += array.nbytes
+                if array.dtype.kind == 'O' and self.rows:
+                    usage += sys.getsizeof(array[0]) * self.rows
+        return usage
+
+
+    def take_rows(self):
+        """Remove the rows from the report and return them
+
+        The column arrays are released, so the memory they use is freed.
+
+        Returns:
+            dictionary -- Column name to list of values, in report column order
+        """
+        columns = {name: values.tolist() for name, values in self.get_columns().items()}
+
+        self.rows = 0
+        self.capacity = 0
+        self.arrays = {name: None for name in self.columns}
+
+        return columns
+
+
+    def get_columns(self):
+        """Return the column values, as views of the column arrays
+
+        Returns:
+            dictionary -- Column name to array of values, in report column order
+        """
+        columns = {}
+        for name in self.columns:
+            array = self.arrays[name]
+            columns[name] = array[:self.rows] if array is not None else np.full(self.rows, None, dtype=object)
+        return columns
+
+
+    def to_dataframe(self):
+        """Return the report as a pandas dataFrame
+
+        Returns:
+            pandas dataFrame -- dataFrame containing the results
+        """
+        import pandas as pd
+
+        columns = {'simulation_name': np.full(self.rows, self.simulation_name, dtype=object),
+                   'simulation_run': np.full(self.rows, self.simulation_run, dtype=object)}
+        columns.update(self.get_columns())
+
+        df = pd.DataFrame(columns, copy=False)
+        return df.infer_objects()
+
+
+    def write_csv(self, file):
+        """Write the report to a file as CSV
+
+        Arguments:
+            file {file object} -- Text file to write to
+        """
+        csv_writer = writer(file)
+        csv_writer.writerow(['simulation_name', 'simulation_run'] + self.columns)
+
+        columns = list(self.get_columns().values())
+        for index in range(self.rows):
+            csv_writer.writerow([self.simulation_name, self.simulation_run] + [column[index] for column in columns])
+
+
+class CsvReport:
+    """ Report storage writing each row to an in-memory CSV file
+
+    Rows are converted to text as they are written, and parsed again when the results are
+    returned as a pandas dataFrame.
+    """
+
+    def __init__(self, columns, simulation_name=None, simulation_run=None):
+        """Create an empty report
+
+        Arguments:
+            columns {list of strings} -- Names of the data columns, excluding time, simulation name and run
+
+        Keyword Arguments:
+            simulation_name {string} -- The name for this simulation (default: {None})
+            simulation_run {string} -- The sequence number for this run of the simulation (default: {None})
+        """
+        self.simulation_name = simulation_name
+        self.simulation_run = simulation_run
+
+        header_list = ['simulation_name', 'simulation_run', 'time'] + list(columns)
+
+        # Create a new memory file into which data will be stored as CSV file
+        self.memory_file = StringIO()
+        self.memory_writer = DictWriter(self.memory_file, header_list, restval='Null', extrasaction='raise')
+        self.memory_writer.writeheader()
+
+
+    def append(self, time, row):
+        """Append a row to the report
+
+        Arguments:
+            time {number} -- Simulation time of the row
+            row {dictionary} -- Column name to value
+        """
+        row['time'] = time
+        row['simulation_run'] = self.simulation_run
+        row['simulation_name'] = self.simulation_name
+        self.memory_writer.writerow(row)
+
+
+    def to_dataframe(self):
+        """Return the report as a pandas dataFrame
+
+        Returns:
+            pandas dataFrame -- dataFrame containing the results
+        """
+        import pandas as pd
+
+        self.memory_file.seek(0)
+        return pd.read_csv(self.memory_file)
+
+
+    def write_csv(self, file):
+        """Write the report to a file as CSV
+
+        Arguments:
+            file {file object} -- Text file to write to
+        """
+        file.write(self.memory_file.getvalue())
+
+
+class AggregateReport:
+    """ Report storage keeping online statistics of each column instead of the rows
+
+    Each numeric column has a running mean and variance with minimum and maximum (Welford), a
+    t-digest for quantiles, and a time-weighted mean and variance treating the column as a
+    quantity that holds each value until the next row, e.g. occupancy. The memory used does not
+    grow with the number of rows, and the reports of replicates (or of workers) may be merged.
+    Values that are not numbers, e.g. activity names, are not summarised.
+    """
+
+    # Rows are summarised as they are appended, none are held in memory or spilled to disk
+    rows = 0
+
+    def __init__(self, columns, simulation_name=None, simulation_run=None, quantiles=(0.05, 0.5, 0.95), compression=100):
+        """Create an empty report
+
+        Arguments:
+            columns {list of strings} -- Names of the data columns, excluding time, simulation name and run
+
+        Keyword Arguments:
+            simulation_name {string} -- The name for this simulation (default: {None})
+            simulation_run {string} -- The sequence number for this run of the simulation (default: {None})
+            quantiles {list of numbers} -- Quantiles in the summary, between 0 and 1 (default: {(0.05, 0.5, 0.95)})
+            compression {number} -- Compression of the t-digests (default: {100})
+        """
+        self.simulation_name = simulation_name
+        self.simulation_run = simulation_run
+
+        self.columns = ['time'] + list(columns)
+        self.data_columns = frozenset(columns)
+        self.quantiles = tuple(quantiles)
+        self.compression = compression
+
+        self.observations = 0
+        self.statistics = {}
+        self.digests = {}
+        self.time_weighted = {}
+
+
+    def append(self, time, row):
+        """Add a row to the statistics
+
+        Arguments:
+            time {number} -- Simulation time of the row
+            row {dictionary} -- Column name to value
+
+        Raises:
+            ValueError: The row contains a column that is not in the report
+        """
+        if not self.data_columns.issuperset(row):
+            raise ValueError(f'{sorted(set(row) - self.data_columns)} are not columns of the report')
+
+        self.observations += 1
+        for name, value in row.items():
+            if not isinstance(value, numbers.Real):
+                continue
+
+            statistics = self.statistics.get(name)
+            if statistics is None:
+                statistics = self.statistics[name] = RunningStatistics()
+                self.digests[name] = TDigest(self.compression)
+                self.time_weighted[name] = TimeWeightedStatistics()
+
+            statistics.add(value)
+            self.digests[name].add(value)
+            self.time_weighted[name].add(time, value)
+
+
+    def close(self, time):
+        """Integrate the time-weighted statistics up to a time, e.g. the end of the run
+
+        Arguments:
+            time {number} -- Simulation time to integrate to
+        """
+        for time_weighted in self.time_weighted.values():
+            time_weighted.close(time)
+
+
+    def merge(self, other):
+        """Add the statistics of another report with the same columns, e.g. of another replicate
+
+        The time-weighted statistics of the other report are those up to the time it was last closed.
+
+        Arguments:
+            other {AggregateReport} -- Report to merge into this one
+
+        Returns:
+            AggregateReport -- This report
+        """
+        self.observations += other.observations
+        for name, statistics in other.statistics.items():
+            if name not in self.statistics:
+                self.statistics[name] = RunningStatistics()
+                self.digests[name] = TDigest(self.compression)
+                self.time_weighted[name] = TimeWeightedStatistics()
+
+            self.statistics[name].merge(statistics)
+            self.digests[name].merge(other.digests[name])
+            self.time_weighted[name].merge(other.time_weighted[name])
+        return self
+
+
+    def memory_usage(self):
+        """Approximate memory used by the report in bytes"""
+        return sum(digest.means.nbytes + digest.weights.nbytes + 8 * len(digest.buffer) for digest in self.digests.values())
+
+
+    def to_dataframe(self):
+        """Return the statistics as a pandas dataFrame
+
+        Returns:
+            pandas dataFrame -- One row per numeric column: count, mean, sd, min, max, time-weighted
+                                mean and sd, and the quantiles
+        """
+        import pandas as pd
+
+        rows = {}
+        for name, statistics in self.statistics.items():
+            time_weighted = self.time_weighted[name]
+            rows[name] = {'count': statistics.count, 'mean': statistics.mean, 'sd': statistics.sd,
+                          'min': statistics.minimum, 'max': statistics.maximum,
+                          'time mean': time_weighted.mean, 'time sd': math.sqrt(time_weighted.variance)}
+            rows[name].update(zip((f'q{q:g}' for q in self.quantiles), self.digests[name].quantile(self.quantiles)))
+
+        df = pd.DataFrame.from_dict(rows, orient='index')
+        df.index.name = 'column'
+        return df
+
+
+    def write_csv(self, file):
+        """Write the statistics to a file as CSV
+
+        Arguments:
+            file {file object} -- Text file to write to
+        """
+        self.to_dataframe().to_csv(file)
+
+
+class SpillFile:
+    """ On-disk storage for report rows spilled from memory, held in a SQLite database
+
+    Each report is a table, with the simulation name and run as indexed columns, so a single file
+    may be shared by many simulations (including parallel workers) and read back by report name,
+    simulation name and simulation run.
+    """
+
+    def __init__(self, path):
+        """Open, or create, the spill file
+
+        Arguments:
+            path {string} -- Path to the SQLite database
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.tables = set()
+
+
+    @staticmethod
+    def _quote(name):
+        """Quote a table or column name for use in SQL"""
+        return '"' + str(name).replace('"', '""') + '"'
+
+
+    def _create_table(self, data_set_name, columns):
+        """Create the table for a report if it does not exist"""
+        table = self._quote(data_set_name)
+        column_list = ', '.join(self._quote(name) for name in ['simulation_name', 'simulation_run'] + list(columns))
+        index = self._quote(f'{data_set_name} partition')
+
+        with self.connection:
+            self.connection.execute(f'CREATE TABLE IF NOT EXISTS {table} ({column_list})')
+            self.connection.execute(f'CREATE INDEX IF NOT EXISTS {index} ON {table} (simulation_name, simulation_run)')
+
+        self.tables.add(data_set_name)
+
+
+    def append(self, data_set_name, simulation_name, simulation_run, columns):
+        """Append rows to a report
+
+        Arguments:
+            data_set_name {string} -- Name of the report
+            simulation_name {string} -- The name for the simulation
+            simulation_run {string} -- The sequence number for the run of the simulation
+            columns {dictionary} -- Column name to list of values
+        """
+        if data_set_name not in self.tables:
+            self._create_table(data_set_name, columns)
+
+        table = self._quote(data_set_name)
+        column_list = ', '.join(self._quote(name) for name in ['simulation_name', 'simulation_run'] + list(columns))
+        placeholders = ', '.join('?' * (len(columns) + 2))
+
+        rows = len(next(iter(columns.values()))) if columns else 0
+        values = zip([simulation_name] * rows, [simulation_run] * rows, *columns.values())
+
+        with self.connection:
+            self.connection.executemany(f'INSERT INTO {table} ({column_list}) VALUES ({placeholders})', values)
+
+
+    def read(self, data_set_name, simulation_name=None, simulation_run=None, chunksize=None, partition=True):
+        """Read rows of a report
+
+        Arguments:
+            data_set_name {string} -- Name of the report
+
+        Keyword Arguments:
+            simulation_name {string} -- Only rows for this simulation name (default: {None})
+            simulation_run {string} -- Only rows for this simulation run (default: {None})
+            chunksize {int} -- Return an iterator of dataFrames with this many rows (default: {None})
+            partition {bool} -- When True a simulation name or run of None selects rows with no name or
+                                run, when False None selects all rows (default: {True})
+
+        Returns:
+            pandas dataFrame, or iterator of dataFrames if chunksize given
+        """
+        import pandas as pd
+
+        query = f'SELECT * FROM {self._quote(data_set_name)}'
+
+        conditions = []
+        parameters = []
+        for column, value in (('simulation_name', simulation_name), ('simulation_run', simulation_run)):
+            if partition or value is not None:
+                conditions.append(f'{column} IS ?')
+                parameters.append(value)
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY rowid'
+
+        return pd.read_sql_query(query, self.connection, params=parameters, chunksize=chunksize)
+
+
+    def get_list_of_reports(self):
+        """Get the list of reports in the spill file"""
+        cursor = self.connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")
+        return [name for (name,) in cursor]
+
+
+    def close(self):
+        """Close the spill file"""
+        self.connection.close()
+
+
+# Report storage available to the data collection, by name
+REPORT_STORAGE = {'columnar': ColumnarReport, 'csv': CsvReport}
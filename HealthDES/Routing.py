@@ -1,7 +1,8 @@
 """ Python library to model the spread of infectious diseases within a microenvironment """
 
+import random
+
 import simpy
-import networkx as nx
 
 
 class Routing:
@@ -24,14 +25,22 @@ class Routing:
                     start and end on the same node (holding pattern). There is only one edge
                     between adjacent nodes. The edge has a unique activity function which is
                     called to pull together environments, reources and people.
+
+        The graph is held as nested dictionaries, node to next node to activity to edge data (the
+        layout of a networkx MultiDiGraph), so that networkx is only imported when the graph is
+        analysed or drawn, see G.
         """
 
-        # G is a MultiDiGraph - a directed graph with multiple edges between the same nodes.
-        self.G = nx.MultiDiGraph()
+        # Adjacency of the directed graph with multiple edges between the same nodes.
+        self.adjacency = {}
 
         # Dictionary of activities and reference to implementation classes
         self.activities = {}
 
+        # Transition tables compiled from the graph, rebuilt when the graph changes
+        self.compiled = None
+        self.node_index = {}
+
 
     # Methods to interact with the activity dictionary
 
@@ -70,38 +79,172 @@ class Routing:
     # Methods to interact with the routing graph
     # TODO: Switch nodes and edges around - Node is the activity, edges are the transitions between activities (better for display)
 
+    @property
+    def G(self):
+        """The routing graph as a networkx MultiDiGraph, a copy for analysis and drawing"""
+        import networkx as nx
+
+        graph = nx.MultiDiGraph()
+        graph.add_nodes_from(self.adjacency)
+        for node, next_nodes in self.adjacency.items():
+            for next_id, activities in next_nodes.items():
+                for activity_id, data in activities.items():
+                    graph.add_edge(node, next_id, activity_id, **data)
+        return graph
+
+    def has_decision(self, name):
+        """Return True if the graph has the decision point"""
+        return name in self.adjacency
+
     def add_decision(self, name):
         """Create a decision point in the graph with decision function"""
 
-        node_id = self.G.add_node(name)
+        self.adjacency.setdefault(name, {})
+        self.compiled = None
+
+    def add_activity(self, name, starting_node, ending_node, weight=1.0, person_types=None):
+        """Create a directed between two nodes edge in the graph with a specific activity attached
 
-        return node_id
+        Arguments:
+            name {string} -- Name of the registered activity
+            starting_node {string} -- Decision node the activity starts from
+            ending_node {string} -- Decision node reached when the activity ends
 
-    def add_activity(self, name, starting_node, ending_node):
-        """Create a directed between two nodes edge in the graph with a specific activity attached"""
-        edge_id = self.G.add_edge(starting_node, ending_node, name)
+        Keyword Arguments:
+            weight {number} -- Relative weight of choosing this activity at the starting node (default: {1.0})
+            person_types {list of strings} -- Types of person that may do the activity, all when None (default: {None})
+        """
+        if weight < 0:
+            raise ValueError('weight must be greater than, or equal to, zero')
 
-        return edge_id
+        person_types = frozenset(person_types) if person_types is not None else None
+        self.adjacency.setdefault(starting_node, {})
+        self.adjacency.setdefault(ending_node, {})
+        self.adjacency[starting_node].setdefault(ending_node, {})[name] = {'weight': weight, 'person_types': person_types}
+        self.compiled = None
 
+        return name
 
-    def get_next_activity(self, node_id):
-        """Determine the next activity, return both the activity and next node ID"""
 
-        # Default no return values
-        _, next_id, activity_id = (None, None, None)
+    def compile(self):
+        """Compile the routing graph into transition tables
 
-        # TODO: This assumes we only have one possible edge from Node, the code will need to be developed
-        # to include routing logic.
-        if node_id:
-            # For each of the available edges
-            for items in self.G.out_edges(node_id, keys=True):
-                _,  next_id, activity_id =  items
-            activity_class, arguments = self.activities[activity_id]
+        Decision nodes are numbered, and for each type of person named in the graph (and None, for
+        any other type) each node has an alias table over the activities that type of person may
+        do from the node. Choosing the next activity is then a constant time lookup.
+        """
+        nodes = list(self.adjacency)
+        self.node_index = {node: index for index, node in enumerate(nodes)}
+
+        out_edges = {node: [(next_id, activity_id, data) for next_id, activities in self.adjacency[node].items()
+                            for activity_id, data in activities.items()]
+                     for node in nodes}
+
+        person_types = {None}
+        for edges in out_edges.values():
+            for _, _, data in edges:
+                if data['person_types']:
+                    person_types.update(data['person_types'])
+
+        self.compiled = {}
+        for person_type in person_types:
+            tables = []
+            for node in nodes:
+                edges = [(next_id, activity_id, data['weight'])
+                         for next_id, activity_id, data in out_edges[node]
+                         if data['person_types'] is None or person_type in data['person_types']]
+                tables.append(TransitionTable(edges) if edges else None)
+            self.compiled[person_type] = tables
+
+
+    def get_next_activity(self, node_id, person_type=None, rng=None):
+        """Determine the next activity, return both the activity and next node ID
+
+        Arguments:
+            node_id {string} -- Decision node the person is at
+
+        Keyword Arguments:
+            person_type {string} -- Type of the person (default: {None})
+            rng {random.Random} -- Random number generator for choosing between activities (default: {random})
+
+        Returns:
+            (string, class obj, dictionary) -- Next node, activity class and arguments for the activity
+        """
+        if self.compiled is None:
+            self.compile()
+
+        tables = self.compiled.get(person_type)
+        if tables is None:
+            tables = self.compiled[None]
+
+        table = tables[self.node_index[node_id]]
+        if table is None:
+            raise ValueError(f'no activity from {node_id} for person type {person_type}')
+
+        next_id, activity_id = table.choose(rng if rng is not None else random)
+        activity_class, arguments = self.activities[activity_id]
 
         return next_id, activity_class, arguments
 
 
+class TransitionTable:
+    """ Alias table for choosing the next activity from a decision node
+
+    Built with Vose's alias method, so choosing an activity takes one random number and constant
+    time however many activities leave the node. A node with one activity does not take a random
+    number.
+    """
+
+    __slots__ = ('next_ids', 'activity_ids', 'probability', 'alias')
 
+    def __init__(self, edges):
+        """Build the alias table
+
+        Arguments:
+            edges {list of tuples} -- (next node, activity name, weight) for each activity from the node
+        """
+        self.next_ids = [next_id for next_id, _, _ in edges]
+        self.activity_ids = [activity_id for _, activity_id, _ in edges]
+
+        weights = [weight for _, _, weight in edges]
+        total = sum(weights)
+        if total <= 0:
+            raise ValueError('the weights of the activities from a node must sum to more than zero')
+
+        n = len(weights)
+        scaled = [weight * n / total for weight in weights]
+        self.probability = [1.0] * n
+        self.alias = list(range(n))
+
+        small = [index for index, value in enumerate(scaled) if value < 1.0]
+        large = [index for index, value in enumerate(scaled) if value >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1.0
+            if scaled[more] < 1.0:
+                small.append(more)
+            else:
+                large.append(more)
+
+
+    def choose(self, rng):
+        """Choose an activity
 
+        Arguments:
+            rng {random.Random} -- Random number generator
 
-          
\ No newline at end of file
+        Returns:
+            (string, string) -- Next node and activity name
+        """
+        n = len(self.activity_ids)
+        if n == 1:
+            index = 0
+        else:
+            u = rng.random() * n
+            index = int(u)
+            if u - index >= self.probability[index]:
+                index = self.alias[index]
+
+        return self.next_ids[index], self.activity_ids[index]
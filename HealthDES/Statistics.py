@@ -0,0 +1,357 @@
+""" Python library to model the spread of infectious diseases within a microenvironment """
+
+import math
+from statistics import NormalDist
+
+import numpy as np
+
+
+class RunningStatistics:
+    """ Streaming mean and variance of a series of observations (Welford's algorithm)
+
+    Observations are added one at a time or in batches, and the statistics of two series may be
+    merged (Chan et al.'s parallel algorithm), e.g. those of chunks of replicates run by different
+    workers. The accumulator holds a count, mean and sum of squared deviations, so its size does
+    not grow with the number of observations. NaN observations are ignored.
+    """
+
+    __slots__ = ('count', 'mean', 'sum_of_squares', 'minimum', 'maximum')
+
+    def __init__(self):
+        """Create an accumulator with no observations"""
+        self.count = 0
+        self.mean = 0.0
+        self.sum_of_squares = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+
+
+    def __len__(self):
+        """Number of observations"""
+        return self.count
+
+
+    def __repr__(self):
+        return f'RunningStatistics(count={self.count}, mean={self.mean}, sd={self.sd})'
+
+
+    def add(self, value):
+        """Add an observation
+
+        Arguments:
+            value {number} -- Observation
+        """
+        if value != value:
+            return
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.sum_of_squares += delta * (value - self.mean)
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+
+
+    def update(self, values):
+        """Add a batch of observations
+
+        Arguments:
+            values {sequence of numbers} -- Observations
+        """
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+
+        batch = RunningStatistics()
+        batch.count = len(values)
+        batch.mean = float(values.mean())
+        batch.sum_of_squares = float(((values - batch.mean) ** 2).sum())
+        batch.minimum = float(values.min())
+        batch.maximum = float(values.max())
+        self.merge(batch)
+
+
+    def merge(self, other):
+        """Add the observations of another accumulator
+
+        Arguments:
+            other {RunningStatistics} -- Accumulator to merge into this one
+
+        Returns:
+            RunningStatistics -- This accumulator
+        """
+        if other.count == 0:
+            return self
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.sum_of_squares += other.sum_of_squares + delta * delta * self.count * other.count / count
+        self.count = count
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        return self
+
+
+    @property
+    def variance(self):
+        """Sample variance, NaN with fewer than two observations"""
+        return self.sum_of_squares / (self.count - 1) if self.count > 1 else math.nan
+
+
+    @property
+    def sd(self):
+        """Sample standard deviation, NaN with fewer than two observations"""
+        return math.sqrt(self.variance) if self.count > 1 else math.nan
+
+
+    @property
+    def standard_error(self):
+        """Standard error of the mean, NaN with fewer than two observations"""
+        return self.sd / math.sqrt(self.count) if self.count > 1 else math.nan
+
+
+    def half_width(self, confidence=0.95):
+        """Half-width of the normal approximation confidence interval of the mean
+
+        Keyword Arguments:
+            confidence {float} -- Confidence level (default: {0.95})
+
+        Returns:
+            float -- Half-width, NaN with fewer than two observations
+        """
+        return NormalDist().inv_cdf(0.5 + confidence / 2) * self.standard_error
+
+
+    def to_dict(self, confidence=0.95):
+        """Statistics as a dictionary, in the form of ReplicateResults.summary
+
+        Keyword Arguments:
+            confidence {float} -- Confidence level (default: {0.95})
+
+        Returns:
+            dictionary -- count, mean, sd, ci lower, ci upper, min and max
+        """
+        half_width = self.half_width(confidence)
+        return {'count': self.count, 'mean': self.mean if self.count else math.nan, 'sd': self.sd,
+                'ci lower': self.mean - half_width, 'ci upper': self.mean + half_width,
+                'min': self.minimum if self.count else math.nan, 'max': self.maximum if self.count else math.nan}
+
+
+class TDigest:
+    """ Mergeable sketch of the distribution of a series of observations, for quantiles (t-digest)
+
+    Observations are summarised by centroids, a mean and a weight, that are small in the tails and
+    larger in the middle of the distribution, so extreme quantiles are estimated accurately. The
+    number of centroids is bounded by the compression, whatever the number of observations, and
+    the digests of two series may be merged, e.g. those of replicates run by different workers.
+
+    Observations are buffered and merged into the centroids a buffer at a time (the merging
+    t-digest of Dunning and Ertl). NaN observations are ignored.
+    """
+
+    __slots__ = ('compression', 'means', 'weights', 'buffer', 'minimum', 'maximum')
+
+    def __init__(self, compression=100):
+        """Create a digest with no observations
+
+        Keyword Arguments:
+            compression {number} -- Bound on the number of centroids, larger is more accurate (default: {100})
+        """
+        if not compression > 0:
+            raise ValueError(f'{compression} must be greater than zero')
+
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.buffer = []
+        self.minimum = math.inf
+        self.maximum = -math.inf
+
+
+    def __len__(self):
+        """Number of observations"""
+        return int(self.weights.sum()) + len(self.buffer)
+
+
+    def add(self, value):
+        """Add an observation
+
+        Arguments:
+            value {number} -- Observation
+        """
+        if value != value:
+            return
+        self.buffer.append(value)
+        if len(self.buffer) >= 5 * self.compression:
+            self._compress()
+
+
+    def update(self, values):
+        """Add a batch of observations
+
+        Arguments:
+            values {sequence of numbers} -- Observations
+        """
+        values = np.asarray(values, dtype=float)
+        self._compress(values[~np.isnan(values)], None)
+
+
+    def merge(self, other):
+        """Add the observations of another digest
+
+        Arguments:
+            other {TDigest} -- Digest to merge into this one
+
+        Returns:
+            TDigest -- This digest
+        """
+        other._compress()
+        self._compress(other.means, other.weights)
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        return self
+
+
+    def _scale(self, q, total):
+        """Scale function (k2 of Dunning and Ertl), centroids span at most one unit, so are smallest in the tails"""
+        q = min(max(q, 1e-15), 1 - 1e-15)
+        return self.compression / (4 * math.log(max(total / self.compression, 1.0)) + 24) * math.log(q / (1 - q))
+
+
+    def _compress(self, means=None, weights=None):
+        """Merge the buffer, and any further centroids, into the centroids"""
+        new_means = [self.means, np.asarray(self.buffer, dtype=float)]
+        new_weights = [self.weights, np.ones(len(self.buffer))]
+        if means is not None and len(means):
+            new_means.append(means)
+            new_weights.append(np.ones(len(means)) if weights is None else weights)
+        self.buffer = []
+
+        means = np.concatenate(new_means)
+        weights = np.concatenate(new_weights)
+        if len(means) == len(self.means):
+            return
+
+        order = np.argsort(means, kind='stable')
+        means = means[order]
+        weights = weights[order]
+        self.minimum = min(self.minimum, float(means[0]))
+        self.maximum = max(self.maximum, float(means[-1]))
+
+        total = float(weights.sum())
+        merged_means = []
+        merged_weights = []
+        mean, weight = float(means[0]), float(weights[0])
+        weight_before = 0.0
+        limit = self._scale(0.0, total) + 1
+        for next_mean, next_weight in zip(means[1:].tolist(), weights[1:].tolist()):
+            if self._scale((weight_before + weight + next_weight) / total, total) <= limit:
+                weight += next_weight
+                mean += (next_mean - mean) * next_weight / weight
+            else:
+                merged_means.append(mean)
+                merged_weights.append(weight)
+                weight_before += weight
+                limit = self._scale(weight_before / total, total) + 1
+                mean, weight = next_mean, next_weight
+        merged_means.append(mean)
+        merged_weights.append(weight)
+
+        self.means = np.array(merged_means)
+        self.weights = np.array(merged_weights)
+
+
+    def quantile(self, q):
+        """Estimate quantiles of the observations
+
+        Arguments:
+            q {number or sequence of numbers} -- Quantiles, between 0 and 1
+
+        Returns:
+            number or numpy array -- Estimates, NaN with no observations
+        """
+        self._compress()
+        if not len(self.means):
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else math.nan
+
+        # Interpolate between the centres of the centroids, and the minimum and maximum at the ends
+        centres = np.cumsum(self.weights) - self.weights / 2
+        total = self.weights.sum()
+        estimate = np.interp(np.asarray(q, dtype=float) * total, np.concatenate(([0.0], centres, [total])),
+                             np.concatenate(([self.minimum], self.means, [self.maximum])))
+        return estimate if np.ndim(q) else float(estimate)
+
+
+class TimeWeightedStatistics:
+    """ Time-weighted mean and variance of a quantity that changes at given times
+
+    The quantity holds each value until the next, e.g. the occupancy of a microenvironment logged
+    at arrivals and departures, or a concentration sampled every period. The accumulator holds the
+    integrals of the value and its square over time, and the statistics of two series (e.g. of
+    replicates) may be merged. NaN values are not integrated.
+    """
+
+    __slots__ = ('time', 'value', 'area', 'area_of_squares', 'duration')
+
+    def __init__(self):
+        """Create an accumulator with no observations"""
+        self.time = None
+        self.value = math.nan
+        self.area = 0.0
+        self.area_of_squares = 0.0
+        self.duration = 0.0
+
+
+    def add(self, time, value):
+        """Record the value of the quantity from a time
+
+        Arguments:
+            time {number} -- Time the quantity takes the value, not before the previous time
+            value {number} -- Value of the quantity
+        """
+        self.close(time)
+        self.value = value
+
+
+    def close(self, time):
+        """Integrate the current value up to a time, e.g. the end of the run
+
+        Arguments:
+            time {number} -- Time to integrate to
+        """
+        if self.time is not None and self.value == self.value:
+            elapsed = time - self.time
+            self.area += self.value * elapsed
+            self.area_of_squares += self.value * self.value * elapsed
+            self.duration += elapsed
+        self.time = time
+
+
+    def merge(self, other):
+        """Add the integrals of another accumulator, up to the time it was last closed
+
+        Arguments:
+            other {TimeWeightedStatistics} -- Accumulator to merge into this one
+
+        Returns:
+            TimeWeightedStatistics -- This accumulator
+        """
+        self.area += other.area
+        self.area_of_squares += other.area_of_squares
+        self.duration += other.duration
+        return self
+
+
+    @property
+    def mean(self):
+        """Time-weighted mean, NaN over no time"""
+        return self.area / self.duration if self.duration > 0 else math.nan
+
+
+    @property
+    def variance(self):
+        """Time-weighted variance, NaN over no time"""
+        if not self.duration > 0:
+            return math.nan
+        return max(self.area_of_squares / self.duration - self.mean ** 2, 0.0)
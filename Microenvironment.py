@@ -31,6 +31,7 @@ class Microenvironment:
         self.env = simulation_params.get('simpy_env', None)
         self.dc = simulation_params.get('data_collector', None)
         self.time_interval = simulation_params.get('time_interval', None)
+        self.exposure_mode = simulation_params.get('exposure_mode', 'tick')
 
         # Microenvironment characteristics
         Check.is_greater_than_zero(volume)
@@ -43,6 +44,15 @@ class Microenvironment:
         # Initialise the building environment
         self.quanta_in_microenvironment = 0.0
 
+        # Event driven exposure, quanta emitted per hour by the people in the microenvironment, the time
+        # the quanta were last brought up to date and the integral of concentration over time to then
+        self.emission_rate = 0.0
+        self.last_update = self.env.now
+        self.cumulative_exposure = 0.0
+        self.open_exposures = {}
+        # Exposure of people whose visit was under way when the simulation started, see Simulation.start_warm
+        self.prior_exposures = {}
+
         # Set limits to the visitor capacity in the microenvironment managed
         # through a simpy resource
         if capacity is None:
@@ -60,7 +70,13 @@ class Microenvironment:
     # Start the microenvironment, usually when simulation established
 
     def run(self):
-        """ Calculate the new quanta concentration in the building """
+        """ Calculate the new quanta concentration in the building
+
+        In event driven exposure mode the quanta are brought up to date when they are used, see advance.
+        """
+        if self.exposure_mode == 'event':
+            return
+
         while True:
 
             # Reduce quanta concentration over time
@@ -68,6 +84,24 @@ class Microenvironment:
 
             yield self.env.timeout(1)  
 
+    def steady_state_quanta(self, quanta_emission_rate):
+        """Quanta in the microenvironment once an emitter has been present long enough for them to stop changing
+
+        Each period the quanta decay by r = exp(-k dt) and the emitter adds E dt, so q = r q + E dt
+        and q = E dt / (1 - r). With event driven exposure the quanta follow dq/dt = E - k q, so q = E / k.
+
+        Arguments:
+            quanta_emission_rate {number} -- Quanta emitted per hour (E)
+
+        Returns:
+            number -- Quanta in the microenvironment
+        """
+        Check.is_greater_than_or_equal_to_zero(quanta_emission_rate)
+        if self.exposure_mode == 'event':
+            return quanta_emission_rate / self.air_exchange_rate
+
+        return quanta_emission_rate * self.time_interval / -math.expm1(-self.air_exchange_rate * self.time_interval)
+
     # Allow visitors to request entry  
   
     def request_entry(self):
@@ -109,14 +143,88 @@ class Microenvironment:
 
     def get_quanta_concentration(self):
         """ Callback from person class to get the quanta concentration """
+        if self.exposure_mode == 'event':
+            self.advance()
         return self.quanta_in_microenvironment / self.volume
 
 
+    # Event driven exposure
+
+    def advance(self):
+        """Bring the quanta and cumulative exposure up to the current simulation time
+
+        Between events the emission rate E is constant, so the quanta q decay towards E / k, where k
+        is the air exchange rate, and the quanta and their integral over time are known exactly.
+        """
+        elapsed = (self.env.now - self.last_update) * self.time_interval
+        if elapsed <= 0:
+            return
+        self.last_update = self.env.now
+
+        steady_state = self.emission_rate / self.air_exchange_rate
+        excess = self.quanta_in_microenvironment - steady_state
+        decayed = -math.expm1(-self.air_exchange_rate * elapsed)
+
+        self.cumulative_exposure += (steady_state * elapsed + excess * decayed / self.air_exchange_rate) / self.volume
+        self.quanta_in_microenvironment = steady_state + excess * (1 - decayed)
+
+
+    def add_emitter(self, quanta_emission_rate):
+        """Start emitting quanta at a rate, from the current simulation time
+
+        Arguments:
+            quanta_emission_rate {number} -- Quanta emitted per hour
+        """
+        Check.is_greater_than_or_equal_to_zero(quanta_emission_rate)
+        self.advance()
+        self.emission_rate += quanta_emission_rate
+
+
+    def remove_emitter(self, quanta_emission_rate):
+        """Stop emitting quanta at a rate, from the current simulation time
+
+        Arguments:
+            quanta_emission_rate {number} -- Quanta emitted per hour
+        """
+        self.advance()
+        self.emission_rate = max(0.0, self.emission_rate - quanta_emission_rate)
+
+
+    def get_cumulative_exposure(self):
+        """Integral of the quanta concentration over time, in quanta hours per m^3, to the current simulation time"""
+        self.advance()
+        return self.cumulative_exposure
+
+
+    def open_exposure(self, person):
+        """Start recording the exposure of a person, returns the cumulative exposure when they start
+
+        The exposure of a visit under way when the simulation started is included, as if the
+        recording had started earlier.
+        """
+        start = self.get_cumulative_exposure() - self.prior_exposures.pop(person, 0.0)
+        self.open_exposures[person] = start
+        return start
+
+
+    def close_exposure(self, person):
+        """Stop recording the exposure of a person
+
+        Returns:
+            number -- Quanta hours per m^3 the person was exposed to
+        """
+        start = self.open_exposures.pop(person)
+        return self.get_cumulative_exposure() - start
+
+
     # Periodic reporting
 
     def initialise_periodic_reporting(self):
         """ Initialise periodic reporting """
         data_set_name = f'Quanta concentration {self.environment_name}'
+        if not self.dc.is_report_enabled(data_set_name):
+            return
+
         callback = self.periodic_reporting_callback
         periods = 1
 
@@ -8,7 +8,11 @@ import itertools
 from HealthDES.DataCollection import DataCollection
 from HealthDES.PersonBase import Person_base
 
-from DiseaseProgression import DiseaseProgression
+from DiseaseProgression import DiseaseProgression, DiseaseState
+from Population import Population
+
+# Quanta emitted per hour by an infected person, when no rate is given
+DEFAULT_QUANTA_EMISSION_RATE = 147
 
 class Person(Person_base):
     """ Class to implement a person as a simpy discreate event simulation
@@ -17,9 +21,19 @@ class Person(Person_base):
 
         The person will have a flow around the simulation implemented as a list of activities
         which are callled as each one completes.
+
+        The characteristics of the person are held in a row of the simulation's population store,
+        the person is a view of the row.
+
+        With common random numbers (simulation_params['random_streams']) the person is given an
+        exponential threshold from their own random stream, and is infected when the quanta they
+        have inhaled reach it. The probability of infection is the same as drawing a uniform for
+        each exposure, but the same person in two scenarios shares the same threshold.
     """
 
-    def __init__(self, simulation_params, starting_node_id, infection_status_label=None, quanta_emission_rate=None, inhalation_rate=None, person_type=None):
+    __slots__ = ('population', 'index', 'infection_status')
+
+    def __init__(self, simulation_params, starting_node_id, infection_status_label=None, quanta_emission_rate=None, inhalation_rate=None, person_type=None, index=None):
         """Establish the persons characteristics, this will be specific to each model
 
         Args:
@@ -29,17 +43,57 @@ class Person(Person_base):
             quanta_emission_rate (number, optional): Quanta emitted by the person per hour. Defaults to None.
             inhalation_rate (number, optional): Respiratory rate of the person per hour. Defaults to None.
             person_type (string, optional): Type of the person (visitor, staff, etc.). Defaults to None.
+            index (int, optional): Row of the population of a person restored from a checkpoint, whose
+                characteristics are already in the population. Defaults to None, a new row.
         """
+        # Characteristics, stored in the population
+        self.population = simulation_params.get('population', None)
+        if self.population is None:
+            self.population = Population()
+
+        if index is not None:
+            Person_base.__init__(self, simulation_params, starting_node_id, person_type, PID=self.population.PID.item(index))
+            self.index = index
+            self.infection_status = DiseaseProgression(population=self.population, index=self.index)
+            return
 
         Person_base.__init__(self, simulation_params, starting_node_id, person_type)
-        
-        # Characteristics
-        self.infection_status = DiseaseProgression(infection_status_label)
-        self.quanta_emission_rate = quanta_emission_rate if quanta_emission_rate else 147
-        self.inhalation_rate = inhalation_rate if inhalation_rate else 0.54  # m^3 h^-1
 
-        self.cumulative_exposure = 0
-        self.infected = False
+        self.index = self.population.add(self.PID, person_type,
+                                         DiseaseState.SUSCEPTIBLE if infection_status_label == None else infection_status_label,
+                                         quanta_emission_rate if quanta_emission_rate else DEFAULT_QUANTA_EMISSION_RATE,
+                                         inhalation_rate if inhalation_rate else 0.54)  # m^3 h^-1
+
+        streams = simulation_params.get('random_streams', None)
+        if streams is not None:
+            self.population.infection_threshold[self.index] = streams.exponential('infection', self.index)
+
+        self.infection_status = DiseaseProgression(population=self.population, index=self.index)
+
+        if self.infection_status.is_state(DiseaseState.INFECTED):
+            self.start_disease_progression()
+
+
+    @property
+    def quanta_emission_rate(self):
+        """Quanta emitted by the person per hour"""
+        return float(self.population.quanta_emission_rate[self.index])
+
+
+    @property
+    def inhalation_rate(self):
+        """Respiratory rate of the person, m^3 per hour"""
+        return float(self.population.inhalation_rate[self.index])
+
+
+    @property
+    def cumulative_exposure(self):
+        """Sum of the quanta concentrations the person has been exposed to, one per period"""
+        return float(self.population.cumulative_exposure[self.index])
+
+    @cumulative_exposure.setter
+    def cumulative_exposure(self, exposure):
+        self.population.cumulative_exposure[self.index] = exposure
 
 
     def get_quanta_emission_rate(self):
@@ -59,15 +113,59 @@ class Person(Person_base):
         """
 
         # TODO: We don't use cumulative exposure, so can we remove?
-        self.cumulative_exposure += quanta_concentration
+        self.population.cumulative_exposure[self.index] += quanta_concentration
 
         # if random.random() < self.infection_risk():
-        if random.random() < self.infection_risk_instant(quanta_concentration):
-            if self.infection_status.is_state('susceptible'):
-                self.log_infection()
+        if self.sample_infection(self.infection_risk_instant(quanta_concentration)):
+            if self.infection_status.is_state(DiseaseState.SUSCEPTIBLE):
+                if self.dc.is_report_enabled('Infections'):
+                    self.log_infection()
                 self.dc.counter_increment('Infections')
-     
-            self.infection_status.set_state('exposed')
+
+                self.infection_status.set_state(DiseaseState.EXPOSED)
+                self.start_disease_progression()
+
+
+    def expose_person_to_dose(self, dose):
+        """Sample infection from the exposure over an interval
+
+        Args:
+            dose (number): Integral of the quanta concentration over the interval, in quanta hours per m^3
+        """
+        self.cumulative_exposure += dose / self.time_interval
+
+        if self.sample_infection(1 - math.exp(-self.inhalation_rate * dose)):
+            if self.infection_status.is_state(DiseaseState.SUSCEPTIBLE):
+                if self.dc.is_report_enabled('Infections'):
+                    self.log_infection()
+                self.dc.counter_increment('Infections')
+
+                self.infection_status.set_state(DiseaseState.EXPOSED)
+                self.start_disease_progression()
+
+
+    def sample_infection(self, probability):
+        """Sample whether the latest exposure infects the person
+
+        Args:
+            probability (number): Probability the exposure infects the person
+
+        Returns:
+            bool: True if infected, with common random numbers when the inhaled quanta have reached the person's threshold
+        """
+        threshold = self.population.infection_threshold.item(self.index)
+        if threshold != threshold:
+            return self.rng.random() < probability
+        return self.inhalation_rate * self.time_interval * self.population.cumulative_exposure.item(self.index) >= threshold
+
+
+    def start_disease_progression(self):
+        """Schedule the person's transitions between disease states, when the simulation has transition timing"""
+        transitions = self.simulation_params.get('disease_transitions', None)
+        if transitions is not None:
+            streams = self.simulation_params.get('random_streams', None)
+            rng = self.rng if streams is None else streams.generator('progression', self.index)
+            self.env.process(self.infection_status.progress(self.env, transitions, rng, self.time_interval))
 
 
     # TODO: Check whether this can be removed
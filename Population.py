@@ -0,0 +1,181 @@
+""" Python library to model the spread of infectious diseases within a microenvironment """
+
+import numpy as np
+
+from DiseaseProgression import DiseaseProgression, DiseaseState
+
+
+class Population:
+    """ Store of the people in a simulation, holding each attribute in a parallel NumPy array
+
+    Each person is a row of the store, and a Person is a lightweight view of its row. The arrays
+    double in size when full, so adding a person is amortised constant time, and a person costs
+    a few tens of bytes however long the simulation runs. Queries over the whole population,
+    e.g. everyone who has been exposed, are vectorised over the arrays.
+
+    Person types are stored as integer codes, see type_code, and disease states as DiseaseState
+    codes. The infection threshold is the exponential threshold of a person's inhaled quanta when
+    the simulation uses common random numbers, NaN otherwise.
+    """
+
+    # Initial number of people allocated
+    initial_capacity = 256
+
+    # Attribute name to array type
+    columns = {'PID': np.int64,
+               'person_type': np.int16,
+               'disease_state': np.int8,
+               'quanta_emission_rate': np.float64,
+               'inhalation_rate': np.float64,
+               'cumulative_exposure': np.float64,
+               'infection_threshold': np.float64}
+
+    def __init__(self):
+        """Create an empty population"""
+        self.size = 0
+        self.capacity = 0
+        for name, dtype in Population.columns.items():
+            setattr(self, name, np.empty(0, dtype=dtype))
+
+        # Person type to code, and code to person type
+        self.type_codes = {}
+        self.type_names = []
+
+
+    def __len__(self):
+        """Number of people in the population"""
+        return self.size
+
+
+    def _grow(self):
+        """Double the capacity of every array"""
+        capacity = max(Population.initial_capacity, 2 * self.capacity)
+        for name in Population.columns:
+            array = getattr(self, name)
+            grown = np.empty(capacity, dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            setattr(self, name, grown)
+        self.capacity = capacity
+
+
+    def type_code(self, person_type):
+        """Integer code for a person type, new types are given the next code
+
+        Arguments:
+            person_type {string} -- Type of person e.g. visitor, staff
+
+        Returns:
+            int -- Code for the person type
+        """
+        code = self.type_codes.get(person_type)
+        if code is None:
+            code = self.type_codes[person_type] = len(self.type_names)
+            self.type_names.append(person_type)
+        return code
+
+
+    def add(self, PID, person_type, infection_status_label, quanta_emission_rate, inhalation_rate, infection_threshold=np.nan):
+        """Add a person to the population
+
+        Arguments:
+            PID {int} -- Person ID
+            person_type {string} -- Type of person e.g. visitor, staff
+            infection_status_label {string or DiseaseState} -- Disease state of the person
+            quanta_emission_rate {number} -- Quanta emitted by the person per hour
+            inhalation_rate {number} -- Respiratory rate of the person per hour
+
+        Keyword Arguments:
+            infection_threshold {number} -- Inhaled quanta at which the person is infected (default: {NaN, sampled per exposure})
+
+        Returns:
+            int -- Index of the person within the population
+        """
+        if self.size == self.capacity:
+            self._grow()
+
+        index = self.size
+        self.PID[index] = PID
+        self.person_type[index] = self.type_code(person_type)
+        self.disease_state[index] = DiseaseProgression.state_code(infection_status_label)
+        self.quanta_emission_rate[index] = quanta_emission_rate
+        self.inhalation_rate[index] = inhalation_rate
+        self.cumulative_exposure[index] = 0.0
+        self.infection_threshold[index] = infection_threshold
+        self.size += 1
+
+        return index
+
+
+    def in_state(self, infection_status_label):
+        """Indices of the people in a disease state
+
+        Arguments:
+            infection_status_label {string or DiseaseState} -- Disease state
+
+        Returns:
+            numpy array -- Indices of the people in the state
+        """
+        code = DiseaseProgression.state_code(infection_status_label)
+        return np.flatnonzero(self.disease_state[:self.size] == code)
+
+
+    def set_state(self, indices, infection_status_label):
+        """Set the disease state of a set of people
+
+        Arguments:
+            indices {numpy array} -- Indices of the people
+            infection_status_label {string or DiseaseState} -- Disease state
+        """
+        self.disease_state[indices] = DiseaseProgression.state_code(infection_status_label)
+
+
+    def transition(self, from_state, to_state, rng, probability=1.0):
+        """Move people from one disease state to another, each with a probability
+
+        Arguments:
+            from_state {string or DiseaseState} -- Disease state people move from
+            to_state {string or DiseaseState} -- Disease state people move to
+            rng {numpy Generator} -- Random number generator, seeded from the simulation so that runs are reproducible
+
+        Keyword Arguments:
+            probability {number or numpy array} -- Probability each person in the from state moves,
+                                                   one for all or one per person in the state (default: {1.0})
+
+        Returns:
+            numpy array -- Indices of the people who moved
+        """
+        indices = self.in_state(from_state)
+        if not np.isscalar(probability) or probability < 1.0:
+            indices = indices[rng.random(len(indices)) < probability]
+
+        self.set_state(indices, to_state)
+        return indices
+
+
+    def count_by_state(self):
+        """Number of people in each disease state
+
+        Returns:
+            dictionary -- Disease state to number of people
+        """
+        counts = np.bincount(self.disease_state[:self.size], minlength=len(DiseaseState))
+        return {state.label: int(counts[state]) for state in DiseaseState}
+
+
+    def memory_usage(self):
+        """Memory used by the population arrays in bytes"""
+        return sum(getattr(self, name).nbytes for name in Population.columns)
+
+
+    def to_dataframe(self):
+        """Return the population as a pandas dataFrame, one row per person
+
+        Returns:
+            pandas dataFrame -- Person attributes with the person type and disease state as labels
+        """
+        import pandas as pd
+
+        df = pd.DataFrame({name: getattr(self, name)[:self.size] for name in Population.columns})
+        df['person_type'] = np.array(self.type_names, dtype=object)[df['person_type'].values] if self.size else None
+        df['disease_state'] = np.array([state.label for state in DiseaseState], dtype=object)[df['disease_state'].values]
+        return df
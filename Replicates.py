@@ -0,0 +1,350 @@
+""" Python library to model the spread of infectious diseases within a microenvironment """
+
+from statistics import NormalDist
+
+import numpy as np
+
+# Import local libraries
+from HealthDES.RandomStreams import RandomStreams, stream_seed
+from HealthDES.Statistics import RunningStatistics
+
+
+# Ways of sampling the random numbers of a set of replicates, see replicate_streams
+SAMPLING_METHODS = ['independent', 'antithetic', 'stratified']
+
+
+def spawn_seeds(seed, replicates):
+    """Create independent seeds for each replicate from a single seed
+
+    A list of seed sequences, one per replicate, is returned unchanged so that a set of replicates
+    may be split into chunks and still use the same seeds.
+
+    Arguments:
+        seed {int, numpy SeedSequence, list of SeedSequence or None} -- Seed for the set of replicates
+        replicates {int} -- Number of replicates
+
+    Returns:
+        list of numpy SeedSequence -- One independent seed sequence per replicate
+    """
+    if isinstance(seed, (list, tuple)):
+        if len(seed) != replicates:
+            raise ValueError('one seed is required for each replicate')
+        return list(seed)
+
+    seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    return seed_sequence.spawn(replicates)
+
+
+def python_seed(seed_sequence):
+    """Integer seed for the standard library random generator from a numpy SeedSequence"""
+    return int(seed_sequence.generate_state(1, np.uint64)[0])
+
+
+def replicate_streams(seed, replicates, sampling='independent', common_random_numbers=False):
+    """Seed and random streams of each replicate
+
+    Sampling:
+        * independent -- each replicate has its own seed, and its own streams with common random numbers.
+        * antithetic -- replicates are in pairs sharing the seed of the first of the pair, the second
+          has antithetic streams. The number of replicates must be even.
+        * stratified -- each replicate has its own seed and stratum, see RandomStreams.
+
+    Arguments:
+        seed {int, numpy SeedSequence or list} -- Seed for the set of replicates, or one per replicate
+        replicates {int} -- Number of replicates
+
+    Keyword Arguments:
+        sampling {string} -- One of SAMPLING_METHODS (default: {'independent'})
+        common_random_numbers {bool} -- Create streams for independent replicates (default: {False})
+
+    Returns:
+        (list of numpy SeedSequence, list of RandomStreams) -- Seed and streams of each replicate, streams are
+                                                              None for independent replicates without common random numbers
+    """
+    if sampling not in SAMPLING_METHODS:
+        raise ValueError(f'sampling must be one of {SAMPLING_METHODS}')
+
+    seeds = spawn_seeds(seed, replicates)
+
+    if sampling == 'antithetic':
+        if replicates % 2:
+            raise ValueError('antithetic sampling requires an even number of replicates')
+        seeds = [seeds[replicate - replicate % 2] for replicate in range(replicates)]
+        streams = [RandomStreams(replicate_seed, antithetic=bool(replicate % 2)) for replicate, replicate_seed in enumerate(seeds)]
+    elif sampling == 'stratified':
+        stratification_seed = stream_seed(seeds[0], 'stratification') if seeds else None
+        streams = [RandomStreams(replicate_seed, stratum=replicate, strata=replicates, stratification_seed=stratification_seed)
+                   for replicate, replicate_seed in enumerate(seeds)]
+    else:
+        streams = [RandomStreams(replicate_seed) if common_random_numbers else None for replicate_seed in seeds]
+
+    return seeds, streams
+
+
+class ReplicateResults:
+    """ Counters from a set of replicate runs of a simulation, stored by column
+
+    Each counter is held as a NumPy array with one entry per replicate. The attack rate of each
+    replicate is derived from the infections and total visitors counters.
+
+    Antithetic replicates are not independent, the confidence intervals use the mean of each pair.
+
+    Aggregate reports collected by the replicates are merged, so their statistics are those of
+    every row of every replicate, see HealthDES.ReportStorage.AggregateReport.
+    """
+
+    def __init__(self, counters, simulation_name=None, confidence=0.95, sampling='independent', aggregates=None):
+        """Store the counters from a set of replicates
+
+        Arguments:
+            counters {dictionary} -- Counter name to sequence of values, one per replicate
+
+        Keyword Arguments:
+            simulation_name {string} -- The name for the simulation (default: {None})
+            confidence {float} -- Confidence level for the confidence intervals (default: {0.95})
+            sampling {string} -- How the random numbers of the replicates were sampled (default: {'independent'})
+            aggregates {dictionary} -- Report name to AggregateReport merged over the replicates (default: {None})
+        """
+        self.simulation_name = simulation_name
+        self.confidence = confidence
+        self.sampling = sampling
+        self.aggregates = aggregates if aggregates is not None else {}
+
+        self.counters = {name: np.asarray(values, dtype=float) for name, values in counters.items()}
+        self.counters.setdefault('Infections', np.zeros(self.replicates))
+
+        visitors = self.counters.get('Total visitors')
+        if visitors is not None:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                self.counters['Attack rate'] = self.counters['Infections'] / visitors
+
+
+    @property
+    def replicates(self):
+        """Number of replicates in the results"""
+        return len(next(iter(self.counters.values()))) if self.counters else 0
+
+
+    def units(self, values):
+        """Independent units of a counter, the replicates or the mean of each antithetic pair"""
+        values = np.asarray(values, dtype=float)
+        return values.reshape(-1, 2).mean(axis=1) if self.sampling == 'antithetic' else values
+
+
+    @property
+    def data(self):
+        """Per replicate counters as a pandas dataFrame"""
+        import pandas as pd
+
+        return pd.DataFrame(self.counters, index=pd.RangeIndex(self.replicates, name='replicate'))
+
+
+    def summary(self):
+        """Mean, standard deviation and confidence interval of the mean for each counter
+
+        Returns:
+            pandas dataFrame -- One row per counter
+        """
+        import pandas as pd
+
+        z = NormalDist().inv_cdf(0.5 + self.confidence / 2)
+        rows = {}
+        for name, values in self.counters.items():
+            mean = np.nanmean(values)
+            sd = np.nanstd(values, ddof=1) if len(values) > 1 else np.nan
+            units = self.units(values)
+            half_width = z * np.nanstd(units, ddof=1) / np.sqrt(len(units)) if len(units) > 1 else np.nan
+            rows[name] = {'mean': mean, 'sd': sd, 'ci lower': mean - half_width, 'ci upper': mean + half_width}
+
+        return pd.DataFrame.from_dict(rows, orient='index')
+
+
+    def aggregate(self):
+        """Summary in the form used by the batch notebook
+
+        The attack rate is the ratio of mean infections to mean visitors.
+
+        Returns:
+            pandas Series -- infections mean, infections sd, visitors mean, visitors sd and attack rate
+        """
+        import pandas as pd
+
+        infections = self.counters['Infections']
+        visitors = self.counters['Total visitors']
+
+        return pd.Series({'infections mean': infections.mean(),
+                          'infections sd': infections.std(ddof=1),
+                          'visitors mean': visitors.mean(),
+                          'visitors sd': visitors.std(ddof=1),
+                          'attack rate': infections.mean() / visitors.mean()},
+                         name=self.simulation_name)
+
+
+class SequentialResults(ReplicateResults):
+    """ Counters from replicates run until the confidence interval of a counter is narrow enough
+
+    As ReplicateResults, with the running statistics of each counter and whether the target
+    half-width of the confidence interval was reached before the cap on replicates.
+    """
+
+    def __init__(self, counters, statistics, target_half_width, converged, simulation_name=None, confidence=0.95, sampling='independent',
+                 aggregates=None):
+        """Store the counters and running statistics from a sequential set of replicates
+
+        Arguments:
+            counters {dictionary} -- Counter name to sequence of values, one per replicate
+            statistics {dictionary} -- Counter name to RunningStatistics of the independent units, see units
+            target_half_width {number} -- Target half-width of the confidence interval
+            converged {bool} -- True if the target was reached
+
+        Keyword Arguments:
+            simulation_name {string} -- The name for the simulation (default: {None})
+            confidence {float} -- Confidence level for the confidence intervals (default: {0.95})
+            sampling {string} -- How the random numbers of the replicates were sampled (default: {'independent'})
+            aggregates {dictionary} -- Report name to AggregateReport merged over the replicates (default: {None})
+        """
+        super().__init__(counters, simulation_name=simulation_name, confidence=confidence, sampling=sampling, aggregates=aggregates)
+        self.statistics = statistics
+        self.target_half_width = target_half_width
+        self.converged = converged
+
+
+def run_sequential_replicates(simulation, target_half_width, max_replicates=10000, min_replicates=100, batch_size=100,
+                              seed=None, counter='Attack rate', confidence=0.95, sampling='independent', **run_parameters):
+    """Run batches of replicates until the confidence interval of the mean of a counter is narrow enough
+
+    After each batch the running mean and variance of every counter are updated (Welford), and
+    replicates stop once the half-width of the confidence interval of the counter is at most the
+    target, or the cap is reached. Replicate i has the i-th seed spawned from the seed, as in
+    run_replicates, so the replicates are those of a fixed size run whatever the batch size.
+
+    The minimum number of replicates guards against stopping on a poor estimate of the variance,
+    in particular when no infections have yet been seen and the variance is zero.
+
+    Antithetic pairs are not independent, so the running statistics are of the mean of each pair,
+    see ReplicateResults.units, and the batch size and number of replicates must be even.
+    Stratified sampling divides a fixed number of replicates into strata, so cannot be run until
+    a target is reached.
+
+    Arguments:
+        simulation {Simulation or VectorisedSimulation} -- Simulation to run, by its run_replicates method
+        target_half_width {number} -- Target half-width of the confidence interval of the mean
+
+    Keyword Arguments:
+        max_replicates {int} -- Cap on the number of replicates (default: {10000})
+        min_replicates {int} -- Minimum number of replicates (default: {100})
+        batch_size {int} -- Replicates in each batch (default: {100})
+        seed {int or numpy SeedSequence} -- Seed for the set of replicates (default: {None})
+        counter {string} -- Counter whose confidence interval is tested (default: {'Attack rate'})
+        confidence {float} -- Confidence level (default: {0.95})
+        sampling {string} -- 'independent' or 'antithetic' (default: {'independent'})
+        run_parameters -- Keyword arguments passed to run_replicates, e.g. quanta_emission_rate
+
+    Returns:
+        SequentialResults -- Counters for each replicate, running statistics and whether the target was reached
+    """
+    if not target_half_width > 0:
+        raise ValueError(f'{target_half_width} must be greater than zero')
+    if batch_size <= 0 or min_replicates > max_replicates:
+        raise ValueError('batch size must be greater than zero and min replicates at most max replicates')
+    if sampling not in ('independent', 'antithetic'):
+        raise ValueError(f'{sampling} sampling cannot be run sequentially, use independent or antithetic sampling')
+    if sampling == 'antithetic' and (batch_size % 2 or min_replicates % 2 or max_replicates % 2):
+        raise ValueError('antithetic sampling requires an even batch size, min replicates and max replicates')
+
+    seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+    batches = []
+    statistics = {}
+    aggregates = {}
+    replicates = 0
+    converged = False
+    while replicates < max_replicates and not converged:
+        size = min(batch_size, max_replicates - replicates)
+        results = simulation.run_replicates(size, seed=seed_sequence.spawn(size), sampling=sampling, **run_parameters)
+        replicates += size
+
+        if counter not in results.counters:
+            raise ValueError(f'{counter} is not a counter of the replicates')
+
+        batches.append(results.counters)
+        for name, values in results.counters.items():
+            statistics.setdefault(name, RunningStatistics()).update(results.units(values))
+        for name, report in results.aggregates.items():
+            aggregates[name] = aggregates[name].merge(report) if name in aggregates else report
+
+        half_width = statistics[counter].half_width(confidence)
+        converged = replicates >= min_replicates and half_width <= target_half_width
+
+    counters = {name: np.concatenate([batch[name] for batch in batches]) for name in batches[0]}
+    counters.pop('Attack rate', None)
+
+    return SequentialResults(counters, statistics, target_half_width, converged,
+                             simulation_name=getattr(simulation, 'simulation_name', None), confidence=confidence,
+                             sampling=sampling, aggregates=aggregates)
+
+
+def compare_scenarios(simulations, replicates, seed=None, sampling='independent', counters=('Infections', 'Attack rate'),
+                      confidence=0.95, **run_parameters):
+    """Compare scenarios with common random numbers
+
+    Every scenario runs the same replicates, with the same seeds and random streams, so the same
+    person has the same infection threshold and arrival draws in each scenario. The difference
+    between a scenario and the first (the baseline) is calculated replicate by replicate, and its
+    variance is usually several times less than that of the difference of independent runs.
+
+    Antithetic pairs can increase the variance of a difference, e.g. when the infection probability
+    of a person is above one half in one scenario and below in the other, the variance reduction
+    column shows the effect of the sampling.
+
+    Arguments:
+        simulations {dictionary} -- Scenario name to simulation, Simulation or VectorisedSimulation, the first is the baseline
+        replicates {int} -- Number of replicates of each scenario
+
+    Keyword Arguments:
+        seed {int or numpy SeedSequence} -- Seed for the set of replicates (default: {None})
+        sampling {string} -- One of SAMPLING_METHODS (default: {'independent'})
+        counters {list of strings} -- Counters to compare (default: {('Infections', 'Attack rate')})
+        confidence {float} -- Confidence level of the confidence interval of the difference (default: {0.95})
+        run_parameters -- Keyword arguments passed to run_replicates, e.g. quanta_emission_rate
+
+    Returns:
+        pandas dataFrame -- For each scenario and counter: the mean, the mean difference from the baseline,
+                            its confidence interval, and the variance reduction, the ratio of the variance
+                            of the difference of independent runs to that observed
+    """
+    import pandas as pd
+
+    if not simulations:
+        raise ValueError('there are no scenarios to compare')
+
+    # Spawn the seeds once, so that every scenario has the same seeds
+    seeds = spawn_seeds(seed, replicates)
+    results = {name: simulation.run_replicates(replicates, seed=seeds, sampling=sampling, common_random_numbers=True, **run_parameters)
+               for name, simulation in simulations.items()}
+
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    baseline = results[next(iter(results))]
+
+    rows = {}
+    for name, result in results.items():
+        for counter in counters:
+            units = result.units(result.counters[counter])
+            baseline_units = baseline.units(baseline.counters[counter])
+            difference = units - baseline_units
+
+            half_width = z * np.nanstd(difference, ddof=1) / np.sqrt(len(difference))
+            independent_variance = np.nanvar(units, ddof=1) + np.nanvar(baseline_units, ddof=1)
+            difference_variance = np.nanvar(difference, ddof=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                variance_reduction = independent_variance / difference_variance if difference_variance > 0 else np.nan
+
+            rows[(name, counter)] = {'mean': np.nanmean(result.counters[counter]),
+                                     'difference': np.nanmean(difference),
+                                     'ci lower': np.nanmean(difference) - half_width,
+                                     'ci upper': np.nanmean(difference) + half_width,
+                                     'variance reduction': variance_reduction}
+
+    summary = pd.DataFrame.from_dict(rows, orient='index')
+    summary.index.names = ['scenario', 'counter']
+    return summary
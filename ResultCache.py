@@ -0,0 +1,349 @@
+""" Python library to model the spread of infectious diseases within a microenvironment """
+
+import os
+import glob
+import json
+import pickle
+import hashlib
+import tempfile
+
+import numpy as np
+
+# Import local libraries
+from Replicates import ReplicateResults
+
+
+# Default location of the result cache, relative to the working directory
+CACHE_PATH = os.path.join('.', '.result_cache')
+
+# Format of the cache entries, part of every key
+CACHE_FORMAT = 1
+
+# Attributes of a simulation that determine its results
+SIMULATION_INPUTS = ('simulation_name', 'microenvironment_name', 'periods', 'report_settings', 'zones', 'airflow',
+                     'exposure_mode', 'arrival_process', 'common_random_numbers', 'warm_start')
+
+_code_version = None
+
+def code_version():
+    """Hash of the source of the simulation modules, results cached by other code are not used"""
+    global _code_version
+    if _code_version is None:
+        root = os.path.dirname(os.path.abspath(__file__))
+        digest = hashlib.sha256()
+        for path in sorted(glob.glob(os.path.join(root, '*.py')) + glob.glob(os.path.join(root, 'HealthDES', '*.py'))):
+            digest.update(os.path.relpath(path, root).encode())
+            with open(path, 'rb') as file:
+                digest.update(file.read())
+        _code_version = digest.hexdigest()
+    return _code_version
+
+
+def _canonical(value):
+    """Value as plain JSON data, so that equal inputs serialise, and hash, identically"""
+    if isinstance(value, dict) or hasattr(value, 'items') and callable(value.items):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, np.random.SeedSequence):
+        return {'entropy': _canonical(value.entropy), 'spawn_key': list(value.spawn_key), 'pool_size': value.pool_size}
+    if isinstance(value, np.ndarray):
+        return {'dtype': str(value.dtype), 'shape': list(value.shape), 'values': _canonical(value.tolist())}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, float) and value != value:
+        return 'nan'
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return {'type': type(value).__qualname__, 'pickle': hashlib.sha256(pickle.dumps(value)).hexdigest()}
+
+
+def simulation_inputs(simulation):
+    """Inputs of a simulation that determine its results, including the rows of its microenvironments
+
+    Arguments:
+        simulation {Simulation or VectorisedSimulation} -- Simulation, not yet run
+
+    Returns:
+        dictionary -- Engine, simulation settings, seed and environment database rows
+    """
+    inputs = {name: getattr(simulation, name, None) for name in SIMULATION_INPUTS}
+    inputs['engine'] = type(simulation).__name__
+    inputs['seed'] = simulation.seed
+    dc = getattr(simulation, 'dc', None)
+    inputs['simulation_run'] = dc.simulation_run if dc is not None else getattr(simulation, 'simulation_run', None)
+    inputs['disease_transitions'] = getattr(simulation, 'simulation_params', {}).get('disease_transitions')
+
+    names = simulation.zones if getattr(simulation, 'zones', None) else [simulation.microenvironment_name]
+    inputs['microenvironments'] = {name: dict(simulation.config.microenvironments[name]) for name in names}
+    return inputs
+
+
+class CachedResults:
+    """ Counters and reports of a simulation run, held or read from the result cache
+
+    Results are read with the same methods as from the simulation that produced them. Person IDs
+    in the reports are those of the run that was cached.
+    """
+
+    def __init__(self, counters, reports, cached=False):
+        """Store the results
+
+        Arguments:
+            counters {dictionary} -- Counter name to value
+            reports {dictionary} -- Report name to (dictionary of column name to array, name of the index column or None)
+
+        Keyword Arguments:
+            cached {bool} -- True if the results were read from the cache (default: {False})
+        """
+        self.counters = counters
+        self.reports = reports
+        self.cached = cached
+
+
+    def get_list_of_reports(self):
+        """Get the list of reports."""
+        return list(self.reports)
+
+
+    def get_results(self, data_set_name):
+        """Return stored report as a pandas dataFrame, None if there is no such report"""
+        import pandas as pd
+
+        report = self.reports.get(data_set_name)
+        if report is None:
+            return None
+
+        columns, index = report
+        df = pd.DataFrame(columns).infer_objects()
+        return df.set_index(index) if index is not None else df
+
+
+    def get_counter(self, data_set_name):
+        """Return stored value of a counter, None if it was not counted"""
+        return self.counters.get(data_set_name)
+
+
+class ResultCache:
+    """ Content-addressed cache of simulation results on disk
+
+    Each entry is keyed by the SHA-256 hash of every input of the run: the engine and its settings,
+    the rows of the environment database used, the run parameters, the seed and the source of the
+    simulation modules. A change to any of them is a different key, so entries are never stale.
+    Runs without a seed are not reproducible and are not cached.
+
+    Entries are compressed NumPy archives of the counters and report columns, written to a
+    temporary file and renamed into place, so parallel workers may share the cache: a reader sees
+    a complete entry or none. Reading an entry marks it as used, and the least recently used
+    entries are removed when the cache grows beyond its size cap.
+    """
+
+    def __init__(self, path=None, max_bytes=2 ** 30):
+        """Open, or create, the cache
+
+        Keyword Arguments:
+            path {string} -- Directory holding the cache (default: {CACHE_PATH})
+            max_bytes {int} -- Size cap of the cache in bytes (default: {1 GiB})
+        """
+        self.path = path if path else CACHE_PATH
+        self.max_bytes = max_bytes
+        os.makedirs(self.path, exist_ok=True)
+
+
+    @staticmethod
+    def key(**inputs):
+        """Key of a set of inputs, with the code version and cache format
+
+        Returns:
+            string -- Hexadecimal SHA-256 hash
+        """
+        inputs = dict(inputs, code_version=code_version(), cache_format=CACHE_FORMAT)
+        data = json.dumps(_canonical(inputs), sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(data.encode()).hexdigest()
+
+
+    def entry_path(self, key):
+        """Path of the entry of a key"""
+        return os.path.join(self.path, key + '.npz')
+
+
+    def get(self, key):
+        """Read an entry
+
+        Arguments:
+            key {string} -- Key of the entry
+
+        Returns:
+            (dictionary, dictionary of arrays) -- Description and arrays of the entry, None if it is not cached
+        """
+        path = self.entry_path(key)
+        try:
+            with np.load(path, allow_pickle=True) as archive:
+                arrays = {name: archive[name] for name in archive.files}
+            os.utime(path)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+            # Missing, evicted while being read, or left incomplete by a process that was killed
+            return None
+
+        return json.loads(str(arrays.pop('description'))), arrays
+
+
+    def put(self, key, description, arrays):
+        """Write an entry, then evict the least recently used entries beyond the size cap
+
+        Arguments:
+            key {string} -- Key of the entry
+            description {dictionary} -- JSON data describing the entry
+            arrays {dictionary} -- Array name to NumPy array
+        """
+        handle, temporary_path = tempfile.mkstemp(dir=self.path, prefix=f'{key}-', suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                np.savez_compressed(file, description=np.array(json.dumps(description)), **arrays)
+            os.replace(temporary_path, self.entry_path(key))
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+
+        self.evict()
+
+
+    def entries(self):
+        """Path, size and last use of every entry, least recently used first"""
+        entries = []
+        for path in glob.glob(os.path.join(self.path, '*.npz')):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, path, stat.st_size))
+        return [(path, size, used) for used, path, size in sorted(entries)]
+
+
+    def size(self):
+        """Bytes used by the entries"""
+        return sum(size for _, size, _ in self.entries())
+
+
+    def evict(self, max_bytes=None):
+        """Remove the least recently used entries until the cache is within a size
+
+        Keyword Arguments:
+            max_bytes {int} -- Size to shrink the cache to (default: {the size cap})
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+    def clear(self):
+        """Remove every entry"""
+        self.evict(0)
+
+
+    # Caching of simulation runs
+
+    def run(self, simulation, **run_parameters):
+        """Run a simulation, or read the results of the same run from the cache
+
+        Arguments:
+            simulation {Simulation or VectorisedSimulation} -- Simulation, not yet run, created with a seed
+            run_parameters -- Keyword arguments of the simulation's run method, e.g. quanta_emission_rate
+
+        Returns:
+            CachedResults -- Counters and reports of the run
+        """
+        if simulation.seed is None:
+            simulation.run(**run_parameters)
+            return self.results_of(simulation)
+
+        key = self.key(kind='run', simulation=simulation_inputs(simulation), run_parameters=run_parameters)
+        entry = self.get(key)
+        if entry is not None:
+            description, arrays = entry
+            counters = {name: arrays[f'counter {index}'].item() for index, name in enumerate(description['counters'])}
+            reports = {}
+            for index, (name, columns, report_index) in enumerate(description['reports']):
+                reports[name] = ({column: arrays[f'report {index} {position}'] for position, column in enumerate(columns)},
+                                 report_index)
+            return CachedResults(counters, reports, cached=True)
+
+        simulation.run(**run_parameters)
+        results = self.results_of(simulation)
+
+        description = {'counters': list(results.counters), 'reports': []}
+        arrays = {f'counter {index}': np.array(value) for index, value in enumerate(results.counters.values())}
+        for index, (name, (columns, report_index)) in enumerate(results.reports.items()):
+            description['reports'].append([name, list(columns), report_index])
+            arrays.update({f'report {index} {position}': values for position, values in enumerate(columns.values())})
+        self.put(key, description, arrays)
+
+        return results
+
+
+    @staticmethod
+    def results_of(simulation):
+        """Counters and reports of a simulation that has run"""
+        counters = dict(simulation.dc.counters) if hasattr(simulation, 'dc') else dict(simulation.counters)
+
+        reports = {}
+        for name in simulation.get_list_of_reports():
+            df = simulation.get_results(name)
+            index = df.index.name
+            if index is not None:
+                df = df.reset_index()
+            reports[name] = ({column: df[column].to_numpy() for column in df.columns}, index)
+
+        return CachedResults(counters, reports)
+
+
+    def run_replicates(self, simulation, replicates, seed=None, **parameters):
+        """Run replicates of a simulation, or read the results of the same replicates from the cache
+
+        Arguments:
+            simulation {Simulation or VectorisedSimulation} -- Simulation to run replicates of
+            replicates {int} -- Number of replicates
+
+        Keyword Arguments:
+            seed {int, numpy SeedSequence or list} -- Seed for the set of replicates, or one per replicate (default: {None, not cached})
+            parameters -- Keyword arguments of run_replicates, e.g. quanta_emission_rate or sampling
+
+        Returns:
+            ReplicateResults -- Counters for each replicate, and summary statistics
+        """
+        if seed is None:
+            return simulation.run_replicates(replicates, seed=seed, **parameters)
+
+        # Each replicate has its own seed and run number
+        inputs = simulation_inputs(simulation)
+        inputs.pop('seed')
+        inputs.pop('simulation_run')
+        key = self.key(kind='replicates', simulation=inputs, replicates=replicates, seed=seed, parameters=parameters)
+
+        entry = self.get(key)
+        if entry is not None:
+            description, arrays = entry
+            counters = {name: arrays[f'counter {index}'] for index, name in enumerate(description['counters'])}
+            aggregates = arrays['aggregates'].item() if 'aggregates' in arrays else {}
+            return ReplicateResults(counters, simulation_name=description['simulation_name'],
+                                    sampling=description['sampling'], aggregates=aggregates)
+
+        results = simulation.run_replicates(replicates, seed=seed, **parameters)
+
+        counters = {name: values for name, values in results.counters.items() if name != 'Attack rate'}
+        description = {'counters': list(counters), 'simulation_name': results.simulation_name, 'sampling': results.sampling}
+        arrays = {f'counter {index}': values for index, values in enumerate(counters.values())}
+        if results.aggregates:
+            arrays['aggregates'] = np.array(results.aggregates, dtype=object)
+        self.put(key, description, arrays)
+
+        return results
@@ -0,0 +1,601 @@
+""" Python library to model the spread of infectious diseases within a microenvironment """
+
+import os
+import math
+import json
+import time
+import argparse
+import threading
+import itertools
+import multiprocessing
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from urllib.request import Request, urlopen
+
+import numpy as np
+
+# Import local libraries
+from HealthDES.Check import validation_boundary
+from HealthDES.Statistics import RunningStatistics
+from Configuration import Config
+from Replicates import spawn_seeds
+from Simulation import Simulation
+from VectorisedSimulation import VectorisedSimulation
+
+
+ENGINES = {'des': Simulation, 'vectorised': VectorisedSimulation}
+
+# Scenario parameters accepted by the service, and their defaults
+SCENARIO_PARAMETERS = {'environment': None, 'replicates': 100, 'seed': None, 'periods': 180, 'engine': 'des',
+                       'quanta_emission_rate': None, 'inhalation_rate': None, 'arrivals_per_hour': None, 'max_arrivals': None}
+
+# Parameters passed to run_replicates
+RUN_PARAMETERS = ('quanta_emission_rate', 'inhalation_rate', 'arrivals_per_hour', 'max_arrivals')
+
+# States of a scenario in the service
+JOB_STATES = ['queued', 'running', 'done', 'cancelled', 'failed']
+
+# Simulations kept by each worker process, the least recently used is dropped first
+WORKER_SIMULATIONS = 16
+
+
+class ScenarioJob:
+    """ A scenario submitted to the service, run as chunks of replicates """
+
+    def __init__(self, job_id, parameters, chunks):
+        """Create the job
+
+        Arguments:
+            job_id {string} -- Identifier of the job
+            parameters {dictionary} -- Scenario parameters, complete and validated
+            chunks {list of (int, list of numpy SeedSequence)} -- First replicate and seeds of each chunk
+        """
+        self.job_id = job_id
+        self.parameters = parameters
+        self.pending = deque(chunks)
+        self.chunks = len(chunks)
+        self.counters = {}
+        self.state = 'queued'
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.done = threading.Event()
+
+
+    @property
+    def completed(self):
+        """Number of chunks completed"""
+        return len(self.counters)
+
+
+    def summary(self):
+        """Summary of the counters of the replicates run
+
+        Returns:
+            dictionary -- Statistics of each counter, see RunningStatistics.to_dict, and the attack rate as the
+                          ratio of mean infections to mean visitors, as ReplicateResults.aggregate
+        """
+        counters = {}
+        for first_replicate in sorted(self.counters):
+            for name, values in self.counters[first_replicate].items():
+                counters.setdefault(name, []).extend(values)
+
+        if counters.get('Total visitors'):
+            with np.errstate(invalid='ignore', divide='ignore'):
+                counters['Attack rate'] = np.divide(counters['Infections'], counters['Total visitors']).tolist()
+
+        summary = {'replicates': len(counters.get('Infections', [])), 'counters': {}}
+        for name, values in counters.items():
+            statistics = RunningStatistics()
+            statistics.update(values)
+            summary['counters'][name] = statistics.to_dict()
+
+        if counters.get('Total visitors'):
+            summary['attack rate'] = float(np.mean(counters['Infections']) / np.mean(counters['Total visitors']))
+        return summary
+
+
+    def to_dict(self):
+        """State of the job, with the summary of the results once done"""
+        job = {'id': self.job_id, 'state': self.state, 'parameters': self.parameters,
+               'progress': self.completed / self.chunks if self.chunks else 1.0}
+        if self.state == 'done':
+            job['results'] = self.summary()
+        if self.error:
+            job['error'] = self.error
+        return job
+
+
+# Worker processes load the configuration once, and keep the simulations of recent scenarios between tasks
+_worker_config = None
+_worker_simulations = OrderedDict()
+
+def _initialise_worker(database_path):
+    """Load the configuration in the worker process"""
+    global _worker_config
+    _worker_config = Config.load(database_path)
+
+
+def _run_chunk(parameters, seeds):
+    """Run a chunk of replicates of a scenario
+
+    Arguments:
+        parameters {dictionary} -- Scenario parameters
+        seeds {list of numpy SeedSequence} -- Seed of each replicate
+
+    Returns:
+        dictionary -- Counter name to list of values, one per replicate
+    """
+    key = (parameters['engine'], parameters['environment'], parameters['periods'])
+    simulation = _worker_simulations.get(key)
+    if simulation is None:
+        simulation = ENGINES[parameters['engine']](parameters['environment'], microenvironment=parameters['environment'],
+                                                   periods=parameters['periods'], config=_worker_config)
+        _worker_simulations[key] = simulation
+        while len(_worker_simulations) > WORKER_SIMULATIONS:
+            _worker_simulations.popitem(last=False)
+    _worker_simulations.move_to_end(key)
+
+    results = simulation.run_replicates(len(seeds), seed=seeds, **{name: parameters[name] for name in RUN_PARAMETERS})
+    return {name: values.tolist() for name, values in results.counters.items() if name != 'Attack rate'}
+
+
+class SimulationService:
+    """ Long-lived pool of worker processes running scenarios submitted by concurrent clients
+
+    The workers load the configuration once and keep the simulations of recent environments and
+    periods, up to WORKER_SIMULATIONS, so a scenario does not pay for starting processes, reading
+    the workbook or building the routing.
+    Each scenario is split into chunks of replicates held in a request queue. Chunks are sent to
+    the pool a few at a time, taking turns between the queued scenarios, so a small scenario is
+    not held up behind a large one, and cancelling a scenario drops its queued chunks.
+
+    Scenarios with a seed are memoised: an identical request returns the scenario already queued,
+    running or done. Replicate i has the i-th seed spawned from the seed, as in run_replicates, so
+    the results do not depend on the chunk size.
+    """
+
+    def __init__(self, workers=None, database_path=None, chunk_size=50, max_jobs=1000):
+        """Start the worker pool
+
+        Keyword Arguments:
+            workers {int} -- Number of worker processes (default: {number of cores})
+            database_path {string} -- Path to the environment database workbook (default: {None})
+            chunk_size {int} -- Replicates in each chunk (default: {50})
+            max_jobs {int} -- Finished scenarios kept for clients and memoisation, oldest dropped first (default: {1000})
+        """
+        self.config = Config.load(database_path)
+        self.workers = workers if workers else os.cpu_count()
+        self.chunk_size = chunk_size
+        self.max_jobs = max_jobs
+
+        self.jobs = OrderedDict()
+        self.memoised = {}
+        self.queue = deque()
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self.job_ids = itertools.count(1)
+
+        self.pool = multiprocessing.Pool(self.workers, initializer=_initialise_worker, initargs=(database_path,))
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def close(self):
+        """Cancel the queued scenarios and stop the worker pool"""
+        with self.lock:
+            for job in self.jobs.values():
+                self._cancel(job)
+        self.pool.terminate()
+        self.pool.join()
+
+
+    def validate(self, parameters):
+        """Complete the scenario parameters with their defaults and check them
+
+        Arguments:
+            parameters {dictionary} -- Scenario parameters, see SCENARIO_PARAMETERS
+
+        Returns:
+            dictionary -- Every scenario parameter
+
+        Raises:
+            ValueError: An unknown or invalid parameter
+        """
+        unknown = set(parameters) - set(SCENARIO_PARAMETERS)
+        if unknown:
+            raise ValueError(f'{sorted(unknown)} are not scenario parameters')
+
+        parameters = dict(SCENARIO_PARAMETERS, **parameters)
+        if parameters['environment'] not in self.config.microenvironments:
+            raise ValueError(f"{parameters['environment']} is not an environment of the environment database")
+        if parameters['engine'] not in ENGINES:
+            raise ValueError(f'engine must be one of {list(ENGINES)}')
+        # bool is a subclass of int, but true is not a number of replicates, periods or a seed
+        for name in ('replicates', 'periods', 'seed'):
+            if isinstance(parameters[name], bool):
+                raise ValueError(f'{name} must be an integer, not a boolean')
+        if not isinstance(parameters['replicates'], int) or parameters['replicates'] <= 0:
+            raise ValueError('replicates must be an integer greater than zero')
+        if not isinstance(parameters['periods'], int) or parameters['periods'] <= 0:
+            raise ValueError('periods must be an integer greater than zero')
+        if parameters['seed'] is not None and not isinstance(parameters['seed'], int):
+            raise ValueError('seed must be an integer')
+
+        # Run parameters are floats, so that 147 and 147.0 are the same scenario when memoised
+        for name in RUN_PARAMETERS:
+            if parameters[name] is not None:
+                if isinstance(parameters[name], bool) or not isinstance(parameters[name], (int, float)):
+                    raise ValueError(f'{name} must be a number')
+                parameters[name] = float(parameters[name])
+
+        with validation_boundary():
+            Simulation.check_run_parameters(*(parameters[name] for name in ('arrivals_per_hour', 'quanta_emission_rate',
+                                                                             'inhalation_rate', 'max_arrivals')))
+        return parameters
+
+
+    def submit(self, parameters):
+        """Queue a scenario, or return the memoised scenario with the same parameters and seed
+
+        Arguments:
+            parameters {dictionary} -- Scenario parameters, see SCENARIO_PARAMETERS
+
+        Returns:
+            (string, bool) -- Identifier of the scenario, and True if it was memoised
+        """
+        parameters = self.validate(parameters)
+        key = json.dumps(parameters, sort_keys=True) if parameters['seed'] is not None else None
+
+        with self.lock:
+            job_id = self.memoised.get(key)
+            if job_id is not None:
+                self.jobs.move_to_end(job_id)
+                return job_id, True
+
+            seeds = spawn_seeds(parameters['seed'], parameters['replicates'])
+            chunks = [(first_replicate, seeds[first_replicate:first_replicate + self.chunk_size])
+                      for first_replicate in range(0, parameters['replicates'], self.chunk_size)]
+
+            job = ScenarioJob(str(next(self.job_ids)), parameters, chunks)
+            self.jobs[job.job_id] = job
+            if key is not None:
+                self.memoised[key] = job.job_id
+            self.queue.append(job)
+            self._forget_finished()
+            self._dispatch()
+
+        return job.job_id, False
+
+
+    def status(self, job_id, wait=None):
+        """State of a scenario, with its results once done
+
+        Arguments:
+            job_id {string} -- Identifier of the scenario
+
+        Keyword Arguments:
+            wait {number} -- Seconds to wait for the scenario to finish (default: {None})
+
+        Returns:
+            dictionary -- State of the scenario, see ScenarioJob.to_dict
+
+        Raises:
+            KeyError: Unknown scenario
+        """
+        job = self.jobs[job_id]
+        if wait:
+            job.done.wait(wait)
+        with self.lock:
+            return job.to_dict()
+
+
+    def run(self, parameters, timeout=None):
+        """Run a scenario and wait for its results
+
+        Arguments:
+            parameters {dictionary} -- Scenario parameters, see SCENARIO_PARAMETERS
+
+        Keyword Arguments:
+            timeout {number} -- Seconds to wait (default: {None, wait until done})
+
+        Returns:
+            dictionary -- State of the scenario, see ScenarioJob.to_dict
+        """
+        job_id, _ = self.submit(parameters)
+        self.jobs[job_id].done.wait(timeout)
+        return self.status(job_id)
+
+
+    def cancel(self, job_id):
+        """Cancel a scenario, its queued chunks are dropped and those running are discarded
+
+        Arguments:
+            job_id {string} -- Identifier of the scenario
+
+        Returns:
+            dictionary -- State of the scenario
+
+        Raises:
+            KeyError: Unknown scenario
+        """
+        with self.lock:
+            job = self.jobs[job_id]
+            self._cancel(job)
+            return job.to_dict()
+
+
+    def info(self):
+        """Workers, queued and running chunks, and scenarios by state"""
+        with self.lock:
+            states = {state: 0 for state in JOB_STATES}
+            for job in self.jobs.values():
+                states[job.state] += 1
+            return {'workers': self.workers, 'queued chunks': sum(len(job.pending) for job in self.queue),
+                    'running chunks': self.in_flight, 'scenarios': states}
+
+
+    # Request queue, called with the lock held
+
+    def _cancel(self, job):
+        """Drop the queued chunks of a scenario that has not finished"""
+        if job.state not in ('queued', 'running'):
+            return
+        job.pending.clear()
+        if job in self.queue:
+            self.queue.remove(job)
+        self._finish(job, 'cancelled')
+
+
+    def _finish(self, job, state, error=None):
+        """Record the end of a scenario, a scenario that did not complete is not memoised"""
+        job.state = state
+        job.error = error
+        job.finished = time.time()
+        if state != 'done':
+            key = json.dumps(job.parameters, sort_keys=True)
+            if self.memoised.get(key) == job.job_id:
+                del self.memoised[key]
+        job.done.set()
+
+
+    def _forget_finished(self):
+        """Drop the oldest finished scenarios beyond the number kept"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.done.is_set()]
+        for job_id in finished[:max(0, len(finished) - self.max_jobs)]:
+            job = self.jobs.pop(job_id)
+            key = json.dumps(job.parameters, sort_keys=True)
+            if self.memoised.get(key) == job_id:
+                del self.memoised[key]
+
+
+    def _dispatch(self):
+        """Send chunks to the pool, taking turns between the queued scenarios, two per worker at most"""
+        while self.queue and self.in_flight < 2 * self.workers:
+            job = self.queue.popleft()
+            first_replicate, seeds = job.pending.popleft()
+            if job.pending:
+                self.queue.append(job)
+
+            job.state = 'running'
+            self.in_flight += 1
+            self.pool.apply_async(_run_chunk, (job.parameters, seeds),
+                                  callback=lambda counters, job=job, first=first_replicate: self._chunk_done(job, first, counters),
+                                  error_callback=lambda error, job=job: self._chunk_failed(job, error))
+
+
+    def _chunk_done(self, job, first_replicate, counters):
+        """Store the counters of a chunk, called by the pool when the chunk completes"""
+        with self.lock:
+            self.in_flight -= 1
+            if job.state == 'running':
+                job.counters[first_replicate] = counters
+                if job.completed == job.chunks:
+                    self._finish(job, 'done')
+            self._dispatch()
+
+
+    def _chunk_failed(self, job, error):
+        """Fail the scenario of a chunk that raised an exception"""
+        with self.lock:
+            self.in_flight -= 1
+            if job.state == 'running':
+                job.pending.clear()
+                if job in self.queue:
+                    self.queue.remove(job)
+                self._finish(job, 'failed', error=f'{type(error).__name__}: {error}')
+            self._dispatch()
+
+
+# HTTP API
+
+def _json_safe(value):
+    """Replace NaN and infinity, which JSON does not allow, by None"""
+    if isinstance(value, dict):
+        return {key: _json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(item) for item in value]
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """ HTTP API of the simulation service
+
+        GET     /environments                   Names of the environments
+        GET     /status                         Workers, queued and running chunks, and scenarios by state
+        POST    /scenarios[?wait=seconds]       Submit a scenario, the body is a JSON object of scenario parameters
+        GET     /scenarios/<id>[?wait=seconds]  State of a scenario, with its results once done
+        DELETE  /scenarios/<id>                 Cancel a scenario
+
+    Responses are JSON objects. With wait, the response is sent when the scenario is done or
+    the seconds have passed, whichever is first.
+    """
+
+    # Set by serve
+    service = None
+
+    def _send(self, status, body):
+        """Send a JSON response"""
+        data = json.dumps(_json_safe(body)).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+    def _route(self):
+        """Path parts of the request and the seconds to wait
+
+        Raises:
+            ValueError: The seconds to wait are not a number, or are negative
+        """
+        url = urlparse(self.path)
+        wait = parse_qs(url.query).get('wait')
+        if wait:
+            try:
+                wait = float(wait[0])
+            except ValueError:
+                raise ValueError(f'wait must be a number of seconds, not {wait[0]}') from None
+            if not (math.isfinite(wait) and wait >= 0):
+                raise ValueError('wait must be a number of seconds, at least zero')
+        return [part for part in url.path.split('/') if part], wait
+
+
+    def _parse_route(self):
+        """Path parts and seconds to wait of the request, None when a bad request response was sent"""
+        try:
+            return self._route()
+        except ValueError as error:
+            self._send(400, {'error': str(error)})
+            return None
+
+
+    def do_GET(self):
+        """Environments, service status or the state of a scenario"""
+        route = self._parse_route()
+        if route is None:
+            return
+
+        parts, wait = route
+        if parts == ['environments']:
+            self._send(200, {'environments': list(self.service.config.microenvironments)})
+        elif parts == ['status']:
+            self._send(200, self.service.info())
+        elif len(parts) == 2 and parts[0] == 'scenarios' and parts[1] in self.service.jobs:
+            self._send(200, self.service.status(parts[1], wait=wait))
+        else:
+            self._send(404, {'error': f'{self.path} not found'})
+
+
+    def do_POST(self):
+        """Submit a scenario"""
+        route = self._parse_route()
+        if route is None:
+            return
+
+        parts, wait = route
+        if parts != ['scenarios']:
+            self._send(404, {'error': f'{self.path} not found'})
+            return
+
+        try:
+            parameters = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            if not isinstance(parameters, dict):
+                raise ValueError('the scenario parameters must be a JSON object')
+            job_id, memoised = self.service.submit(parameters)
+        except ValueError as error:
+            self._send(400, {'error': str(error)})
+            return
+
+        job = self.service.status(job_id, wait=wait)
+        job['memoised'] = memoised
+        self._send(200 if job['state'] == 'done' else 202, job)
+
+
+    def do_DELETE(self):
+        """Cancel a scenario"""
+        route = self._parse_route()
+        if route is None:
+            return
+
+        parts, _ = route
+        if len(parts) == 2 and parts[0] == 'scenarios' and parts[1] in self.service.jobs:
+            self._send(200, self.service.cancel(parts[1]))
+        else:
+            self._send(404, {'error': f'{self.path} not found'})
+
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Requests are not logged to the console"""
+
+
+def serve(service, host='127.0.0.1', port=8765):
+    """Create an HTTP server for the service, each request is handled in its own thread
+
+    Arguments:
+        service {SimulationService} -- Service running the scenarios
+
+    Keyword Arguments:
+        host {string} -- Address to listen on, only this machine by default (default: {'127.0.0.1'})
+        port {int} -- Port to listen on, 0 for any free port (default: {8765})
+
+    Returns:
+        ThreadingHTTPServer -- Server, run with serve_forever and stopped with shutdown
+    """
+    handler = type('BoundServiceRequestHandler', (ServiceRequestHandler,), {'service': service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def query_service(url='http://127.0.0.1:8765', wait=600, **parameters):
+    """Run a scenario on a running service and wait for its results, e.g. from a notebook
+
+    Arguments:
+        url {string} -- Address of the service (default: {'http://127.0.0.1:8765'})
+
+    Keyword Arguments:
+        wait {number} -- Seconds to wait for the results (default: {600})
+        parameters -- Scenario parameters, see SCENARIO_PARAMETERS
+
+    Returns:
+        dictionary -- State of the scenario, with its results once done
+    """
+    request = Request(f'{url}/scenarios?wait={wait}', data=json.dumps(parameters).encode(),
+                      headers={'Content-Type': 'application/json'}, method='POST')
+    with urlopen(request, timeout=wait + 10) as response:
+        return json.loads(response.read())
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Run a local simulation service with a persistent worker pool.')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on')
+    parser.add_argument('--workers', type=int, help='Number of worker processes (default: number of cores)')
+    parser.add_argument('--chunk-size', type=int, default=50, help='Replicates in each chunk')
+    parser.add_argument('--database', help='Path to the environment database workbook')
+    args = parser.parse_args(argv)
+
+    with SimulationService(workers=args.workers, database_path=args.database, chunk_size=args.chunk_size) as service:
+        server = serve(service, host=args.host, port=args.port)
+        print(f'Serving on http://{args.host}:{server.server_port}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    main()
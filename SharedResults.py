@@ -0,0 +1,280 @@
+""" Python library to model the spread of infectious diseases within a microenvironment """
+
+import os
+import math
+import time
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Import local libraries
+from Configuration import Config
+from Replicates import ReplicateResults, spawn_seeds
+from Simulation import Simulation
+
+
+# Counters written by each replicate, the attack rate is derived from them
+SHARED_COUNTERS = ('Infections', 'Total visitors')
+
+
+class SharedResults:
+    """ Results of a set of replicates held in a block of shared memory
+
+    The block holds two float arrays, the counters (replicates x counters) and the per-period
+    series (replicates x periods x series), e.g. the quanta concentration of each replicate. Worker
+    processes attach to the block by name and write each replicate into its own slice, so the
+    results are not pickled back to the parent, which reads them through NumPy views of the block
+    without a copy. Entries of replicates not yet run are NaN.
+
+    The process that creates the block owns it and unlinks it when closed. Views returned by
+    counter and series are only valid until the block is closed, copy them to keep the values.
+    """
+
+    def __init__(self, replicates, periods, counters=SHARED_COUNTERS, series=(), name=None):
+        """Create a block for the results, or attach to an existing block by name
+
+        Arguments:
+            replicates {int} -- Number of replicates
+            periods {int} -- Number of periods of each series
+
+        Keyword Arguments:
+            counters {list of strings} -- Names of the counters (default: {SHARED_COUNTERS})
+            series {list of strings} -- Names of the per-period series, report names (default: {()})
+            name {string} -- Name of the block to attach to, a new block is created when None (default: {None})
+        """
+        if replicates <= 0 or periods <= 0:
+            raise ValueError('replicates and periods must be greater than zero')
+
+        self.replicates = int(replicates)
+        self.periods = int(periods)
+        self.counter_names = list(counters)
+        self.series_names = list(series)
+
+        counter_shape = (self.replicates, len(self.counter_names))
+        series_shape = (self.replicates, self.periods, len(self.series_names))
+        counter_size = math.prod(counter_shape)
+        size = (counter_size + math.prod(series_shape)) * np.dtype(float).itemsize
+
+        self.owner = name is None
+        self.shared_memory = shared_memory.SharedMemory(name=name, create=self.owner, size=max(size, 1) if self.owner else 0)
+
+        block = np.ndarray(counter_size + math.prod(series_shape), dtype=float, buffer=self.shared_memory.buf)
+        self.counter_array = block[:counter_size].reshape(counter_shape)
+        self.series_array = block[counter_size:].reshape(series_shape)
+        if self.owner:
+            block.fill(np.nan)
+
+
+    @property
+    def layout(self):
+        """Arguments to attach to the block in another process, SharedResults(*layout)"""
+        return (self.replicates, self.periods, self.counter_names, self.series_names, self.shared_memory.name)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def close(self):
+        """Release the block, and unlink it if this process created it
+
+        Raises:
+            BufferError: Views of the block are still held
+        """
+        if self.shared_memory is None:
+            return
+
+        self.counter_array = None
+        self.series_array = None
+        self.shared_memory.close()
+        if self.owner:
+            self.shared_memory.unlink()
+        self.shared_memory = None
+
+
+    def counter(self, name):
+        """View of a counter
+
+        Arguments:
+            name {string} -- Name of the counter
+
+        Returns:
+            numpy array -- One value per replicate
+        """
+        return self.counter_array[:, self.counter_names.index(name)]
+
+
+    def series(self, name):
+        """View of a per-period series
+
+        Arguments:
+            name {string} -- Name of the series
+
+        Returns:
+            numpy array -- One row per replicate, one column per period
+        """
+        return self.series_array[:, :, self.series_names.index(name)]
+
+
+    def write_replicate(self, replicate, simulation):
+        """Write the counters and series of a replicate from a simulation that has just run
+
+        A series is the column of the periodic report of the same name, values are written at the
+        period they were reported, and periods not reported are left as NaN.
+
+        Arguments:
+            replicate {int} -- Replicate number
+            simulation {Simulation} -- Simulation at the end of the replicate
+        """
+        for column, name in enumerate(self.counter_names):
+            self.counter_array[replicate, column] = simulation.dc.get_counter(name) or 0
+
+        for column, name in enumerate(self.series_names):
+            report = simulation.dc.reports.get(name)
+            if report is None:
+                raise ValueError(f'{name} is not a report of the simulation, is it enabled?')
+
+            values = report.get_columns()
+            periods = values['time'].astype(int)
+            in_range = periods < self.periods
+            self.series_array[replicate, periods[in_range], column] = values[name][in_range]
+
+
+    @property
+    def completed(self):
+        """Mask of the replicates whose counters have been written"""
+        return ~np.isnan(self.counter_array).any(axis=1)
+
+
+    def results(self, simulation_name=None):
+        """Counters of the completed replicates
+
+        Keyword Arguments:
+            simulation_name {string} -- The name for the simulation (default: {None})
+
+        Returns:
+            ReplicateResults -- Counters for each replicate, and summary statistics
+        """
+        completed = self.completed
+        return ReplicateResults({name: self.counter(name)[completed] for name in self.counter_names},
+                                simulation_name=simulation_name)
+
+
+    def percentiles(self, name, q=(5, 50, 95)):
+        """Percentiles of a series across the replicates, period by period
+
+        Arguments:
+            name {string} -- Name of the series
+
+        Keyword Arguments:
+            q {list of numbers} -- Percentiles, between 0 and 100 (default: {(5, 50, 95)})
+
+        Returns:
+            pandas dataFrame -- One row per period, one column per percentile
+        """
+        import pandas as pd
+
+        values = np.nanpercentile(self.series(name), q, axis=0)
+        return pd.DataFrame(values.T, columns=list(q), index=pd.RangeIndex(self.periods, name='time'))
+
+
+# Worker processes attach to the results and build the simulation once, and share them between tasks
+_worker_results = None
+_worker_simulation = None
+
+def _initialise_worker(layout, database_path, simulation_arguments):
+    """Attach to the shared results and create the simulation in the worker process"""
+    global _worker_results, _worker_simulation
+    _worker_results = SharedResults(*layout)
+
+    report_settings = {'*': {'enabled': False}}
+    report_settings.update({name: {'enabled': True} for name in _worker_results.series_names})
+    _worker_simulation = Simulation(config=Config.load(database_path), report_settings=report_settings,
+                                    periods=_worker_results.periods, **simulation_arguments)
+
+
+def _run_chunk(task):
+    """Run a chunk of replicates, writing each into its slice of the shared results
+
+    Arguments:
+        task {(int, list of numpy SeedSequence, dictionary)} -- First replicate, seed of each replicate and run parameters
+
+    Returns:
+        int -- Number of replicates run
+    """
+    first_replicate, seeds, run_parameters = task
+
+    def write_replicate(simulation_run, simulation):
+        _worker_results.write_replicate(first_replicate + simulation_run, simulation)
+
+    _worker_simulation.run_replicates(len(seeds), seed=seeds, on_replicate=write_replicate, **run_parameters)
+    return len(seeds)
+
+
+def run_shared_replicates(microenvironment, replicates, seed=None, periods=180, series=None, workers=None, chunk_size=None,
+                          database_path=None, simulation_arguments=None, verbose=False, **run_parameters):
+    """Run replicates of a simulation in parallel, collecting the results in shared memory
+
+    The results are allocated in a block of shared memory before the workers start, and each
+    worker writes the counters and per-period series of its replicates straight into the block.
+    Replicate i has the i-th seed spawned from the seed, as in Simulation.run_replicates, so the
+    results are the same whatever the number of workers and chunk size.
+
+    The caller owns the returned results and must close them, e.g. in a with statement:
+
+        with run_shared_replicates('Office', 10000, seed=1) as results:
+            percentiles = results.percentiles('Quanta concentration Office')
+
+    Arguments:
+        microenvironment {string} -- Name of the microenvironment to simulate
+        replicates {int} -- Number of replicates
+
+    Keyword Arguments:
+        seed {int or numpy SeedSequence} -- Seed for the set of replicates (default: {None})
+        periods {int} -- Number of periods each simulation will run (default: {180})
+        series {list of strings} -- Periodic reports to collect (default: {the quanta concentration of the microenvironment})
+        workers {int} -- Number of worker processes (default: {number of cores})
+        chunk_size {int} -- Number of replicates in each task (default: {spread evenly over the workers})
+        database_path {string} -- Path to the environment database workbook (default: {None})
+        simulation_arguments {dictionary} -- Further keyword arguments of Simulation, e.g. exposure_mode (default: {None})
+        verbose {bool} -- Print progress to the console (default: {False})
+        run_parameters -- Keyword arguments passed to run_replicates, e.g. quanta_emission_rate
+
+    Returns:
+        SharedResults -- Counters and series of every replicate
+    """
+    series = list(series) if series is not None else [f'Quanta concentration {microenvironment}']
+    simulation_arguments = dict(simulation_arguments or {}, simulation_name=microenvironment, microenvironment=microenvironment)
+    workers = workers if workers else os.cpu_count()
+
+    if not chunk_size:
+        # Several tasks per worker keep all the cores busy while the last tasks complete
+        chunk_size = min(max(1, math.ceil(replicates / (workers * 4))), replicates)
+
+    seeds = spawn_seeds(seed, replicates)
+    tasks = [(first_replicate, seeds[first_replicate:first_replicate + chunk_size], run_parameters)
+             for first_replicate in range(0, replicates, chunk_size)]
+
+    results = SharedResults(replicates, periods, series=series)
+    try:
+        t_start = time.time()
+        completed = 0
+        with multiprocessing.Pool(workers, initializer=_initialise_worker,
+                                  initargs=(results.layout, database_path, simulation_arguments)) as pool:
+            for count in pool.imap_unordered(_run_chunk, tasks):
+                completed += count
+                if verbose:
+                    print(f"\r{completed}/{replicates} replicates, {time.time() - t_start:.1f} seconds", end='')
+
+        if verbose:
+            print()
+    except BaseException:
+        results.close()
+        raise
+
+    return results
@@ -2,19 +2,39 @@
 
 import simpy
 import math
+import numpy as np
 import time
+import random
 
 # Import local libraries
 from HealthDES.Check import Check
 from HealthDES.DataCollection import DataCollection
+from HealthDES.Instrumentation import Instrumentation
+from HealthDES.RandomStreams import RandomStreams
 from HealthDES.Routing import Routing
-from HealthDES.Check import Check, CheckList
+from HealthDES.Check import Check, CheckList, validation_boundary
 
 from Microenvironment import Microenvironment
-from Person import Person
-from DiseaseProgression import DiseaseProgression
+from Building import Building
+from Person import Person, DEFAULT_QUANTA_EMISSION_RATE
+from Population import Population
+from DiseaseProgression import DiseaseState
 from Activity import Visitor_activity
+from Checkpoint import Checkpoint
 from Configuration import Config
+from Replicates import ReplicateResults, replicate_streams, python_seed
+
+# Batch runs only read counters, so reports are not collected unless requested
+BATCH_REPORT_SETTINGS = {'*': {'enabled': False}}
+
+# Ways of updating quanta and sampling infection, see Simulation
+EXPOSURE_MODES = ['tick', 'event']
+
+# Arrival processes, people arrive at fixed intervals or as a Poisson process
+ARRIVAL_PROCESSES = ['periodic', 'poisson']
+
+# Warm starts computed by the simulation, see Simulation.warm_start_state
+WARM_STARTS = ['steady state']
 
 # TODO: from collections import namedtuple as data_structure [consider how we can use named tuples
 #       within the simulation where there are multiple return values.]
@@ -32,17 +52,63 @@ class Simulation:
         * Starting and stopping the model
      """
 
-    # TODO: Move simulation_run to run() method call, and implement a reset simulation.
-    def __init__(self, simulation_name=None, simulation_run=None, microenvironment=None, periods=None):
+    def __init__(self, simulation_name=None, simulation_run=None, microenvironment=None, periods=None, config=None, seed=None,
+                 report_settings=None, zones=None, airflow=None, exposure_mode='tick', disease_transitions=None, instrument=False,
+                 arrival_process='periodic', common_random_numbers=False, warm_start=None, memory_budget=None, spill_path=None):
         """Initialise the simulation.
 
         Keyword Arguments:
             simulation_name {string} -- The name for this simulation (default: {None})
             simulation_run {string} -- The sequence number for this run of the simulation (default: {None})
+            microenvironment {string} -- Name of the microenvironment to simulate (default: {None})
+            periods {number} -- Number of periods the simulation will run (default: {180})
+            config {Config} -- Already loaded configuration, shared between simulations (default: {None})
+            seed {int or numpy SeedSequence} -- Seed for the random number generator (default: {None})
+            report_settings {dictionary} -- Report name to enablement, decimation and sampling settings,
+                                            see HealthDES.DataCollection.ReportSettings (default: {None})
+            zones {list of strings} -- Microenvironments that are zones of a building simulated together, the
+                                       infected person visits the microenvironment, or the first zone when
+                                       no microenvironment is given (default: {None})
+            airflow {dictionary or numpy array} -- Airflow between the zones in m^3 per hour, see Building (default: {None})
+            exposure_mode {string} -- 'tick' to update quanta and sample infection every period, 'event' to update
+                                      them on arrivals and departures and sample infection from the exact
+                                      exposure over each visit (default: {'tick'})
+            disease_transitions {DiseaseTransitions} -- Latent and infectious periods, scheduled for each person
+                                                        exposed or infected, no transitions when None (default: {None})
+            instrument {bool or Instrumentation} -- Count and time the events of the simulation, see
+                                                    HealthDES.Instrumentation (default: {False})
+            arrival_process {string} -- 'periodic' for arrivals at fixed intervals, 'poisson' for exponential
+                                        intervals with the same mean (default: {'periodic'})
+            common_random_numbers {bool} -- Draw infection thresholds and arrival intervals from per-person
+                                            streams of the seed, so that scenarios run with the same seed share
+                                            them, see HealthDES.RandomStreams (default: {False})
+            warm_start {string, Checkpoint or dictionary} -- 'steady state' to start the simulated microenvironments at
+                                                             the steady state of the infected person's quanta and of
+                                                             the occupancy, a Checkpoint to start them at the quanta
+                                                             and occupancy of a saved state, or a dictionary of
+                                                             microenvironment name to {'quanta': ..., 'occupancy': ...,
+                                                             'infected': ...}, see warm_start_state and start_warm
+                                                             (default: {None, empty})
+            memory_budget {number} -- Bytes of report rows held in memory, beyond which the largest reports are
+                                      spilled to disk, see HealthDES.DataCollection. A simulation whose reports
+                                      have spilled cannot be checkpointed (default: {None, no limit})
+            spill_path {string} -- SQLite file reports are spilled to (default: {None, a temporary file})
         """
+        self.simulation_name = simulation_name
+        self.report_settings = report_settings
+        self.seed = seed
+        self.memory_budget = memory_budget
+        self.spill_path = spill_path
+
         # Create a simpy environment
         self.env = simpy.Environment()
-        self.dc = DataCollection(self.env, simulation_name, simulation_run)
+        self.dc = self.create_data_collection(simulation_run, seed, report_settings)
+        self.rng = random.Random(self._python_seed(seed))
+
+        # Optional instrumentation of the simpy event loop
+        self.instrumentation = (instrument if isinstance(instrument, Instrumentation) else Instrumentation()) if instrument else None
+        if self.instrumentation:
+            self.instrumentation.attach(self.env)
 
         # Set the time interval relative to one hour (minutes = 1/60)
         self.time_interval = 1/60
@@ -51,24 +117,106 @@ class Simulation:
         # Name of microenvironment to use
         self.microenvironment_name = microenvironment
 
+        # Building mode, the zones share air and are simulated together
+        self.zones = list(zones) if zones else None
+        self.airflow = airflow
+        self.building = None
+        if self.zones and not self.microenvironment_name:
+            self.microenvironment_name = self.zones[0]
+
+        with validation_boundary():
+            CheckList.fail_if_not_in_list(exposure_mode, EXPOSURE_MODES)
+            CheckList.fail_if_not_in_list(arrival_process, ARRIVAL_PROCESSES)
+        if self.zones and exposure_mode == 'event':
+            raise ValueError('event driven exposure is not available for a building')
+        self.exposure_mode = exposure_mode
+        self.arrival_process = arrival_process
+
+        # Quanta and occupancy of the microenvironments at the start of each run
+        if isinstance(warm_start, str):
+            with validation_boundary():
+                CheckList.fail_if_not_in_list(warm_start, WARM_STARTS)
+        self.warm_start = warm_start.warm_start_state() if isinstance(warm_start, Checkpoint) else warm_start
+
+        # Per-person random streams shared by scenarios run with the same seed
+        self.common_random_numbers = common_random_numbers
+        self.streams = RandomStreams(seed) if common_random_numbers else None
+
         # Routing of people through the model, nodes are decisions, edges are activities
         self.routing = Routing()  
 
-        # Import configuration information
-        self.config = Config()
-        self.config.import_microenvironments()    
+        # Import configuration information, the parsed database is cached across simulations
+        self.config = config if config else Config.load()
 
         self.simulation_params = {  'simpy_env':self.env,
                                     'data_collector':self.dc,
                                     'configuration':self.config,
                                     'routing':self.routing,
+                                    'random_generator':self.rng,
+                                    'random_streams':self.streams,
                                     'time_interval':self.time_interval,
+                                    'exposure_mode':self.exposure_mode,
+                                    'disease_transitions':disease_transitions,
                                     'simulation_length': self.periods }
 
 
         # Variables in this scope only
         self.microenvironments = {}
-        self.population = {}
+        self.population = Population()
+        self.simulation_params['population'] = self.population
+
+        # Parameters the simulation was last started with, kept in checkpoints
+        self.run_parameters = None
+
+
+    @staticmethod
+    def _python_seed(seed):
+        """Seed for the standard library random generator, numpy seed sequences are converted to integers"""
+        return python_seed(seed) if isinstance(seed, np.random.SeedSequence) else seed
+
+
+    def create_data_collection(self, simulation_run, seed, report_settings):
+        """Create the data collection, report sampling uses its own random number generator"""
+        seed = self._python_seed(seed)
+        sampling_seed = None if seed is None else f'{seed} report sampling'
+
+        return DataCollection(self.env, self.simulation_name, simulation_run, memory_budget=self.memory_budget,
+                              spill_path=self.spill_path, report_settings=report_settings, sampling_seed=sampling_seed)
+
+
+    def reset(self, simulation_run=None, seed=None, report_settings=None, random_streams=None):
+        """Reset the simulation so that it can be run again.
+
+        The configuration and routing graph are kept, the simpy environment, data collection,
+        random number generator, random streams and microenvironments are replaced.
+
+        Keyword Arguments:
+            simulation_run {string} -- The sequence number for the next run of the simulation (default: {None})
+            seed {int or numpy SeedSequence} -- Seed for the random number generator (default: {None})
+            report_settings {dictionary} -- Report settings, those of the simulation when None (default: {None})
+            random_streams {RandomStreams} -- Random streams, from the seed with common random numbers when None (default: {None})
+        """
+        report_settings = report_settings if report_settings is not None else self.report_settings
+        if random_streams is None and self.common_random_numbers:
+            random_streams = RandomStreams(seed)
+        self.streams = random_streams
+        self.seed = seed
+
+        self.env = simpy.Environment()
+        self.dc = self.create_data_collection(simulation_run, seed, report_settings)
+        self.rng = random.Random(self._python_seed(seed))
+        if self.instrumentation:
+            self.instrumentation.attach(self.env)
+
+        self.microenvironments = {}
+        self.population = Population()
+
+        self.simulation_params.update({ 'simpy_env':self.env,
+                                        'data_collector':self.dc,
+                                        'random_generator':self.rng,
+                                        'random_streams':self.streams,
+                                        'population':self.population })
+        self.building = None
 
 
     def get_list_of_reports(self):
@@ -92,6 +240,16 @@ class Simulation:
         """
         return self.dc.get_results(data_set_name)
 
+    def get_instrumentation_summary(self):
+        """Return the events and function calls counted and timed by the instrumentation.
+
+        Returns:
+            pandas dataFrame -- Summary table, see HealthDES.Instrumentation.Instrumentation.summary
+        """
+        if not self.instrumentation:
+            raise ValueError('the simulation is not instrumented, create it with instrument=True')
+        return self.instrumentation.summary()
+
     def get_counter(self, data_set_name):
         """Return stored value of a counter
 
@@ -104,12 +262,23 @@ class Simulation:
         return self.dc.get_counter(data_set_name)
 
 
-    def create_microenvironments(self):
-        """Create the microenvironments used within the simulation."""
+    def create_microenvironments(self, names=None):
+        """Create the microenvironments used within the simulation.
+
+        Keyword Arguments:
+            names {list of strings} -- Names of the microenvironments to create, all when None (default: {None})
+        """
 
         CheckList.fail_if_dict_empty(self.config.microenvironments)
-        
+
+        if self.zones:
+            self.create_building()
+            return
+
         for name, microenv in self.config.microenvironments.items():
+            if names is not None and name not in names:
+                continue
+
             # name = microenv.get('environment')
             volume = microenv.get('volume') # m^3
             air_exchange_rate = microenv.get('air-exchange-rate')  # h^-1: natural ventilation (0.2) mechanical ventilation (2.2)  
@@ -119,13 +288,24 @@ class Simulation:
             self.microenvironments[name] = Microenvironment(self.simulation_params, name, volume, air_exchange_rate, capacity=capacity)
 
 
-    def create_activities(self, microenvironment_name):
+    def create_building(self):
+        """Create the zones of the building as microenvironments sharing air."""
+        for name in self.zones:
+            CheckList.fail_if_not_in_list(name, list(self.config.microenvironments))
+        CheckList.fail_if_not_in_list(self.microenvironment_name, self.zones)
+
+        zones = {name: self.config.microenvironments[name] for name in self.zones}
+        self.building = Building(self.simulation_params, zones, airflow=self.airflow)
+
+        self.microenvironments.update(self.building.zones)
+
+
+    def create_activities(self, microenvironment_name, activity_name='visit environment'):
         """Create a dictionary of activities."""
 
         duration = self.config.microenvironments.get(microenvironment_name).get('average-length-of-stay')
         duration = duration / self.time_interval # Convert hours to time measures
 
-        activity_name = 'visit environment'
         activity_class, arguments = Visitor_activity.pack_parameters(self.microenvironments[microenvironment_name], duration)
 
         self.routing.register_activity(activity_name, activity_class, arguments)
@@ -137,6 +317,9 @@ class Simulation:
 
         From 'start' to 'end' via 'visit environment
         """
+        if self.routing.has_decision('start'):
+            return 'start'
+
         routing_entry_point = self.routing.add_decision('start')
         self.routing.add_decision('end')
 
@@ -145,19 +328,40 @@ class Simulation:
         return routing_entry_point
 
 
-    def create_people(self, arrivals_per_hour, max_arrivals=None, quanta_emission_rate=None, inhalation_rate=None):
-        """ Create a method of generating people """
+    def create_building_routing(self):
+        """Create the network routing for a building.
+
+        From 'start <zone>' to 'end' via 'visit <zone>' for each zone
+        """
+        if not self.routing.has_decision('end'):
+            self.routing.add_decision('end')
+
+        for name in self.zones:
+            if not self.routing.has_decision(f'start {name}'):
+                self.routing.add_decision(f'start {name}')
+                self.routing.add_activity(f'visit {name}', f'start {name}', 'end')
+
+
+    def create_people(self, arrivals_per_hour, max_arrivals=None, quanta_emission_rate=None, inhalation_rate=None, starting_node_id='start', index_case=True, generated_people=0):
+        """ Create a method of generating people
 
-        is_someone_infected = False
-        generated_people = 0
+        The first person generated is infected when index_case is True, all others are susceptible.
+        People arrive at fixed intervals, or as a Poisson process, see arrival_process. Arrivals
+        restored from a checkpoint continue from the number of people already generated.
+        """
+        time_between_people = 60 / arrivals_per_hour
+        arrival_stream = f'arrivals {starting_node_id}'
+
+        is_someone_infected = not index_case or generated_people > 0
 
-        while True:        
-            infection_status_label = DiseaseProgression.valid_state('susceptible') if is_someone_infected else DiseaseProgression.valid_state('infected')
+        # If we have generated enough people then stop
+        while not (max_arrivals and generated_people >= max_arrivals):
+            infection_status_label = DiseaseState.SUSCEPTIBLE if is_someone_infected else DiseaseState.INFECTED
             is_someone_infected = True
 
             generated_people += 1
             person = Person(self.simulation_params,
-                            starting_node_id='start',
+                            starting_node_id=starting_node_id,
                             person_type='visitor',
                             infection_status_label=infection_status_label,
                             quanta_emission_rate=quanta_emission_rate,
@@ -167,29 +371,220 @@ class Simulation:
             # self.create_routing(person, duration=duration)
             self.env.process(person.run())
 
-            time_to_next_person = 60 / arrivals_per_hour
+            time_to_next_person = time_between_people
+            if self.arrival_process == 'poisson':
+                if self.streams is None:
+                    time_to_next_person *= self.rng.expovariate(1)
+                else:
+                    time_to_next_person *= self.streams.exponential(arrival_stream, generated_people - 1)
             yield self.env.timeout(time_to_next_person)
 
-            # If we have generated enough people then stop
-            if max_arrivals and (generated_people >= max_arrivals): break
-
 
-    def run(self, arrivals_per_hour=None, quanta_emission_rate=None, inhalation_rate=None, max_arrivals=None, report_time=None):
+    def run(self, arrivals_per_hour=None, quanta_emission_rate=None, inhalation_rate=None, max_arrivals=None, report_time=None,
+            until=None, checkpoint_every=None, checkpoint_path=None):
         """ Run the simulation 
 
         Keyword arguments:
         periods             Number of periods to run the simulation
         report_time         When True the simulation prints the time taken to execute the simulation to console.
+        until               Simulation time to run to, the simulation may be checkpointed there and resumed (default: periods)
+        checkpoint_every    Periods between checkpoints written to the checkpoint path (default: no checkpoints)
+        checkpoint_path     File the latest checkpoint is written to, see Checkpoint
+
+        Parameters are checked as the simulation is set up, see HealthDES.Check.set_validation_level.
         """
-      
+        with validation_boundary():
+            self.check_run_parameters(arrivals_per_hour, quanta_emission_rate, inhalation_rate, max_arrivals)
+
+            # Start the microenvironments
+            self.create_microenvironments()
+            self.start(arrivals_per_hour, quanta_emission_rate, inhalation_rate, max_arrivals)
+
+        self.resume(until=until, report_time=report_time, checkpoint_every=checkpoint_every, checkpoint_path=checkpoint_path)
+
+
+    def resume(self, until=None, report_time=None, checkpoint_every=None, checkpoint_path=None):
+        """ Run the simulation on from the current simulation time, e.g. after it is restored from a checkpoint
+
+        People still in a microenvironment have their exposure sampled when the simulation reaches
+        the end of its periods.
+
+        Keyword arguments:
+        until               Simulation time to run to (default: periods)
+        report_time         When True the simulation prints the time taken to execute the simulation to console.
+        checkpoint_every    Periods between checkpoints written to the checkpoint path (default: no checkpoints)
+        checkpoint_path     File the latest checkpoint is written to, replacing the one before
+        """
+        until = self.periods if until is None else until
+        Check.is_greater_than_or_equal_to_zero(until)
+        if checkpoint_every is not None:
+            Check.is_greater_than_zero(checkpoint_every)
+            if checkpoint_path is None:
+                raise ValueError('checkpoints require a checkpoint path')
+
+        # Run the model
+        t_start = time.time()        
+        if report_time:         
+            print(f"Running the model for {until - self.env.now} periods")
+
+        while self.env.now < until:
+            stop = until
+            if checkpoint_every is not None:
+                stop = min(until, (math.floor(self.env.now / checkpoint_every) + 1) * checkpoint_every)
+
+            self.env.run(until=stop)
+
+            if checkpoint_every is not None and stop < until:
+                self.checkpoint(checkpoint_path)
+
+        if self.env.now >= self.periods:
+            self.close_exposures()
+
+            if self.instrumentation:
+                self.instrumentation.detach()
+                self.instrumentation.write_reports(self.dc)
+
+        if report_time:
+            t_end = time.time()
+            t_duration = t_end - t_start
+            print(f"Simulation finished. Execution time:{t_duration:.3f} seconds")
+
+
+    def checkpoint(self, path=None):
+        """Snapshot the state of the simulation at the current simulation time.
+
+        The simulation must be between runs, e.g. after run(until=...), see Checkpoint.
+
+        Keyword Arguments:
+            path {string} -- File to write the checkpoint to (default: {None, not written})
+
+        Returns:
+            Checkpoint -- Snapshot of the simulation
+        """
+        checkpoint = Checkpoint.capture(self)
+        if path is not None:
+            checkpoint.save(path)
+        return checkpoint
+
+
+    @classmethod
+    def restore(cls, checkpoint, config=None):
+        """Create a simulation from a checkpoint, ready to be resumed.
+
+        Each simulation restored from the same checkpoint is independent, so what-if branches can be
+        changed and run on from a shared warm-up, e.g. with a different microenvironment air
+        exchange rate.
+
+        Arguments:
+            checkpoint {Checkpoint or string} -- Checkpoint, or file a checkpoint was written to
+
+        Keyword Arguments:
+            config {Config} -- Already loaded configuration, shared between simulations (default: {None})
+
+        Returns:
+            Simulation -- Simulation at the time of the checkpoint, see resume
+        """
+        checkpoint = checkpoint if isinstance(checkpoint, Checkpoint) else Checkpoint.load(checkpoint)
+
+        simulation = cls(config=config, **checkpoint.simulation_arguments)
+        checkpoint.restore(simulation)
+        return simulation
+
+
+    def run_replicates(self, replicates, seed=None, arrivals_per_hour=None, quanta_emission_rate=None, inhalation_rate=None, max_arrivals=None,
+                       sampling='independent', common_random_numbers=None, on_replicate=None):
+        """Run independent replicates of the simulation and collect the counters from each.
+
+        The configuration and routing graph are built once, and the simulation is reset between
+        replicates. Only the simulated microenvironment is created in each replicate, and unless
+        the simulation was built with report settings no reports are collected. Each replicate
+        has its own random number generator seeded from a numpy SeedSequence spawned from the seed,
+        so the results are reproducible.
+
+        Antithetic and stratified sampling draw the infection thresholds and arrival intervals from
+        per-person random streams, see Replicates.replicate_streams.
+
+        Aggregate reports, see HealthDES.DataCollection, are merged across the replicates.
+
+        Arguments:
+            replicates {int} -- Number of replicates to run
+
+        Keyword Arguments:
+            seed {int, numpy SeedSequence or list} -- Seed for the set of replicates, or one per replicate (default: {None})
+            arrivals_per_hour {number} -- Rate at which people arrive (default: {from configuration})
+            quanta_emission_rate {number} -- Quanta emitted by an infected person per hour (default: {None})
+            inhalation_rate {number} -- Inhalation rate of susceptible people (default: {None})
+            max_arrivals {number} -- Maximum number of people to arrive (default: {from configuration})
+            sampling {string} -- 'independent', 'antithetic' or 'stratified' (default: {'independent'})
+            common_random_numbers {bool} -- Use per-person random streams, also when the simulation was created without (default: {None})
+            on_replicate {function} -- Called with the replicate number and the simulation at the end of each
+                                       replicate, e.g. to collect its reports (default: {None})
+
+        Returns:
+            ReplicateResults -- Counters for each replicate, and summary statistics
+        """
+        with validation_boundary():
+            self.check_run_parameters(arrivals_per_hour, quanta_emission_rate, inhalation_rate, max_arrivals)
+
+        common_random_numbers = self.common_random_numbers if common_random_numbers is None else common_random_numbers
+        seeds, streams = replicate_streams(seed, replicates, sampling, common_random_numbers)
+
+        report_settings = self.report_settings if self.report_settings is not None else BATCH_REPORT_SETTINGS
+
+        counter_names = ('Infections', 'Total visitors')
+        counters = {name: np.zeros(replicates) for name in counter_names}
+        aggregates = {}
+
+        for simulation_run, (replicate_seed, random_streams) in enumerate(zip(seeds, streams)):
+            self.reset(simulation_run=simulation_run, seed=replicate_seed, report_settings=report_settings, random_streams=random_streams)
+            with validation_boundary():
+                self.create_microenvironments(names=None if self.zones else [self.microenvironment_name])
+                self.start(arrivals_per_hour, quanta_emission_rate, inhalation_rate, max_arrivals)
+            self.env.run(until=self.periods)
+            self.close_exposures()
+
+            for name in counter_names:
+                counters[name][simulation_run] = self.dc.get_counter(name) or 0
+            for name, report in self.dc.get_aggregates().items():
+                aggregates[name] = aggregates[name].merge(report) if name in aggregates else report
+
+            if on_replicate:
+                on_replicate(simulation_run, self)
+
+        if self.instrumentation:
+            self.instrumentation.detach()
+
+        return ReplicateResults(counters, simulation_name=self.simulation_name, sampling=sampling, aggregates=aggregates)
+
+
+    def close_exposures(self):
+        """Sample infection for people still in a microenvironment at the end of an event driven run."""
+        for microenvironment in self.microenvironments.values():
+            for person in list(microenvironment.open_exposures):
+                person.expose_person_to_dose(microenvironment.close_exposure(person))
+
+
+    @staticmethod
+    def check_run_parameters(arrivals_per_hour, quanta_emission_rate, inhalation_rate, max_arrivals):
+        """Check the parameters passed when running the simulation"""
         if arrivals_per_hour: Check.is_greater_than_or_equal_to_zero(arrivals_per_hour)
         if quanta_emission_rate: Check.is_greater_than_or_equal_to_zero(quanta_emission_rate)
         if inhalation_rate: Check.is_greater_than_or_equal_to_zero(inhalation_rate)
         if max_arrivals: Check.is_greater_than_or_equal_to_zero(max_arrivals)
 
-        # Start the microenvironments
-        self.create_microenvironments()
-        
+
+    def start(self, arrivals_per_hour=None, quanta_emission_rate=None, inhalation_rate=None, max_arrivals=None):
+        """Start the processes for the simulated microenvironment and people generation.
+
+        The microenvironments must already have been created.
+        """
+        self.run_parameters = {'arrivals_per_hour': arrivals_per_hour, 'quanta_emission_rate': quanta_emission_rate,
+                               'inhalation_rate': inhalation_rate, 'max_arrivals': max_arrivals}
+
+        if self.building:
+            self.start_building(arrivals_per_hour, quanta_emission_rate, inhalation_rate, max_arrivals)
+            return
+
         # Comment out running all
         #for key in self.microenvironments:
         #    self.env.process(self.microenvironments[key].run())
@@ -209,24 +604,176 @@ class Simulation:
         # Create activities
         self.create_activities(self.microenvironment_name)
 
-        # Create the network routing graph
+        # Create the network routing graph, compiled into transition tables before the run
         self.create_network_routing()
+        self.routing.compile()
+
+        infected_present = self.start_warm(arrivals_per_hour, quanta_emission_rate, inhalation_rate, max_arrivals) if self.warm_start else []
 
         # Start people generation process
         self.env.process(self.create_people(arrivals_per_hour, 
                                             max_arrivals=max_arrivals, 
                                             quanta_emission_rate=quanta_emission_rate, 
-                                            inhalation_rate=inhalation_rate))
+                                            inhalation_rate=inhalation_rate,
+                                            index_case=self.microenvironment_name not in infected_present))
 
-        # Run the model
-        t_start = time.time()        
-        if report_time:         
-            print(f"Running the model for {self.periods} periods")
-        
-        self.env.run(until=self.periods)
 
-        if report_time:
-            t_end = time.time()
-            t_duration = t_end - t_start
-            print(f"Simulation finished. Execution time:{t_duration:.3f} seconds")
-    
+    def start_building(self, arrivals_per_hour=None, quanta_emission_rate=None, inhalation_rate=None, max_arrivals=None):
+        """Start the building and people generation for every zone.
+
+        A single process advances the quanta in all zones. People arrive at each zone at the
+        rate given in the configuration, the arrivals per hour and maximum arrivals, when given,
+        apply to the microenvironment visited by the infected person.
+        """
+        self.env.process(self.building.run())
+
+        self.create_building_routing()
+        for name in self.zones:
+            self.create_activities(name, activity_name=f'visit {name}')
+        self.routing.compile()
+
+        infected_present = self.start_warm(arrivals_per_hour, quanta_emission_rate, inhalation_rate, max_arrivals) if self.warm_start else []
+
+        for name in self.zones:
+            zone_arrivals_per_hour, zone_max_arrivals = self.microenvironment_arrivals(name, arrivals_per_hour, max_arrivals)
+
+            if zone_arrivals_per_hour:
+                self.env.process(self.create_people(zone_arrivals_per_hour,
+                                                    max_arrivals=zone_max_arrivals,
+                                                    quanta_emission_rate=quanta_emission_rate,
+                                                    inhalation_rate=inhalation_rate,
+                                                    starting_node_id=f'start {name}',
+                                                    index_case=name == self.microenvironment_name and name not in infected_present))
+
+
+    def microenvironment_arrivals(self, name, arrivals_per_hour=None, max_arrivals=None):
+        """Arrivals per hour and maximum arrivals of a simulated microenvironment, or zone of the building.
+
+        The arrivals per hour and maximum arrivals, when given, apply to the microenvironment visited by
+        the infected person, the other zones take theirs from the configuration.
+
+        Returns:
+            (number, number) -- Arrivals per hour and maximum arrivals, infinite when there is no maximum
+        """
+        microenv = self.config.microenvironments.get(name)
+        is_index_zone = name == self.microenvironment_name
+
+        zone_arrivals_per_hour = arrivals_per_hour if is_index_zone and arrivals_per_hour is not None else microenv.get('visitor-arrival-rate')
+        zone_max_arrivals = max_arrivals if is_index_zone and max_arrivals else microenv.get('max-arrivals', 0)
+        zone_max_arrivals = zone_max_arrivals if zone_max_arrivals > 0 else simpy.core.Infinity
+
+        return zone_arrivals_per_hour, zone_max_arrivals
+
+
+    def warm_start_state(self, arrivals_per_hour=None, quanta_emission_rate=None, max_arrivals=None):
+        """Analytic steady state quanta and occupancy of the simulated microenvironments.
+
+        The infected person is taken to have been present long enough for the quanta to stop changing,
+        see Microenvironment.steady_state_quanta and Building.steady_state_quanta, and stays for the
+        whole run, see start_warm, so the quanta remain at the steady state. The occupancy is the mean
+        number of susceptible visitors present, the arrival rate times the length of stay (Little's law),
+        up to the capacity left by the infected person. A microenvironment with a maximum number of
+        arrivals has a fixed group of visitors, who all arrive during the run, so has no occupancy.
+
+        The microenvironments must already have been created.
+
+        Keyword Arguments:
+            arrivals_per_hour {number} -- Rate at which people arrive (default: {from configuration})
+            quanta_emission_rate {number} -- Quanta emitted by the infected person per hour (default: {DEFAULT_QUANTA_EMISSION_RATE})
+            max_arrivals {number} -- Maximum number of people to arrive (default: {from configuration})
+
+        Returns:
+            dictionary -- Microenvironment name to {'quanta': quanta, 'occupancy': mean number of people present,
+                          'infected': number of infected people present}
+        """
+        quanta_emission_rate = quanta_emission_rate if quanta_emission_rate else DEFAULT_QUANTA_EMISSION_RATE
+
+        if self.building:
+            emission_rates = np.zeros(len(self.building.zone_names))
+            emission_rates[self.building.zone_index[self.microenvironment_name]] = quanta_emission_rate
+            quanta = dict(zip(self.building.zone_names, self.building.steady_state_quanta(emission_rates)))
+        else:
+            microenvironment = self.microenvironments[self.microenvironment_name]
+            quanta = {self.microenvironment_name: microenvironment.steady_state_quanta(quanta_emission_rate)}
+
+        state = {}
+        for name in quanta:
+            zone_arrivals_per_hour, zone_max_arrivals = self.microenvironment_arrivals(name, arrivals_per_hour, max_arrivals)
+
+            infected = 1 if name == self.microenvironment_name else 0
+
+            occupancy = 0.0
+            if zone_max_arrivals == simpy.core.Infinity:
+                occupancy = zone_arrivals_per_hour * self.config.microenvironments.get(name).get('average-length-of-stay')
+                occupancy = min(occupancy, self.microenvironments[name].capacity - infected)
+
+            state[name] = {'quanta': float(quanta[name]), 'occupancy': occupancy, 'infected': infected}
+
+        return state
+
+
+    def start_warm(self, arrivals_per_hour=None, quanta_emission_rate=None, inhalation_rate=None, max_arrivals=None):
+        """Start the simulated microenvironments with the quanta and the people present of the warm start.
+
+        Infected people present stay for the whole run and take the place of the infected person who
+        would otherwise be the first to arrive, so the quanta of a steady state warm start remain at
+        the steady state. The occupancy is of susceptible visitors part way through their visit,
+        whose remaining stays are spread evenly over the length of stay. Both enter at time zero,
+        ahead of the people who arrive, and count as visitors. With event driven exposure, where
+        infection is sampled from the exposure over the whole visit, the part of the visit already
+        passed is taken to have been at the quanta of the warm start. Microenvironments of the warm
+        start that are not in the simulation are ignored.
+
+        Returns:
+            list of strings -- Simulated microenvironments with infected people present, where no infected person arrives
+        """
+        state = self.warm_start
+        if state == 'steady state':
+            state = self.warm_start_state(arrivals_per_hour, quanta_emission_rate, max_arrivals)
+
+        simulated = self.zones if self.zones else [self.microenvironment_name]
+        infected_present = []
+
+        for name, microenvironment_state in state.items():
+            microenvironment = self.microenvironments.get(name)
+            if microenvironment is None:
+                continue
+
+            Check.is_greater_than_or_equal_to_zero(microenvironment_state['quanta'])
+            microenvironment.quanta_in_microenvironment = microenvironment_state['quanta']
+
+            if name not in simulated:
+                continue
+
+            Check.is_greater_than_or_equal_to_zero(microenvironment_state['occupancy'])
+            infected = microenvironment_state.get('infected', 0)
+            Check.is_greater_than_or_equal_to_zero(infected)
+            starting_node_id = f'start {name}' if self.building else 'start'
+
+            for _ in range(infected):
+                person = Person(self.simulation_params,
+                                starting_node_id=starting_node_id,
+                                person_type='visitor',
+                                infection_status_label=DiseaseState.INFECTED,
+                                quanta_emission_rate=quanta_emission_rate,
+                                inhalation_rate=inhalation_rate)
+                self.env.process(person.run(first_duration=self.periods - self.env.now))
+            if infected:
+                infected_present.append(name)
+
+            people = round(min(microenvironment_state['occupancy'], microenvironment.capacity - infected))
+            duration = self.config.microenvironments.get(name).get('average-length-of-stay') / self.time_interval
+
+            for person_number in range(people):
+                remaining_stay = duration * (person_number + 0.5) / people
+                person = Person(self.simulation_params,
+                                starting_node_id=starting_node_id,
+                                person_type='visitor',
+                                infection_status_label=DiseaseState.SUSCEPTIBLE,
+                                inhalation_rate=inhalation_rate)
+                if self.exposure_mode == 'event':
+                    microenvironment.prior_exposures[person] = (microenvironment.get_quanta_concentration()
+                                                                * (duration - remaining_stay) * self.time_interval)
+                self.env.process(person.run(first_duration=remaining_stay))
+
+        return infected_present
@@ -0,0 +1,292 @@
+""" Python library to model the spread of infectious diseases within a microenvironment """
+
+import os
+import csv
+import math
+import time
+import argparse
+import itertools
+import multiprocessing
+
+# Import local libraries
+from Configuration import Config
+from Replicates import ReplicateResults, run_sequential_replicates, spawn_seeds
+from ResultCache import ResultCache
+from Simulation import Simulation
+from VectorisedSimulation import VectorisedSimulation
+
+
+ENGINES = {'des': Simulation, 'vectorised': VectorisedSimulation}
+
+# Columns written to the results file, one row per replicate
+RESULT_COLUMNS = ['environment', 'quanta_emission_rate', 'inhalation_rate', 'replicate', 'Infections', 'Total visitors', 'Attack rate']
+
+
+class SweepTask:
+    """ A chunk of consecutive replicates of one scenario in the sweep
+
+    With a target half-width the task is every replicate of the scenario, run in batches until the
+    confidence interval of the attack rate is narrow enough, see run_sequential_replicates.
+    """
+
+    def __init__(self, environment, quanta_emission_rate, inhalation_rate, first_replicate, seeds, periods, engine,
+                 target_half_width=None, max_replicates=None, min_replicates=None, batch_size=None):
+        """Define the chunk of replicates
+
+        Arguments:
+            environment {string} -- Name of the microenvironment
+            quanta_emission_rate {number} -- Quanta emitted by an infected person per hour
+            inhalation_rate {number} -- Inhalation rate of susceptible people
+            first_replicate {int} -- Replicate number of the first replicate in the chunk
+            seeds {list of numpy SeedSequence or SeedSequence} -- Seed for each replicate in the chunk, or
+                                                                  of the scenario with a target half-width
+            periods {int} -- Number of periods each simulation will run
+            engine {string} -- Simulation engine, a key of ENGINES
+
+        Keyword Arguments:
+            target_half_width {number} -- Target half-width of the confidence interval of the attack rate (default: {None})
+            max_replicates {int} -- Cap on the replicates with a target half-width (default: {None})
+            min_replicates {int} -- Minimum replicates with a target half-width (default: {None})
+            batch_size {int} -- Replicates in each batch with a target half-width (default: {None})
+        """
+        self.environment = environment
+        self.quanta_emission_rate = quanta_emission_rate
+        self.inhalation_rate = inhalation_rate
+        self.first_replicate = first_replicate
+        self.seeds = seeds
+        self.periods = periods
+        self.engine = engine
+        self.target_half_width = target_half_width
+        self.max_replicates = max_replicates
+        self.min_replicates = min_replicates
+        self.batch_size = batch_size
+
+
+def create_tasks(environments, quanta_emission_rates, inhalation_rates, replicates, seed=None, chunk_size=None, periods=180, engine='des',
+                 target_half_width=None, min_replicates=100, batch_size=100):
+    """Split the grid of scenarios and replicates into tasks
+
+    Every scenario (environment, emission rate, inhalation rate) has its own seed sequence spawned
+    from the seed, and every replicate its own seed sequence spawned from the scenario's. The
+    results are therefore reproducible and independent of the chunk size and number of workers.
+
+    With a target half-width each scenario is one task, running replicates until the confidence
+    interval of the attack rate is narrow enough or the number of replicates reaches the cap.
+
+    Arguments:
+        environments {list of strings} -- Names of the microenvironments
+        quanta_emission_rates {list of numbers} -- Quanta emission rates
+        inhalation_rates {list of numbers} -- Inhalation rates
+        replicates {int} -- Number of replicates of each scenario, the cap with a target half-width
+
+    Keyword Arguments:
+        seed {int} -- Seed for the sweep (default: {None})
+        chunk_size {int} -- Number of replicates in each task (default: {replicates})
+        periods {int} -- Number of periods each simulation will run (default: {180})
+        engine {string} -- Simulation engine, 'des' or 'vectorised' (default: {'des'})
+        target_half_width {number} -- Target half-width of the confidence interval of the attack rate (default: {None})
+        min_replicates {int} -- Minimum replicates of each scenario with a target half-width (default: {100})
+        batch_size {int} -- Replicates in each batch with a target half-width (default: {100})
+
+    Returns:
+        list of SweepTask -- Tasks covering the sweep
+    """
+    if engine not in ENGINES:
+        raise ValueError(f'engine must be one of {list(ENGINES)}')
+
+    chunk_size = chunk_size if chunk_size else replicates
+    scenarios = list(itertools.product(environments, quanta_emission_rates, inhalation_rates))
+
+    tasks = []
+    for scenario_seed, (environment, quanta_emission_rate, inhalation_rate) in zip(spawn_seeds(seed, len(scenarios)), scenarios):
+        if target_half_width:
+            tasks.append(SweepTask(environment, quanta_emission_rate, inhalation_rate, 0, scenario_seed, periods, engine,
+                                   target_half_width=target_half_width, max_replicates=replicates,
+                                   min_replicates=min(min_replicates, replicates), batch_size=batch_size))
+            continue
+
+        replicate_seeds = spawn_seeds(scenario_seed, replicates)
+        for first_replicate in range(0, replicates, chunk_size):
+            tasks.append(SweepTask(environment, quanta_emission_rate, inhalation_rate, first_replicate,
+                                   replicate_seeds[first_replicate:first_replicate + chunk_size], periods, engine))
+
+    return tasks
+
+
+# Worker processes load the configuration, and open the result cache, once and share them between tasks
+_worker_config = None
+_worker_cache = None
+
+def _initialise_worker(database_path, cache_path=None):
+    """Load the configuration, and open the result cache, in the worker process"""
+    global _worker_config, _worker_cache
+    _worker_config = Config.load(database_path)
+    _worker_cache = ResultCache(cache_path) if cache_path else None
+
+
+def run_task(task):
+    """Run the replicates in a task
+
+    Arguments:
+        task {SweepTask} -- Chunk of replicates to run
+
+    Returns:
+        list of lists -- Rows of results with columns RESULT_COLUMNS
+    """
+    config = _worker_config if _worker_config else Config.load()
+
+    simulation = ENGINES[task.engine](task.environment, microenvironment=task.environment, periods=task.periods, config=config)
+    if task.target_half_width:
+        results = run_sequential_replicates(simulation, task.target_half_width, max_replicates=task.max_replicates,
+                                            min_replicates=task.min_replicates, batch_size=task.batch_size, seed=task.seeds,
+                                            quanta_emission_rate=task.quanta_emission_rate,
+                                            inhalation_rate=task.inhalation_rate)
+    elif _worker_cache:
+        results = _worker_cache.run_replicates(simulation, len(task.seeds), seed=task.seeds,
+                                               quanta_emission_rate=task.quanta_emission_rate,
+                                               inhalation_rate=task.inhalation_rate)
+    else:
+        results = simulation.run_replicates(len(task.seeds), seed=task.seeds,
+                                            quanta_emission_rate=task.quanta_emission_rate,
+                                            inhalation_rate=task.inhalation_rate)
+
+    counters = results.counters
+    return [[task.environment, task.quanta_emission_rate, task.inhalation_rate, task.first_replicate + replicate,
+             int(counters['Infections'][replicate]), int(counters['Total visitors'][replicate]), counters['Attack rate'][replicate]]
+            for replicate in range(results.replicates)]
+
+
+def run_sweep(output_path, environments=None, quanta_emission_rates=(147,), inhalation_rates=(0.54,), replicates=1000,
+              seed=None, chunk_size=None, periods=180, engine='des', workers=None, database_path=None, verbose=False,
+              target_half_width=None, min_replicates=100, batch_size=100, cache_path=None):
+    """Run a sweep over a grid of scenarios in parallel and stream the results to a CSV file
+
+    Tasks are distributed to a pool of worker processes, one per core by default, and the results
+    of each task are appended to the output file as soon as it completes. Rows are therefore not
+    in replicate order, the replicate column identifies each row.
+
+    With a target half-width, each scenario runs replicates in batches until the confidence
+    interval of its attack rate is narrow enough, so replicates go to the scenarios that need them.
+
+    With a result cache, the counters of each chunk of a fixed number of replicates are cached,
+    so rerunning a sweep with the same seed only runs the scenarios that changed.
+
+    Arguments:
+        output_path {string} -- CSV file to write the results to
+
+    Keyword Arguments:
+        environments {list of strings} -- Names of the microenvironments (default: {all in the configuration})
+        quanta_emission_rates {list of numbers} -- Quanta emission rates (default: {(147,)})
+        inhalation_rates {list of numbers} -- Inhalation rates (default: {(0.54,)})
+        replicates {int} -- Number of replicates of each scenario, the cap with a target half-width (default: {1000})
+        seed {int} -- Seed for the sweep (default: {None})
+        chunk_size {int} -- Number of replicates in each task (default: {spread evenly over the workers})
+        periods {int} -- Number of periods each simulation will run (default: {180})
+        engine {string} -- Simulation engine, 'des' or 'vectorised' (default: {'des'})
+        workers {int} -- Number of worker processes (default: {number of cores})
+        database_path {string} -- Path to the environment database workbook (default: {None})
+        verbose {bool} -- Print progress to the console (default: {False})
+        target_half_width {number} -- Target half-width of the confidence interval of the attack rate (default: {None})
+        min_replicates {int} -- Minimum replicates of each scenario with a target half-width (default: {100})
+        batch_size {int} -- Replicates in each batch with a target half-width (default: {100})
+        cache_path {string} -- Directory of the result cache, see ResultCache (default: {None, not cached})
+
+    Returns:
+        string -- Path to the results file
+    """
+    config = Config.load(database_path)
+    environments = list(environments) if environments else list(config.microenvironments)
+    workers = workers if workers else os.cpu_count()
+
+    if not chunk_size:
+        # Several tasks per worker keep all the cores busy while the last tasks complete
+        scenarios = len(environments) * len(quanta_emission_rates) * len(inhalation_rates)
+        chunk_size = max(1, math.ceil(scenarios * replicates / (workers * 4)))
+        chunk_size = min(chunk_size, replicates)
+
+    tasks = create_tasks(environments, quanta_emission_rates, inhalation_rates, replicates,
+                         seed=seed, chunk_size=chunk_size, periods=periods, engine=engine,
+                         target_half_width=target_half_width, min_replicates=min_replicates, batch_size=batch_size)
+    total = sum(task.max_replicates if task.target_half_width else len(task.seeds) for task in tasks)
+
+    t_start = time.time()
+    completed = 0
+    with open(output_path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(RESULT_COLUMNS)
+
+        with multiprocessing.Pool(workers, initializer=_initialise_worker, initargs=(database_path, cache_path)) as pool:
+            for rows in pool.imap_unordered(run_task, tasks):
+                writer.writerows(rows)
+                file.flush()
+
+                completed += len(rows)
+                if verbose:
+                    print(f"\r{completed}/{total} replicates, {time.time() - t_start:.1f} seconds", end='')
+
+    if verbose:
+        print()
+
+    return output_path
+
+
+def summarise_sweep(output_path):
+    """Summarise the results of a sweep by scenario
+
+    Arguments:
+        output_path {string} -- CSV file written by run_sweep
+
+    Returns:
+        pandas dataFrame -- Batch notebook summary columns and the number of replicates, one row per scenario
+    """
+    import pandas as pd
+
+    df = pd.read_csv(output_path)
+    scenario = ['environment', 'quanta_emission_rate', 'inhalation_rate']
+
+    summaries = {}
+    for key, rows in df.groupby(scenario, sort=False):
+        rows = rows.sort_values('replicate')
+        summaries[key] = ReplicateResults({'Infections': rows['Infections'].values,
+                                           'Total visitors': rows['Total visitors'].values}).aggregate()
+        summaries[key]['replicates'] = len(rows)
+
+    summary = pd.DataFrame.from_dict(summaries, orient='index')
+    summary.index.names = scenario
+    return summary
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Run a parallel sweep of microenvironment simulations.')
+    parser.add_argument('output', help='CSV file to write the results to')
+    parser.add_argument('--environments', nargs='+', help='Microenvironments to simulate (default: all)')
+    parser.add_argument('--emission-rates', nargs='+', type=float, default=[147], help='Quanta emission rates')
+    parser.add_argument('--inhalation-rates', nargs='+', type=float, default=[0.54], help='Inhalation rates')
+    parser.add_argument('--replicates', type=int, default=1000, help='Replicates of each scenario, the cap with --target-half-width')
+    parser.add_argument('--periods', type=int, default=180, help='Periods each simulation will run')
+    parser.add_argument('--seed', type=int, help='Seed for the sweep')
+    parser.add_argument('--chunk-size', type=int, help='Replicates in each task')
+    parser.add_argument('--workers', type=int, help='Number of worker processes (default: number of cores)')
+    parser.add_argument('--engine', choices=list(ENGINES), default='des', help='Simulation engine')
+    parser.add_argument('--database', help='Path to the environment database workbook')
+    parser.add_argument('--target-half-width', type=float, help='Run replicates until the confidence interval of the attack rate is this narrow')
+    parser.add_argument('--min-replicates', type=int, default=100, help='Minimum replicates of each scenario with --target-half-width')
+    parser.add_argument('--batch-size', type=int, default=100, help='Replicates in each batch with --target-half-width')
+    parser.add_argument('--summary', help='CSV file to write the summary of each scenario to')
+    parser.add_argument('--cache', help='Directory of the result cache, with --seed rerun scenarios are read from it')
+    args = parser.parse_args(argv)
+
+    run_sweep(args.output, environments=args.environments, quanta_emission_rates=args.emission_rates,
+              inhalation_rates=args.inhalation_rates, replicates=args.replicates, seed=args.seed,
+              chunk_size=args.chunk_size, periods=args.periods, engine=args.engine, workers=args.workers,
+              database_path=args.database, verbose=True, target_half_width=args.target_half_width,
+              min_replicates=args.min_replicates, batch_size=args.batch_size, cache_path=args.cache)
+
+    if args.summary:
+        summarise_sweep(args.output).to_csv(args.summary)
+
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    main()
@@ -0,0 +1,338 @@
+""" Python library to model the spread of infectious diseases within a microenvironment """
+
+import math
+import time
+
+import numpy as np
+
+# Import local libraries
+from HealthDES.Check import Check, CheckList, validation_boundary
+
+from Configuration import Config
+from Replicates import ReplicateResults, replicate_streams, spawn_seeds
+
+
+def arrival_times(arrivals_per_hour, periods, max_arrivals=None):
+    """Times at which people arrive at the microenvironment (in periods of one minute)
+
+    Arrival times are accumulated by repeated addition, as the simpy timeouts are, so that the
+    times match those of the discrete event simulation exactly.
+
+    Arguments:
+        arrivals_per_hour {number} -- Rate at which people arrive
+        periods {number} -- Length of the simulation
+
+    Keyword Arguments:
+        max_arrivals {number} -- Maximum number of people to arrive (default: {None})
+
+    Returns:
+        numpy array -- Arrival times
+    """
+    time_to_next_person = 60 / arrivals_per_hour
+    arrivals = int(math.ceil(periods / time_to_next_person)) + 1
+    if max_arrivals and max_arrivals < arrivals:
+        arrivals = int(max_arrivals)
+
+    times = np.zeros(arrivals)
+    np.cumsum(np.full(arrivals - 1, time_to_next_person), out=times[1:])
+
+    return times[times < periods]
+
+
+def entry_times(arrivals, duration, capacity=None):
+    """Times at which people enter a microenvironment with a first come first served capacity limit
+
+    Every person stays for the same duration, so person i uses the place released by person i - capacity
+    and enters at max(arrival_i, entry_(i-capacity) + duration). With periodic arrivals the recurrence
+    has the closed form max(arrival_i, arrival_(i mod capacity) + (i // capacity) * duration).
+
+    Arguments:
+        arrivals {numpy array} -- Arrival times, equally spaced and in order of arrival
+        duration {number} -- Time each person spends in the microenvironment
+
+    Keyword Arguments:
+        capacity {number} -- Maximum number of people in the microenvironment (default: {None})
+
+    Returns:
+        numpy array -- Entry times
+    """
+    if not capacity or capacity >= len(arrivals):
+        return arrivals.copy()
+
+    capacity = int(capacity)
+    index = np.arange(len(arrivals))
+    return np.maximum(arrivals, arrivals[index % capacity] + (index // capacity) * duration)
+
+
+def quanta_time_series(emission_starts, emission_periods, quanta_per_period, decay_per_period, periods):
+    """Quanta in a well-mixed microenvironment at the end of each period
+
+    Solves the recurrence q[t] = decay * q[t-1] + emissions[t] in closed form. Each infector emits a
+    constant amount of quanta in each of a run of consecutive periods, the response to one run is a
+    truncated geometric series.
+
+    Arguments:
+        emission_starts {numpy array} -- First period in which each infector emits
+        emission_periods {numpy array} -- Number of periods in which each infector emits
+        quanta_per_period {numpy array} -- Quanta emitted by each infector per period
+        decay_per_period {number} -- Fraction of quanta remaining after one period
+        periods {integer} -- Number of periods
+
+    Returns:
+        numpy array -- Quanta in the microenvironment after the updates of each period
+    """
+    t = np.arange(periods)[:, np.newaxis]
+    first = np.asarray(emission_starts)[np.newaxis, :]
+    last = first + np.asarray(emission_periods)[np.newaxis, :] - 1
+
+    emitting = np.minimum(t, last) - first + 1
+    decaying = np.maximum(t - last, 0)
+    response = (1 - decay_per_period ** np.maximum(emitting, 0)) / (1 - decay_per_period) * decay_per_period ** decaying
+
+    return (response * np.asarray(quanta_per_period)[np.newaxis, :]).sum(axis=1)
+
+
+class VectorisedSimulation:
+    """ NumPy implementation of the simulation of a single, well-mixed microenvironment
+
+    The discrete event simulation steps the quanta in the microenvironment minute by minute through
+    one simpy process for the microenvironment and one for each person. For a single microenvironment,
+    where the first person to arrive is infected and everybody else is susceptible, the same model
+    can be solved directly:
+        * Arrival and entry times follow from the arrival rate, length of stay and capacity.
+        * The quanta time series is the closed form solution of the first-order decay and emission recurrence.
+        * Each susceptible person's dose is the sum of the concentrations at each minute they are
+          present, and infection is drawn for every susceptible person in one batched call.
+
+    The timing conventions match the discrete event simulation: a person present for a duration of
+    D periods is active in floor(D) + 1 periods, and reads the concentration after the update for
+    the period in which they are active. Counters and the quanta concentration report are returned
+    with the same names as those of the discrete event simulation.
+    """
+
+    def __init__(self, simulation_name=None, simulation_run=None, microenvironment=None, periods=None, config=None, seed=None):
+        """Initialise the simulation.
+
+        Keyword Arguments:
+            simulation_name {string} -- The name for this simulation (default: {None})
+            simulation_run {string} -- The sequence number for this run of the simulation (default: {None})
+            microenvironment {string} -- Name of the microenvironment to simulate (default: {None})
+            periods {number} -- Number of periods the simulation will run (default: {180})
+            config {Config} -- Already loaded configuration, shared between simulations (default: {None})
+            seed {int or numpy SeedSequence} -- Seed for the random number generator (default: {None})
+        """
+        self.simulation_name = simulation_name
+        self.simulation_run = simulation_run
+
+        # Set the time interval relative to one hour (minutes = 1/60)
+        self.time_interval = 1/60
+        # Number of periods the simulation will run
+        self.periods = periods if periods else 180
+        # Name of microenvironment to use
+        self.microenvironment_name = microenvironment
+
+        self.config = config if config else Config.load()
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+
+        self.counters = {}
+        self.reports = {}
+
+
+    def get_list_of_reports(self):
+        """Get the list of reports.
+
+        Returns:
+            list of strings -- List of reports.
+        """
+        return list(self.reports)
+
+
+    def get_results(self, data_set_name):
+        """Return stored report as a pandas dataFrame.
+
+        Arguments:
+            data_set_name {string} -- Name of the dataset to get
+
+        Returns:
+            pandas dataFrame -- dataFrame containing the results
+        """
+        return self.reports.get(data_set_name, None)
+
+
+    def get_counter(self, data_set_name):
+        """Return stored value of a counter
+
+        Arguments:
+            data_set_name {string} -- Name of the counter to get
+
+        Returns:
+            number -- value of the counter
+        """
+        return self.counters.get(data_set_name, None)
+
+
+    def run(self, arrivals_per_hour=None, quanta_emission_rate=None, inhalation_rate=None, max_arrivals=None, report_time=None):
+        """ Run the simulation
+
+        Keyword arguments:
+        arrivals_per_hour       Rate at which people arrive (default: visitor-arrival-rate from the configuration)
+        quanta_emission_rate    Quanta emitted by the infected person per hour (default: 147)
+        inhalation_rate         Inhalation rate of susceptible people in m^3 per hour (default: 0.54)
+        max_arrivals            Maximum number of people to arrive (default: max-arrivals from the configuration)
+        report_time             When True the simulation prints the time taken to execute the simulation to console.
+        """
+        import pandas as pd
+
+        t_start = time.time()
+        if report_time:
+            print(f"Running the model for {self.periods} periods")
+
+        visitors, infection_risk, concentration = self.calculate_exposure(arrivals_per_hour, quanta_emission_rate, inhalation_rate, max_arrivals)
+        infections = int(np.count_nonzero(self.rng.random(len(infection_risk)) < infection_risk))
+
+        self.counters = {'Total visitors': visitors}
+        if infections:
+            self.counters['Infections'] = infections
+
+        # Periodic reporting samples the concentration before the updates of each period
+        data_set_name = f'Quanta concentration {self.microenvironment_name}'
+        self.reports = {data_set_name: pd.DataFrame({'simulation_name': self.simulation_name,
+                                                     'simulation_run': self.simulation_run,
+                                                     'time': np.arange(len(concentration)),
+                                                     data_set_name: np.concatenate(([0.0], concentration[:-1]))})}
+
+        if report_time:
+            t_end = time.time()
+            t_duration = t_end - t_start
+            print(f"Simulation finished. Execution time:{t_duration:.3f} seconds")
+
+
+    def run_replicates(self, replicates, seed=None, arrivals_per_hour=None, quanta_emission_rate=None, inhalation_rate=None, max_arrivals=None,
+                       sampling='independent', common_random_numbers=False):
+        """Run independent replicates of the simulation and collect the counters from each.
+
+        The concentration time series is the same in every replicate, so it is calculated once and
+        the infections for all replicates are drawn in one call.
+
+        With common random numbers, antithetic or stratified sampling, the uniform of each person
+        is drawn from the per-person infection stream, as the thresholds of the discrete event
+        simulation are, see Replicates.replicate_streams.
+
+        Arguments:
+            replicates {int} -- Number of replicates to run
+
+        Keyword Arguments:
+            seed {int, numpy SeedSequence or list} -- Seed for the set of replicates, or one per replicate (default: {None})
+            arrivals_per_hour {number} -- Rate at which people arrive (default: {from configuration})
+            quanta_emission_rate {number} -- Quanta emitted by an infected person per hour (default: {None})
+            inhalation_rate {number} -- Inhalation rate of susceptible people (default: {None})
+            max_arrivals {number} -- Maximum number of people to arrive (default: {from configuration})
+            sampling {string} -- 'independent', 'antithetic' or 'stratified' (default: {'independent'})
+            common_random_numbers {bool} -- Draw the uniforms from per-person random streams (default: {False})
+
+        Returns:
+            ReplicateResults -- Counters for each replicate, and summary statistics
+        """
+        visitors, infection_risk, _ = self.calculate_exposure(arrivals_per_hour, quanta_emission_rate, inhalation_rate, max_arrivals)
+
+        if sampling != 'independent' or common_random_numbers:
+            # The infected person is the first in the population, susceptible people follow
+            _, streams = replicate_streams(seed, replicates, sampling, common_random_numbers=True)
+            uniforms = np.array([random_streams.uniforms('infection', 1, len(infection_risk) + 1) for random_streams in streams])
+            uniforms = uniforms.reshape(replicates, len(infection_risk))
+        elif isinstance(seed, (list, tuple)):
+            # One seed per replicate, each replicate draws from its own generator
+            uniforms = np.array([np.random.default_rng(replicate_seed).random(len(infection_risk)) for replicate_seed in spawn_seeds(seed, replicates)])
+            uniforms = uniforms.reshape(replicates, len(infection_risk))
+        else:
+            uniforms = np.random.default_rng(seed).random((replicates, len(infection_risk)))
+
+        infections = np.count_nonzero(uniforms < infection_risk, axis=1)
+
+        return ReplicateResults({'Infections': infections, 'Total visitors': np.full(replicates, visitors)},
+                                simulation_name=self.simulation_name, sampling=sampling)
+
+
+    def calculate_exposure(self, arrivals_per_hour=None, quanta_emission_rate=None, inhalation_rate=None, max_arrivals=None):
+        """Calculate the deterministic part of the simulation
+
+        Returns:
+            (int, numpy array, numpy array) -- Number of visitors, infection risk of each susceptible visitor
+                                               and the concentration after the updates of each period
+        """
+        with validation_boundary():
+            if arrivals_per_hour: Check.is_greater_than_or_equal_to_zero(arrivals_per_hour)
+            if quanta_emission_rate: Check.is_greater_than_or_equal_to_zero(quanta_emission_rate)
+            if inhalation_rate: Check.is_greater_than_or_equal_to_zero(inhalation_rate)
+            if max_arrivals: Check.is_greater_than_or_equal_to_zero(max_arrivals)
+
+            CheckList.fail_if_dict_empty(self.config.microenvironments)
+            microenv = self.config.microenvironments.get(self.microenvironment_name)
+
+            volume = microenv.get('volume')
+            air_exchange_rate = microenv.get('air-exchange-rate')
+            Check.is_greater_than_zero(volume)
+            Check.is_greater_than_zero(air_exchange_rate)
+
+        quanta_emission_rate = quanta_emission_rate if quanta_emission_rate else 147
+        inhalation_rate = inhalation_rate if inhalation_rate else 0.54  # m^3 h^-1
+
+        capacity = microenv.get('visitor-capacity')
+        capacity = None if capacity == 0 else capacity
+
+        if arrivals_per_hour == None:
+            arrivals_per_hour = microenv.get('visitor-arrival-rate')
+        if not max_arrivals:
+            max_arrivals = microenv.get('max-arrivals', 0)
+
+        duration = microenv.get('average-length-of-stay') / self.time_interval
+
+        # Everyone, infected or susceptible, is active in the same number of periods
+        periods = int(math.ceil(self.periods))
+        active_periods = int(math.floor(duration)) + 1
+
+        entries = entry_times(arrival_times(arrivals_per_hour, self.periods, max_arrivals), duration, capacity)
+        entries = entries[entries < self.periods]
+        first_period = np.floor(entries).astype(np.int64)
+        last_period = np.minimum(first_period + active_periods, periods) - 1
+
+        # The first person to arrive is infected, and enters an empty microenvironment
+        quanta = quanta_time_series(first_period[:1],
+                                    last_period[:1] - first_period[:1] + 1,
+                                    [quanta_emission_rate * self.time_interval],
+                                    math.exp(-air_exchange_rate * self.time_interval),
+                                    periods)
+        concentration = quanta / volume
+
+        # Dose for each susceptible person, and infections drawn in one call
+        cumulative_concentration = np.concatenate(([0.0], np.cumsum(concentration)))
+        exposure = cumulative_concentration[last_period[1:] + 1] - cumulative_concentration[first_period[1:]]
+        infection_risk = -np.expm1(-inhalation_rate * self.time_interval * exposure)
+
+        return len(entries), infection_risk, concentration
+
+
+
+# Run as script to compare the vectorised engine with the discrete event simulation
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    from Simulation import Simulation
+
+    periods = 180
+    replicates = 200
+    microenvironment = 'Restaurant-natural-No Lockdown'
+
+    config = Config.load()
+    for engine in (Simulation, VectorisedSimulation):
+        infections = []
+        t_start = time.time()
+        for simulation_run in range(replicates):
+            simulation = engine(microenvironment, simulation_run, microenvironment=microenvironment, periods=periods, config=config)
+            simulation.run(quanta_emission_rate=147, inhalation_rate=0.54)
+            infections.append(simulation.get_counter('Infections') or 0)
+
+        t_duration = time.time() - t_start
+        print(f"{engine.__name__}: infections mean {np.mean(infections):.3f}, sd {np.std(infections, ddof=1):.3f}, "
+              f"visitors {simulation.get_counter('Total visitors')}, {t_duration / replicates * 1000:.3f} ms per run")
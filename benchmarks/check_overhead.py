@@ -0,0 +1,65 @@
+""" Benchmark of the overhead of parameter checks at each validation level
+
+Run from the root of the repository:
+
+    python benchmarks/check_overhead.py
+
+Reports the time per call of a check made every period for every infected person, and the time
+to run a set of replicates of a simulation, at each validation level.
+"""
+
+import os
+import sys
+import time
+import timeit
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from HealthDES.Check import Check, VALIDATION_LEVELS, set_validation_level, get_validation_level
+from Simulation import Simulation
+
+
+def time_check(level, number=1000000):
+    """Time per call, in nanoseconds, of Check.is_greater_than_or_equal_to_zero for a float and a NumPy float"""
+    set_validation_level(level)
+    namespace = {'Check': Check, 'value': 147 / 60, 'numpy_value': np.float64(147 / 60)}
+    return (timeit.timeit('Check.is_greater_than_or_equal_to_zero(value)', globals=namespace, number=number) / number * 1e9,
+            timeit.timeit('Check.is_greater_than_or_equal_to_zero(numpy_value)', globals=namespace, number=number) / number * 1e9)
+
+
+def time_simulation(level, microenvironment, replicates, repeats=3):
+    """Shortest time, in seconds, to run the replicates of a simulation"""
+    set_validation_level(level)
+    times = []
+    for _ in range(repeats):
+        simulation = Simulation(microenvironment, microenvironment=microenvironment)
+        t_start = time.perf_counter()
+        simulation.run_replicates(replicates, seed=2020)
+        times.append(time.perf_counter() - t_start)
+    return min(times)
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Benchmark the overhead of parameter checks.')
+    parser.add_argument('--microenvironment', default='Pharmacy-natural-No Lockdown', help='Microenvironment to simulate')
+    parser.add_argument('--replicates', type=int, default=50, help='Replicates of the simulation')
+    args = parser.parse_args(argv)
+
+    initial_level = get_validation_level()
+    try:
+        print(f"{'level':<10}{'float check':>14}{'numpy check':>14}{'simulation':>14}")
+        for level in VALIDATION_LEVELS:
+            float_ns, numpy_ns = time_check(level)
+            seconds = time_simulation(level, args.microenvironment, args.replicates)
+            print(f"{level:<10}{float_ns:>12.0f}ns{numpy_ns:>12.0f}ns{seconds:>13.3f}s")
+    finally:
+        set_validation_level(initial_level)
+
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    main()
@@ -0,0 +1,83 @@
+""" Check that a steady state warm start gives the statistics of a cold start once its transient has passed
+
+Run from the root of the repository:
+
+    python benchmarks/check_warm_start.py
+    python benchmarks/check_warm_start.py --microenvironment 'Bank-natural-No Lockdown' --exposure-mode event
+
+With a steady state warm start the infected person is present throughout, so it is compared with
+a cold start in which the infected person is also present throughout: an empty microenvironment
+with no quanta. The cold start is run past its transient, five times the time constant of the air
+exchange plus the length of stay, and the rate of infections per hour after the transient is
+compared with the rate over the whole of the warm start. The check fails, exit code 1, when the
+rates differ by more than the tolerance and more than three standard errors.
+"""
+
+import os
+import sys
+import math
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Configuration import Config
+from Simulation import Simulation
+
+REPORT_SETTINGS = {'*': {'enabled': False}, 'Infections': {'enabled': True}}
+
+
+def infection_rates(config, microenvironment, warm_start, periods, transient, replicates, seed, exposure_mode):
+    """Infections per hour after the transient in each replicate
+
+    Returns:
+        numpy array -- Infections per hour from the end of the transient to the end of the run, one per replicate
+    """
+    simulation = Simulation(microenvironment, microenvironment=microenvironment, periods=transient + periods, config=config,
+                            report_settings=REPORT_SETTINGS, exposure_mode=exposure_mode, warm_start=warm_start)
+    rates = np.zeros(replicates)
+
+    def count_infections(simulation_run, simulation):
+        infection_times = simulation.dc.reports['Infections'].get_columns()['time']
+        rates[simulation_run] = np.count_nonzero(infection_times >= transient) / (periods * simulation.time_interval)
+
+    simulation.run_replicates(replicates, seed=seed, on_replicate=count_infections)
+    return rates
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Check that warm and cold starts agree once the transient has passed.')
+    parser.add_argument('--microenvironment', default='Pharmacy-natural-No Lockdown', help='Microenvironment to simulate')
+    parser.add_argument('--exposure-mode', default='tick', choices=['tick', 'event'], help='Exposure mode of the simulation')
+    parser.add_argument('--periods', type=int, default=180, help='Periods compared, the whole of the warm start')
+    parser.add_argument('--replicates', type=int, default=100, help='Replicates of each start')
+    parser.add_argument('--seed', type=int, default=2020, help='Seed of the replicates')
+    parser.add_argument('--tolerance', type=float, default=0.02, help='Relative difference in the rates that is accepted')
+    args = parser.parse_args(argv)
+
+    config = Config.load()
+    microenvironment = config.microenvironments[args.microenvironment]
+    hours = 5 / microenvironment.get('air-exchange-rate') + microenvironment.get('average-length-of-stay')
+    transient = math.ceil(hours * 60)
+
+    cold_start = {args.microenvironment: {'quanta': 0.0, 'occupancy': 0, 'infected': 1}}
+    seeds = np.random.SeedSequence(args.seed).spawn(2)
+    warm = infection_rates(config, args.microenvironment, 'steady state', args.periods, 0, args.replicates, seeds[0], args.exposure_mode)
+    cold = infection_rates(config, args.microenvironment, cold_start, args.periods, transient, args.replicates, seeds[1], args.exposure_mode)
+
+    difference = warm.mean() - cold.mean()
+    standard_error = math.sqrt(warm.var(ddof=1) / len(warm) + cold.var(ddof=1) / len(cold))
+    print(f"warm start {warm.mean():.3f}, cold start after {transient} periods {cold.mean():.3f} infections per hour, "
+          f"difference {difference:+.3f} (standard error {standard_error:.3f})")
+
+    if abs(difference) > max(args.tolerance * cold.mean(), 3 * standard_error):
+        print('Warm and cold starts do not agree')
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    sys.exit(main())
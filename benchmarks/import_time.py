@@ -0,0 +1,113 @@
+""" Benchmark of the import time of the simulation modules and the start up of worker processes
+
+Run from the root of the repository:
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --repeat 10 --workers 4
+
+Each import is timed in a new interpreter, so nothing is already imported, and the fastest of
+the repeats is kept. The heavy dependencies (pandas, networkx and openpyxl) are only imported
+when results are turned into dataFrames, the routing graph is drawn or the workbook is read. The
+eager times import them as well, as the modules did before, to show what they cost.
+
+Worker start up is the time for a pool of spawned worker processes to import the simulation,
+load the configuration and run one replicate each, as the parallel runners do.
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+import multiprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules of the core simulation path, which must not import the heavy dependencies
+CORE_MODULES = ['HealthDES.DataCollection', 'HealthDES.Routing', 'Microenvironment', 'Person', 'Activity', 'Simulation']
+
+HEAVY_MODULES = ['pandas', 'networkx', 'openpyxl']
+
+
+def time_import(statement, repeat):
+    """Fastest time, in seconds, of running a statement in a new interpreter, and the heavy modules it imported"""
+    script = (f'import sys, time; t = time.perf_counter(); {statement}; t = time.perf_counter() - t; '
+              f'print(t, *[name for name in {HEAVY_MODULES!r} if name in sys.modules])')
+    times = []
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True, check=True)
+        seconds, *heavy = completed.stdout.split()
+        times.append(float(seconds))
+    return min(times), heavy
+
+
+# Simulation created by each worker process
+_worker_simulation = None
+
+def _start_worker(database_path):
+    """Import the simulation and load the configuration in a worker, as the worker initialisers do"""
+    global _worker_simulation
+    sys.path.insert(0, ROOT)
+    from Configuration import Config
+    from Simulation import Simulation
+
+    name = next(iter(Config.load(database_path).microenvironments))
+    _worker_simulation = Simulation(name, microenvironment=name, config=Config.load(database_path))
+
+
+def _start_eager_worker(database_path):
+    """Import the heavy dependencies up front, then start the worker"""
+    import pandas, networkx, openpyxl  # pylint: disable=unused-import,import-outside-toplevel,multiple-imports
+    _start_worker(database_path)
+
+
+def _run_replicate(seed):
+    """Run one replicate in a worker"""
+    return float(_worker_simulation.run_replicates(1, seed=seed).counters['Infections'][0])
+
+
+def time_worker_start(workers, eager, database_path=None):
+    """Time, in seconds, for a pool of spawned workers to start and each run one replicate"""
+    context = multiprocessing.get_context('spawn')
+    initializer = _start_eager_worker if eager else _start_worker
+
+    t_start = time.perf_counter()
+    with context.Pool(workers, initializer=initializer, initargs=(database_path,)) as pool:
+        pool.map(_run_replicate, range(workers), chunksize=1)
+    return time.perf_counter() - t_start
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Time the import of the simulation modules and worker start up.')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs of each measurement, the fastest is kept')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes to start')
+    parser.add_argument('--database', help='Path to the environment database workbook')
+    options = parser.parse_args(argv)
+
+    os.chdir(ROOT)
+    eager_imports = 'import ' + ', '.join(HEAVY_MODULES) + '; '
+
+    print(f"{'module':<26}{'lazy':>9}{'eager':>9}  heavy modules imported")
+    failures = []
+    for module in CORE_MODULES:
+        lazy, heavy = time_import(f'import {module}', options.repeat)
+        eager, _ = time_import(eager_imports + f'import {module}', options.repeat)
+        print(f"{module:<26}{lazy:>8.3f}s{eager:>8.3f}s  {', '.join(heavy) or '-'}")
+        if heavy:
+            failures.append(module)
+
+    times = {eager: min(time_worker_start(options.workers, eager, options.database) for _ in range(options.repeat))
+             for eager in (False, True)}
+    print(f"{options.workers} worker start up  {times[False]:>8.3f}s{times[True]:>8.3f}s  "
+          f"({1 - times[False] / times[True]:.0%} faster)")
+
+    if failures:
+        print('Heavy modules imported by: ' + ', '.join(failures))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    sys.exit(main())
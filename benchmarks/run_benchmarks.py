@@ -0,0 +1,295 @@
+""" Benchmark suite covering the simulation hot paths
+
+Run from the root of the repository:
+
+    python benchmarks/run_benchmarks.py                   # run and compare with the stored baseline
+    python benchmarks/run_benchmarks.py --save-baseline   # run and store the results as the baseline
+    python benchmarks/run_benchmarks.py --scenarios lounge stress-queue --repeat 3
+
+Every scenario has a fixed seed and runs in its own process, so that the peak resident set
+size (RSS) is that of the scenario alone. For each scenario the suite reports the wall time,
+the number of simpy events processed and events per second, the peak RSS and the time spent in
+each phase: importing the modules, loading the configuration, setting up the simulation, running
+it and extracting the results. A scenario whose wall time or peak RSS exceeds the baseline by more
+than the tolerance is reported as a regression, and the exit code is 1.
+
+Events are counted by wrapping simpy.Environment.step, which adds a little to the run time. The
+baseline is specific to the machine it was recorded on, record a new one with --save-baseline
+when changing machine.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+SEED = 2020
+
+
+class PhaseTimer:
+    """ Accumulates the wall time spent in each phase of a scenario """
+
+    def __init__(self):
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name):
+        """Time a phase, time spent in a phase of the same name is added together"""
+        t_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - t_start
+
+
+class EventCounter:
+    """ Counts the events processed by every simpy environment while active """
+
+    def __init__(self):
+        self.events = 0
+
+    def __enter__(self):
+        import simpy
+
+        self.environment_class = simpy.Environment
+        self.step = simpy.Environment.step
+        counter = self
+
+        def counting_step(env):
+            counter.events += 1
+            return counter.step(env)
+
+        simpy.Environment.step = counting_step
+        return self
+
+    def __exit__(self, *exc_info):
+        self.environment_class.step = self.step
+
+
+# Scenarios
+
+def run_simulation(timer, config, name, periods, simulation_run=1, **run_parameters):
+    """Set up, run and extract the results of one simulation, as Simulation.run does"""
+    from Simulation import Simulation
+
+    with timer.phase('setup'):
+        simulation = Simulation(name, simulation_run, microenvironment=name, periods=periods, config=config, seed=SEED)
+        simulation.create_microenvironments()
+        simulation.start(**run_parameters)
+
+    with timer.phase('run'):
+        simulation.env.run(until=simulation.periods)
+        simulation.close_exposures()
+
+    with timer.phase('results'):
+        for report in simulation.get_list_of_reports():
+            simulation.get_results(report)
+        infections = simulation.get_counter('Infections') or 0
+        visitors = simulation.get_counter('Total visitors') or 0
+
+    return {'infections': infections, 'visitors': visitors}
+
+
+def scenario_lounge(timer, config, options):
+    """The run.py case, a lounge with two people in winter for 100 periods"""
+    return run_simulation(timer, config, 'Lounge-Two People-Winter-1 hour', 100,
+                          quanta_emission_rate=147, inhalation_rate=0.54)
+
+
+def scenario_all_environments(timer, config, options):
+    """Every environment in the environment database for 180 periods"""
+    totals = {'environments': 0, 'infections': 0, 'visitors': 0}
+    for name in config.microenvironments:
+        results = run_simulation(timer, config, name, 180, quanta_emission_rate=147, inhalation_rate=0.54)
+        totals['environments'] += 1
+        totals['infections'] += results['infections']
+        totals['visitors'] += results['visitors']
+    return totals
+
+
+def scenario_stress_queue(timer, config, options):
+    """High arrival rate at a capacity limited pharmacy, so that a long queue forms"""
+    return run_simulation(timer, config, 'Pharmacy-natural-Lockdown', 180, arrivals_per_hour=600,
+                          quanta_emission_rate=147, inhalation_rate=0.54)
+
+
+def scenario_batch(timer, config, options):
+    """A batch of replicates of a pharmacy, as the batch notebook runs"""
+    from Simulation import Simulation
+
+    name = 'Pharmacy-natural-No Lockdown'
+    with timer.phase('setup'):
+        simulation = Simulation(name, microenvironment=name, periods=180, config=config)
+
+    with timer.phase('run'):
+        results = simulation.run_replicates(options.replicates, seed=SEED, quanta_emission_rate=147, inhalation_rate=0.54)
+
+    with timer.phase('results'):
+        summary = results.aggregate()
+
+    return {'replicates': options.replicates, 'infections mean': float(summary['infections mean'])}
+
+
+SCENARIOS = {'lounge': scenario_lounge,
+             'all-environments': scenario_all_environments,
+             'stress-queue': scenario_stress_queue,
+             'batch': scenario_batch}
+
+
+# Running scenarios
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_scenario_in_process(name, options):
+    """Run a scenario in this process and return its measurements"""
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+
+    timer = PhaseTimer()
+    with EventCounter() as counter:
+        t_start = time.perf_counter()
+
+        with timer.phase('import'):
+            from Configuration import Config
+            import Simulation
+
+        with timer.phase('config load'):
+            config = Config.load()
+
+        outputs = SCENARIOS[name](timer, config, options)
+        wall_time = time.perf_counter() - t_start
+
+    return {'wall time': wall_time,
+            'events': counter.events,
+            'events per second': counter.events / timer.phases['run'] if timer.phases.get('run') else None,
+            'peak rss mb': peak_rss_mb(),
+            'phases': timer.phases,
+            'outputs': outputs}
+
+
+def run_scenario(name, options):
+    """Run a scenario in a new process and return its measurements"""
+    command = [sys.executable, os.path.abspath(__file__), '--worker', name, '--replicates', str(options.replicates)]
+    completed = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f'scenario {name} failed:\n{completed.stderr}')
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+def run_suite(options):
+    """Run each scenario, keeping the fastest of the repeats"""
+    results = {}
+    for name in options.scenarios:
+        runs = [run_scenario(name, options) for _ in range(options.repeat)]
+        best = min(runs, key=lambda run: run['wall time'])
+        best['peak rss mb'] = max(run['peak rss mb'] for run in runs)
+        results[name] = best
+        print_result(name, best)
+    return results
+
+
+# Reporting and comparison with the baseline
+
+def print_result(name, result):
+    """Print the measurements of a scenario"""
+    phases = ', '.join(f'{phase} {seconds:.3f}s' for phase, seconds in result['phases'].items())
+    events_per_second = result['events per second']
+    rate = f'{events_per_second:,.0f} events/s' if events_per_second else 'n/a'
+    print(f"{name:<18}{result['wall time']:>9.3f}s {result['events']:>11,} events {rate:>18} "
+          f"{result['peak rss mb']:>8.1f}MB  ({phases})")
+
+
+def compare(results, baseline, tolerance):
+    """Compare results with the baseline
+
+    Returns:
+        list of strings -- Description of each regression
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get('scenarios', {}).get(name)
+        if base is None:
+            print(f'{name:<18}no baseline')
+            continue
+
+        for metric in ('wall time', 'peak rss mb'):
+            ratio = result[metric] / base[metric] if base[metric] else 1.0
+            status = 'REGRESSION' if ratio > 1 + tolerance else 'ok'
+            print(f'{name:<18}{metric:<12}{base[metric]:>10.3f} -> {result[metric]:>10.3f} ({ratio - 1:+.1%}) {status}')
+            if ratio > 1 + tolerance:
+                regressions.append(f'{name} {metric} {ratio - 1:+.1%}')
+
+        if result['outputs'] != base.get('outputs'):
+            print(f'{name:<18}outputs differ from the baseline: {base.get("outputs")} -> {result["outputs"]}')
+
+    return regressions
+
+
+def machine():
+    """Description of the machine the benchmarks ran on"""
+    return {'python': platform.python_version(), 'platform': platform.platform(),
+            'processor': platform.processor(), 'cpus': os.cpu_count()}
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Run the simulation benchmark suite.')
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS), help='Scenarios to run')
+    parser.add_argument('--replicates', type=int, default=1000, help='Replicates in the batch scenario')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs of each scenario, the fastest is kept')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baseline results file')
+    parser.add_argument('--save-baseline', action='store_true', help='Store the results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Fractional increase reported as a regression')
+    parser.add_argument('--output', help='File to write the results to as JSON')
+    parser.add_argument('--worker', choices=list(SCENARIOS), help=argparse.SUPPRESS)
+    options = parser.parse_args(argv)
+
+    if options.worker:
+        print(json.dumps(run_scenario_in_process(options.worker, options)))
+        return 0
+
+    results = {'machine': machine(), 'replicates': options.replicates, 'scenarios': run_suite(options)}
+
+    if options.output:
+        with open(options.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if options.save_baseline:
+        with open(options.baseline, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f'Baseline saved to {options.baseline}')
+        return 0
+
+    if not os.path.exists(options.baseline):
+        print('No baseline, run with --save-baseline to store one')
+        return 0
+
+    with open(options.baseline) as file:
+        baseline = json.load(file)
+    if baseline.get('replicates') != options.replicates:
+        print(f"Baseline batch scenario has {baseline.get('replicates')} replicates")
+
+    regressions = compare(results['scenarios'], baseline, options.tolerance)
+    if regressions:
+        print('Regressions: ' + '; '.join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    sys.exit(main())